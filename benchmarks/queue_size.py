@@ -0,0 +1,86 @@
+"""
+Throughput of AsyncWebSocketSession on a bursty feed, depending on `queue_size`.
+
+The server sends bursts of small messages separated by short network gaps.
+The consumer awaits a small I/O latency every few messages, like a handler
+writing to a database or another socket.
+
+With `queue_size=0`, every message needs a rendezvous between the receive task
+and the consumer, so the session can't read ahead while the consumer is busy.
+
+Run it with:
+
+    python -m benchmarks.queue_size
+"""
+
+import time
+
+import anyio
+import wsproto
+from httpcore import AsyncNetworkStream
+
+from httpx_ws import AsyncWebSocketSession, WebSocketDisconnect
+
+MESSAGES = 20_000
+BURST_SIZE = 100
+BURST_GAP_SECONDS = 0.002
+CONSUMER_IO_EVERY = 10
+CONSUMER_IO_SECONDS = 0.0002
+
+
+class BurstyNetworkStream(AsyncNetworkStream):
+    def __init__(self) -> None:
+        connection = wsproto.connection.Connection(
+            wsproto.connection.ConnectionType.SERVER
+        )
+        message = wsproto.events.TextMessage(data='{"price": 42.0, "size": 7}')
+        self._burst = b"".join(connection.send(message) for _ in range(BURST_SIZE))
+        self._close = connection.send(wsproto.events.CloseConnection(1000))
+        self._bursts_left = MESSAGES // BURST_SIZE
+
+    async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        if self._bursts_left == 0:
+            return self._close
+        self._bursts_left -= 1
+        await anyio.sleep(BURST_GAP_SECONDS)
+        return self._burst
+
+    async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+async def consume(queue_size: int) -> float:
+    start = time.perf_counter()
+    async with AsyncWebSocketSession(
+        BurstyNetworkStream(),
+        max_message_size_bytes=1024 * 1024,
+        queue_size=queue_size,
+        keepalive_ping_interval_seconds=None,
+    ) as ws:
+        received = 0
+        try:
+            while True:
+                await ws.receive_text()
+                received += 1
+                if received % CONSUMER_IO_EVERY == 0:
+                    await anyio.sleep(CONSUMER_IO_SECONDS)
+        except WebSocketDisconnect:
+            pass
+    assert received == MESSAGES
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    for queue_size in (0, 16, 512):
+        elapsed = await consume(queue_size)
+        print(
+            f"queue_size={queue_size:<4} "
+            f"{elapsed:.3f}s  {MESSAGES / elapsed:>10,.0f} messages/s"
+        )
+
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,129 @@
+"""
+Cost of handing over each message to the user, depending on how it's received.
+
+The server sends small binary messages. The client consumes them:
+
+* With a `receive_bytes()` loop: one queue access and thread switch each.
+* By iterating over the session, without timeout handling.
+* With `receive_many()`: one thread switch per batch.
+* With an `on_message` handler, called straight from the receive thread.
+  Nothing goes through the queue.
+
+Parsing the frames in the receive thread takes most of the time:
+the handler's own runtime, from `handler_stats`, shows what's left
+for the dispatch itself.
+
+Run it with:
+
+    python -m benchmarks.receive_dispatch
+"""
+
+import time
+import typing
+
+import wsproto
+from httpcore import NetworkStream
+
+from httpx_ws import WebSocketDisconnect, WebSocketSession
+
+MESSAGES = 200_000
+
+
+class ReplayNetworkStream(NetworkStream):
+    def __init__(self) -> None:
+        connection = wsproto.connection.Connection(
+            wsproto.connection.ConnectionType.SERVER
+        )
+        message = connection.send(wsproto.events.BytesMessage(b"x" * 32))
+        self._data = message * MESSAGES + connection.send(
+            wsproto.events.CloseConnection(1000)
+        )
+        self._offset = 0
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        data = self._data[self._offset : self._offset + max_bytes]
+        self._offset += len(data)
+        return data
+
+    def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def receive_loop(ws: WebSocketSession) -> int:
+    received = 0
+    try:
+        while True:
+            ws.receive_bytes()
+            received += 1
+    except WebSocketDisconnect:
+        return received
+
+
+def iteration(ws: WebSocketSession) -> int:
+    received = 0
+    for _ in ws.iter_bytes():
+        received += 1
+    return received
+
+
+def receive_many(ws: WebSocketSession) -> int:
+    received = 0
+    try:
+        while True:
+            received += len(ws.receive_many(max_messages=1_000))
+    except WebSocketDisconnect:
+        return received
+
+
+def consume(
+    receive: typing.Callable[[WebSocketSession], int] | None,
+) -> tuple[float, str]:
+    received = 0
+
+    def on_message(message: str | bytes) -> None:
+        nonlocal received
+        received += 1
+
+    start = time.perf_counter()
+    with WebSocketSession(
+        ReplayNetworkStream(),
+        keepalive_ping_interval_seconds=None,
+        on_message=on_message if receive is None else None,
+    ) as ws:
+        if receive is not None:
+            received = receive(ws)
+        else:
+            try:
+                ws.receive()
+            except WebSocketDisconnect:
+                pass
+        elapsed = time.perf_counter() - start
+        stats = ws.handler_stats
+    assert received == MESSAGES
+    details = (
+        f"  handler {stats.mean_seconds * 1e6:.2f}µs mean" if stats is not None else ""
+    )
+    return elapsed, details
+
+
+def main() -> None:
+    modes: dict[str, typing.Callable[[WebSocketSession], int] | None] = {
+        "receive_bytes()": receive_loop,
+        "iter_bytes()": iteration,
+        "receive_many()": receive_many,
+        "on_message": None,
+    }
+    print(f"{MESSAGES:,} messages")
+    for name, receive in modes.items():
+        elapsed, details = consume(receive)
+        print(
+            f"  {name:<16} {elapsed:.3f}s  "
+            f"{elapsed / MESSAGES * 1e6:>6.2f}µs per message{details}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Round-trip latency of WebSocketSession over a local socket pair.
+
+An echo server thread sends back every message it receives;
+the client measures the time between `send_text()` and `receive_text()`.
+
+Run it with:
+
+    python -m benchmarks.sync_latency
+"""
+
+import socket
+import statistics
+import threading
+import time
+
+import wsproto
+from httpcore import NetworkStream
+
+from httpx_ws import WebSocketSession
+
+MESSAGES = 5_000
+
+
+class SocketNetworkStream(NetworkStream):
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        try:
+            return self._sock.recv(max_bytes)
+        except OSError:
+            return b""
+
+    def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        self._sock.sendall(buffer)
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def get_extra_info(self, info: str):
+        if info == "socket":
+            return self._sock
+        return None
+
+
+def echo_server(sock: socket.socket) -> None:
+    connection = wsproto.connection.Connection(wsproto.ConnectionType.SERVER)
+    while True:
+        data = sock.recv(65_536)
+        if not data:
+            break
+        connection.receive_data(data)
+        for event in connection.events():
+            if isinstance(event, wsproto.events.TextMessage):
+                sock.sendall(connection.send(event))
+            elif isinstance(event, wsproto.events.CloseConnection):
+                sock.close()
+                return
+
+
+def main() -> None:
+    client_sock, server_sock = socket.socketpair()
+    server = threading.Thread(target=echo_server, args=(server_sock,))
+    server.start()
+
+    latencies: list[float] = []
+    with WebSocketSession(
+        SocketNetworkStream(client_sock), keepalive_ping_interval_seconds=None
+    ) as ws:
+        for _ in range(MESSAGES):
+            start = time.perf_counter()
+            ws.send_text('{"price": 42.0, "size": 7}')
+            ws.receive_text()
+            latencies.append(time.perf_counter() - start)
+    server.join()
+
+    latencies.sort()
+    print(f"median {statistics.median(latencies) * 1e6:8.1f} µs")
+    print(f"p99    {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+CPU cost of receiving text messages, depending on how their UTF-8 is handled.
+
+The server sends JSON text messages, either pure ASCII or with accented
+characters. The client receives them as bytes with `receive_text_bytes()`,
+like a parser working on bytes would:
+
+* By default, wsproto decodes each payload to `str`, which validates it,
+  and it's encoded again.
+* With `raw_text=True`, the payload is validated but kept as bytes.
+  ASCII payloads are validated without being decoded.
+* With `validate_utf8=False`, the payload isn't validated at all.
+  Only safe with a trusted server.
+
+Run it with:
+
+    python -m benchmarks.text_validation
+"""
+
+import json
+import time
+
+import wsproto
+from httpcore import NetworkStream
+
+from httpx_ws import WebSocketDisconnect, WebSocketSession
+
+MESSAGES = 2_000
+ROWS = 1_000
+
+
+class ReplayNetworkStream(NetworkStream):
+    def __init__(self, text: str) -> None:
+        connection = wsproto.connection.Connection(
+            wsproto.connection.ConnectionType.SERVER
+        )
+        message = connection.send(wsproto.events.TextMessage(data=text))
+        self._data = message * MESSAGES + connection.send(
+            wsproto.events.CloseConnection(1000)
+        )
+        self._offset = 0
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        data = self._data[self._offset : self._offset + max_bytes]
+        self._offset += len(data)
+        return data
+
+    def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def consume(text: str, **options: bool) -> float:
+    stream = ReplayNetworkStream(text)
+    start = time.perf_counter()
+    with WebSocketSession(
+        stream,
+        max_message_size_bytes=1024 * 1024,
+        keepalive_ping_interval_seconds=None,
+        **options,
+    ) as ws:
+        received = 0
+        try:
+            while True:
+                ws.receive_text_bytes()
+                received += 1
+        except WebSocketDisconnect:
+            pass
+    assert received == MESSAGES
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    payloads = {
+        "ascii": json.dumps([{"city": "Paris", "price": 42.0}] * ROWS),
+        "accented": json.dumps(
+            [{"city": "Besançon", "price": 42.0}] * ROWS, ensure_ascii=False
+        ),
+    }
+    modes: dict[str, dict[str, bool]] = {
+        "default": {},
+        "raw_text": {"raw_text": True},
+        "validate_utf8=False": {"validate_utf8": False},
+    }
+    for name, text in payloads.items():
+        size = len(text.encode("utf-8"))
+        print(f"{name} ({size:,} bytes per message)")
+        for mode, options in modes.items():
+            elapsed = consume(text, **options)
+            print(
+                f"  {mode:<20} {elapsed:.3f}s  "
+                f"{MESSAGES * size / elapsed / 1_000_000:>8,.0f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
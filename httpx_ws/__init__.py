@@ -9,25 +9,50 @@ from ._api import (
     aconnect_ws,
     connect_ws,
 )
+from ._broadcast import broadcast
+from ._compression import PerMessageDeflateOptions
 from ._exceptions import (
     HTTPXWSException,
     WebSocketDisconnect,
+    WebSocketHandlerError,
+    WebSocketInvalidTextReceived,
     WebSocketInvalidTypeReceived,
     WebSocketNetworkError,
+    WebSocketRpcError,
+    WebSocketSendQueueFull,
     WebSocketUpgradeError,
 )
+from ._handler import HandlerStats
+from ._json import JSONCodec
+from ._prepared import PreparedMessage
+from ._reactor import WebSocketReactor
+from ._router import MessageRouter
+from ._rpc import AsyncRpcChannel, RpcChannel
 
 __all__ = [
+    "AsyncRpcChannel",
     "AsyncWebSocketClient",
     "AsyncWebSocketSession",
     "HTTPXWSException",
+    "HandlerStats",
+    "JSONCodec",
     "JSONMode",
+    "MessageRouter",
+    "PerMessageDeflateOptions",
+    "PreparedMessage",
+    "RpcChannel",
     "WebSocketClient",
     "WebSocketDisconnect",
+    "WebSocketHandlerError",
+    "WebSocketInvalidTextReceived",
     "WebSocketInvalidTypeReceived",
     "WebSocketNetworkError",
+    "WebSocketReactor",
+    "WebSocketRpcError",
+    "WebSocketSendQueueFull",
     "WebSocketSession",
     "WebSocketUpgradeError",
     "aconnect_ws",
+    "broadcast",
     "connect_ws",
 ]
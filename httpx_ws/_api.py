@@ -1,10 +1,12 @@
 import base64
-import concurrent.futures
+import collections
 import contextlib
-import json
+import os
 import queue
 import secrets
+import socket
 import threading
+import time
 import typing
 
 import anyio
@@ -14,21 +16,42 @@ import wsproto
 import wsproto.utilities
 from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
 from httpcore import AsyncNetworkStream, NetworkStream
-from wsproto.frame_protocol import CloseReason
+from wsproto.frame_protocol import CloseReason, Opcode
 
+from ._compression import (
+    CompressionOption,
+    PerMessageDeflate,
+    PerMessageDeflateOptions,
+    get_compression,
+)
 from ._exceptions import (
+    EndOfStream,
     HTTPXWSException,
     WebSocketDisconnect,
+    WebSocketHandlerError,
+    WebSocketInvalidTextReceived,
     WebSocketInvalidTypeReceived,
     WebSocketNetworkError,
+    WebSocketSendQueueFull,
     WebSocketUpgradeError,
 )
+from ._handler import AsyncMessageHandler, HandlerStats, MessageHandler
+from ._json import DEFAULT_JSON_CODEC, JSONCodec
+from ._message import (
+    MessageAssembler,
+    MessageTooBig,
+    install_raw_text_decoder,
+    raw_text_event,
+)
 from ._ping import AsyncPingManager, PingManager
+from ._prepared import Buffer, PreparedMessage, frame_header, mask_frame
+from ._reactor import WebSocketReactor
+from ._read_size import ReadSize, ReadSizeOption, get_read_size
+from ._router import MessageRouter, Predicate, RouteHandler
 from .transport import ASGIWebSocketAsyncNetworkStream
 
 JSONMode = typing.Literal["text", "binary"]
 TaskFunction = typing.TypeVar("TaskFunction")
-TaskResult = typing.TypeVar("TaskResult")
 SyncSession = typing.TypeVar("SyncSession", bound="WebSocketSession")
 AsyncSession = typing.TypeVar("AsyncSession", bound="AsyncWebSocketSession")
 
@@ -36,14 +59,15 @@ DEFAULT_MAX_MESSAGE_SIZE_BYTES = 65_536
 DEFAULT_QUEUE_SIZE = 512
 DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS = 20.0
 DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS = 20.0
+DEFAULT_BATCH_MAX_BYTES = 65_536
+DEFAULT_FRAGMENT_SIZE = 65_536
+# How long closing waits for the receive thread. Streams without socket
+# can't be shut down: their read may only return once the server sends something.
+RECEIVE_THREAD_JOIN_TIMEOUT_SECONDS = 1.0
+# How long send_nowait() waits for another sender framing its message
+SEND_NOWAIT_LOCK_TIMEOUT_SECONDS = 0.05
 
-
-class ShouldClose(Exception):
-    pass
-
-
-class EndOfStream(Exception):
-    pass
+Message = str | Buffer | PreparedMessage
 
 
 class WebSocketSession:
@@ -65,54 +89,140 @@ class WebSocketSession:
         stream: NetworkStream,
         *,
         max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
+        read_size: ReadSizeOption | None = None,
+        max_message_size: int | None = None,
         queue_size: int = DEFAULT_QUEUE_SIZE,
         keepalive_ping_interval_seconds: float
         | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
         keepalive_ping_timeout_seconds: float
         | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
+        compression: CompressionOption | None = None,
+        send_queue_size: int | None = None,
+        stream_messages: bool = False,
+        raw_text: bool = False,
+        validate_utf8: bool = True,
+        json_codec: JSONCodec | None = None,
+        json_type: typing.Any = None,
+        on_message: MessageHandler | None = None,
+        router: MessageRouter | None = None,
+        reactor: WebSocketReactor | None = None,
         response: httpx.Response | None = None,
     ) -> None:
         self.stream = stream
-        self.connection = wsproto.connection.Connection(wsproto.ConnectionType.CLIENT)
         self.response = response
         if self.response is not None:
             self.subprotocol = self.response.headers.get("sec-websocket-protocol")
         else:
             self.subprotocol = None
+        self._compression = _negotiate_compression(
+            get_compression(compression), response
+        )
+        self.connection = wsproto.connection.Connection(
+            wsproto.ConnectionType.CLIENT,
+            [self._compression] if self._compression is not None else [],
+        )
+        if raw_text or not validate_utf8:
+            install_raw_text_decoder(self.connection, validate_utf8)
 
         self._events: queue.Queue[wsproto.events.Event | HTTPXWSException] = (
             queue.Queue(queue_size)
         )
+        self._put_event: typing.Callable[
+            [wsproto.events.Event | HTTPXWSException], None
+        ] = self._events.put
+        # A reactor can't block on a full queue:
+        # it stores the extra events here until the consumer catches up.
+        self._overflow_events: collections.deque[
+            wsproto.events.Event | HTTPXWSException
+        ] = collections.deque()
+        self._overflow_lock = threading.Lock()
+        # Reassembles the fragmented messages, in the receive thread,
+        # or in the consumer if the fragments are streamed.
+        self._message_assembler = MessageAssembler(max_message_size)
+        self._stream_messages = stream_messages
+        self._raw_text = raw_text or not validate_utf8
+        self._json_codec = json_codec if json_codec is not None else DEFAULT_JSON_CODEC
+        self._json_type = json_type
+        assert on_message is None or not stream_messages
+        assert router is None or not (stream_messages or on_message)
+        self._on_message = on_message
+        self._router = router
+        # Checked before the router and the handler, see intercept()
+        self._interceptors: list[tuple[Predicate, RouteHandler]] = []
+        # Runtime of the message handlers
+        self.handler_stats = (
+            HandlerStats() if on_message is not None or router is not None else None
+        )
+        # Whether receive_stream() is in the middle of a message:
+        # if it's abandoned, the rest of the message is dropped.
+        self._partial_message = False
+        # Closing event or error taken from the queue by receive_many(),
+        # handed over by the next call
+        self._deferred_event: wsproto.events.Event | HTTPXWSException | None = None
 
         self._ping_manager = PingManager()
         self._should_close = threading.Event()
+        # Called once the session starts closing, see add_close_callback()
+        self._close_callbacks: list[typing.Callable[[], None]] = []
+        self._close_lock = threading.Lock()
         self._write_lock: threading.Lock = threading.Lock()
-        self._should_close_task: concurrent.futures.Future[bool] | None = None
-        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
-
-        self._max_message_size_bytes = max_message_size_bytes
+        # Held while writing to the stream: a reactor only switches
+        # a TLS socket to non-blocking mode to read when no write is running.
+        self._stream_lock = threading.Lock()
+        # Answers Ping events; a reactor sends the answer from another thread
+        self._reply_ping: typing.Callable[[wsproto.events.Ping], None] = self._send_pong
+        # Calls the message handlers; a reactor calls them from another thread
+        self._dispatch_handler: typing.Callable[
+            [typing.Callable[[str | bytes], typing.Any], wsproto.events.Message], None
+        ] = self._call_handler
+        # Frames held back while batching, see batch()
+        self._batch: list[bytes | bytearray] = []
+        self._batch_size = 0
+        self._batch_depth = 0
+        self._batch_max_bytes = DEFAULT_BATCH_MAX_BYTES
+        # Frames waiting for the background writer, if any
+        assert send_queue_size is None or send_queue_size > 0
+        self._send_queue_size = send_queue_size
+        self._send_queue: queue.Queue[bytes | bytearray | None] | None = (
+            queue.Queue(send_queue_size) if send_queue_size is not None else None
+        )
+        self._background_write_task: threading.Thread | None = None
+        self._write_error: httpcore.WriteError | None = None
+        # Set while a message is sent in fragments, see send_stream()
+        self._fragmented_message: threading.Event | None = None
+        self._keepalive_pong_callback: threading.Event | None = None
+
+        self._read_size = read_size if read_size is not None else max_message_size_bytes
+        self._max_message_size = max_message_size
         self._queue_size = queue_size
         self._keepalive_ping_interval_seconds = keepalive_ping_interval_seconds
         self._keepalive_ping_timeout_seconds = keepalive_ping_timeout_seconds
-
-    def _get_executor_should_close_task(
-        self,
-    ) -> tuple[
-        concurrent.futures.ThreadPoolExecutor, "concurrent.futures.Future[bool]"
-    ]:
-        if self._should_close_task is None:
-            self._executor = concurrent.futures.ThreadPoolExecutor()
-            self._should_close_task = self._executor.submit(self._should_close.wait)
-        assert self._executor is not None
-        return self._executor, self._should_close_task
+        self._reactor = reactor
 
     def __enter__(self) -> "WebSocketSession":
+        self._background_receive_task: threading.Thread | None = None
+        self._background_keepalive_ping_task: threading.Thread | None = None
+
+        if self._send_queue is not None:
+            self._background_write_task = threading.Thread(
+                target=self._background_write, args=(self._send_queue,)
+            )
+            self._background_write_task.start()
+
+        if self._reactor is not None:
+            if self._reactor.register(self):
+                return self
+            # The stream can't be driven by the reactor, use our own threads
+            self._reactor = None
+
+        # Daemon, so a read that never returns doesn't keep the process alive
         self._background_receive_task = threading.Thread(
-            target=self._background_receive, args=(self._max_message_size_bytes,)
+            target=self._background_receive,
+            args=(get_read_size(self._read_size),),
+            daemon=True,
         )
         self._background_receive_task.start()
 
-        self._background_keepalive_ping_task: threading.Thread | None = None
         if self._keepalive_ping_interval_seconds is not None:
             self._background_keepalive_ping_task = threading.Thread(
                 target=self._background_keepalive_ping,
@@ -127,7 +237,8 @@ class WebSocketSession:
 
     def __exit__(self, exc_type, exc, tb):
         self.close()
-        self._background_receive_task.join()
+        if self._background_receive_task is not None:
+            self._background_receive_task.join(RECEIVE_THREAD_JOIN_TIMEOUT_SECONDS)
         if self._background_keepalive_ping_task is not None:
             self._background_keepalive_ping_task.join()
 
@@ -156,7 +267,7 @@ class WebSocketSession:
         self.send(event)
         return callback
 
-    def send(self, event: wsproto.events.Event) -> None:
+    def send(self, event: wsproto.events.Event, compress: bool | None = None) -> None:
         """
         Send an Event message.
 
@@ -168,6 +279,10 @@ class WebSocketSession:
 
         Args:
             event: The event to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -179,19 +294,28 @@ class WebSocketSession:
                 ws.send(event)
         """
         try:
-            data = self.connection.send(event)
-            with self._write_lock:
-                self.stream.write(data)
+            # Serialize under the lock: compressed frames must be sent in order
+            self._acquire_write_lock(isinstance(event, wsproto.events.Message))
+            try:
+                if self._compression is not None:
+                    self._compression.compress_next_message = compress
+                self._write(self.connection.send(event))
+            finally:
+                self._write_lock.release()
         except httpcore.WriteError as e:
             self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
             raise WebSocketNetworkError() from e
 
-    def send_text(self, data: str) -> None:
+    def send_text(self, data: str, compress: bool | None = None) -> None:
         """
         Send a text message.
 
         Args:
             data: The text to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -200,16 +324,28 @@ class WebSocketSession:
             Send a text message.
 
                 ws.send_text("Hello!")
+
+            Send a short message uncompressed.
+
+                ws.send_text("ack", compress=False)
         """
         event = wsproto.events.TextMessage(data=data)
-        self.send(event)
+        self.send(event, compress)
 
-    def send_bytes(self, data: bytes) -> None:
+    def send_bytes(self, data: Buffer, compress: bool | None = None) -> None:
         """
         Send a bytes message.
 
+        The data is masked straight into the outgoing frame, so it can be
+        any object supporting the buffer protocol, like a `bytearray`,
+        a `memoryview` or an array, without converting it to `bytes` first.
+
         Args:
             data: The data to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -218,19 +354,33 @@ class WebSocketSession:
             Send a bytes message.
 
                 ws.send_bytes(b"Hello!")
+
+            Send a slice of a buffer, without copying it.
+
+                ws.send_bytes(memoryview(buffer)[offset:offset + size])
         """
-        event = wsproto.events.BytesMessage(data=data)
-        self.send(event)
+        self._send_buffer(data, Opcode.BINARY, compress)
 
-    def send_json(self, data: typing.Any, mode: JSONMode = "text") -> None:
+    def send_json(
+        self,
+        data: typing.Any,
+        mode: JSONMode = "text",
+        compress: bool | None = None,
+    ) -> None:
         """
         Send JSON data.
 
         Args:
             data:
-                The data to send. Must be serializable by [json.dumps][json.dumps].
+                The data to send. Must be serializable by the
+                [JSON codec][httpx_ws.JSONCodec] of the session,
+                [json.dumps][json.dumps] by default.
             mode:
                 The sending mode. Should either be `'text'` or `'bytes'`.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -242,11 +392,344 @@ class WebSocketSession:
                 ws.send_json(data)
         """
         assert mode in ["text", "binary"]
-        serialized_data = json.dumps(data)
-        if mode == "text":
-            self.send_text(serialized_data)
+        serialized_data = self._json_codec.dumps(data)
+        if isinstance(serialized_data, str):
+            if mode == "text":
+                self.send_text(serialized_data, compress)
+                return
+            serialized_data = serialized_data.encode("utf-8")
+        # Already UTF-8: no need to decode it for a text message
+        opcode = Opcode.TEXT if mode == "text" else Opcode.BINARY
+        self._send_buffer(serialized_data, opcode, compress)
+
+    def send_prepared(
+        self, message: PreparedMessage, compress: bool | None = None
+    ) -> None:
+        """
+        Send a [PreparedMessage][httpx_ws.PreparedMessage].
+
+        The message is serialized and framed only once,
+        whatever the number of sessions it's sent to.
+
+        Args:
+            message: The prepared message to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Send the same message to many sessions.
+
+                message = PreparedMessage.from_json({"message": "Hello!"})
+                for ws in sessions:
+                    ws.send_prepared(message)
+        """
+        try:
+            self._acquire_write_lock()
+            try:
+                data = message.frame(self.connection, self._compression, compress)
+                self._write(data)
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+
+    def send_many(
+        self, messages: typing.Iterable[typing.Any], compress: bool | None = None
+    ) -> None:
+        """
+        Send many messages in a single write.
+
+        The messages are framed one after the other under a single lock
+        and written at once, which is much cheaper than sending them one by one
+        when there are many small ones.
+
+        Args:
+            messages:
+                The messages to send. Text if it's a string, binary if it's
+                bytes or another buffer. Other objects, like dictionaries,
+                are serialized into JSON text messages with the JSON codec
+                of the session. They're all serialized before any is sent.
+            compress:
+                Whether to compress the messages, if compression was negotiated.
+                Defaults to `None`, meaning each one is compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Replay a backlog of messages.
+
+                ws.send_many(backlog)
+        """
+        serialized = _serialize_messages(messages, self._json_codec)
+        try:
+            self._acquire_write_lock()
+            try:
+                data = _frame_messages(
+                    self.connection, self._compression, serialized, compress
+                )
+                self._write(data)
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+
+    def send_stream(
+        self,
+        chunks: typing.Iterable[str | bytes],
+        fragment_size: int | None = None,
+        compress: bool | None = None,
+    ) -> None:
+        """
+        Send a message produced piece by piece, in fragmented frames.
+
+        Each chunk is sent as soon as it's produced,
+        so the whole message never needs to be held in memory.
+        The other messages wait until this one is finished,
+        while Ping and Pong frames can still be sent in between.
+
+        Args:
+            chunks:
+                The pieces of the message.
+                Text if they're strings, binary if they're bytes.
+                Without any, an empty binary message is sent,
+                like for an empty file with `send_file()`.
+            fragment_size:
+                Maximum size of the frames, in bytes for a binary message
+                and characters for a text message. Larger chunks are split.
+                Defaults to `None`, meaning a frame per chunk.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if its first chunk
+                is at least [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Send the rows of a large report as a single message.
+
+                ws.send_stream(f"{row}\\n" for row in rows)
+        """
+        fragmented_message: threading.Event | None = None
+        fragment: str | bytes = b""
+        try:
+            for chunk in chunks:
+                for fragment in _fragments(chunk, fragment_size):
+                    if fragmented_message is None:
+                        self._acquire_write_lock()
+                        fragmented_message = threading.Event()
+                        self._fragmented_message = fragmented_message
+                        if self._compression is not None:
+                            self._compression.compress_next_message = compress
+                    else:
+                        self._write_lock.acquire()
+                    try:
+                        self._write(self.connection.send(_fragment_event(fragment)))
+                    finally:
+                        self._write_lock.release()
+            if fragmented_message is None:
+                # The peer still expects a message
+                self._send_buffer(b"", Opcode.BINARY, compress)
+                return
+            with self._write_lock:
+                event = _fragment_event(fragment[:0], message_finished=True)
+                self._write(self.connection.send(event))
+        except httpcore.WriteError as e:
+            self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+        except BaseException:
+            # The peer can't make sense of the next messages anymore
+            if fragmented_message is not None:
+                self.close(CloseReason.INTERNAL_ERROR, "Message stream error")
+            raise
+        finally:
+            if fragmented_message is not None:
+                self._fragmented_message = None
+                fragmented_message.set()
+
+    def send_file(
+        self,
+        file: str | os.PathLike[str] | typing.BinaryIO,
+        fragment_size: int = DEFAULT_FRAGMENT_SIZE,
+        compress: bool | None = None,
+    ) -> None:
+        """
+        Send the content of a file as a binary message, in fragmented frames.
+
+        The file is read and sent one fragment at a time,
+        so it never needs to be held in memory.
+
+        Args:
+            file:
+                Path of the file, or file opened in binary mode.
+                A file passed as an object is read from its current position,
+                and isn't closed.
+            fragment_size:
+                Size of the frames, in bytes.
+                Defaults to 64 KiB.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if its first fragment
+                is at least [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Upload a file.
+
+                ws.send_file("backup.tar.gz")
+        """
+        if isinstance(file, str | os.PathLike):
+            with open(file, "rb") as f:
+                self.send_stream(_read_chunks(f, fragment_size), compress=compress)
         else:
-            self.send_bytes(serialized_data.encode("utf-8"))
+            self.send_stream(_read_chunks(file, fragment_size), compress=compress)
+
+    def send_nowait(self, message: typing.Any, compress: bool | None = None) -> None:
+        """
+        Queue a message for the background writer, without waiting.
+
+        Only available if the session has a send queue,
+        see `send_queue_size`.
+
+        Args:
+            message:
+                The message to send. Text if it's a string, binary if it's
+                bytes or another buffer. Other objects, like dictionaries,
+                are serialized into a JSON text message with the JSON codec
+                of the session.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketSendQueueFull:
+                The send queue is full, or a message is being sent
+                in fragments.
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Drop the updates the network can't keep up with.
+
+                try:
+                    ws.send_nowait(update)
+                except WebSocketSendQueueFull:
+                    dropped += 1
+        """
+        if self._send_queue_size is None:
+            raise RuntimeError("send_nowait() requires a send queue")
+        serialized = _serialize_messages([message], self._json_codec)
+        try:
+            # The other senders only hold the lock to frame and queue
+            # their message, unless they wait for room in the queue.
+            if not self._write_lock.acquire(blocking=False) and (
+                self._send_queue_full()
+                or not self._write_lock.acquire(
+                    timeout=SEND_NOWAIT_LOCK_TIMEOUT_SECONDS
+                )
+            ):
+                raise WebSocketSendQueueFull()
+            try:
+                if self._fragmented_message is not None or self._send_queue_full():
+                    raise WebSocketSendQueueFull()
+                data = _frame_messages(
+                    self.connection, self._compression, serialized, compress
+                )
+                self._write(data)
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+
+    def _send_queue_full(self) -> bool:
+        """
+        Whether the send queue has no room for another frame.
+        """
+        send_queue = self._send_queue
+        # Stopped by close(): the frames are written directly
+        return send_queue is not None and send_queue.full()
+
+    def drain(self) -> None:
+        """
+        Wait until the background writer sent the queued frames to the network.
+
+        Returns immediately if the session has no send queue.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Make sure the messages are sent before doing something else.
+
+                for update in updates:
+                    ws.send_nowait(update)
+                ws.drain()
+        """
+        send_queue = self._send_queue
+        if send_queue is not None:
+            send_queue.join()
+        if self._write_error is not None:
+            self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from self._write_error
+
+    @contextlib.contextmanager
+    def batch(
+        self, max_bytes: int = DEFAULT_BATCH_MAX_BYTES
+    ) -> typing.Generator[None, None, None]:
+        """
+        Coalesce the frames sent in the block into fewer writes to the network.
+
+        Inside the block, frames aren't written to the network right away:
+        they're held back and written at once when exiting the block,
+        or earlier if they exceed `max_bytes`.
+        It also applies to frames sent by the background tasks,
+        like Pong replies.
+
+        It saves system calls when sending bursts of small messages.
+
+        Args:
+            max_bytes:
+                Number of held back bytes above which they are written
+                without waiting for the end of the block.
+                Defaults to 65 KiB.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Send many small messages in a few writes.
+
+                with ws.batch():
+                    for order in orders:
+                        ws.send_json(order)
+        """
+        with self._write_lock:
+            self._batch_depth += 1
+            if self._batch_depth == 1:
+                self._batch_max_bytes = max_bytes
+        try:
+            yield
+        finally:
+            try:
+                with self._write_lock:
+                    self._batch_depth -= 1
+                    if self._batch_depth == 0:
+                        self._write(b"", flush=True)
+            except httpcore.WriteError as e:
+                self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+                raise WebSocketNetworkError() from e
 
     def receive(self, timeout: float | None = None) -> wsproto.events.Event:
         """
@@ -287,16 +770,124 @@ class WebSocketSession:
                 except WebSocketDisconnect:
                     print("Connection closed")
         """
-        try:
-            event = self._events.get(block=True, timeout=timeout)
-        except queue.Empty as e:
-            raise TimeoutError from e
-        if isinstance(event, HTTPXWSException):
-            raise event
-        if isinstance(event, wsproto.events.CloseConnection):
-            raise WebSocketDisconnect(event.code, event.reason)
+        event = self._next_event(timeout)
+        if self._stream_messages and isinstance(event, wsproto.events.Message):
+            return self._assemble_message(event, timeout)
         return event
 
+    def receive_many(
+        self, max_messages: int = 100, timeout: float | None = None
+    ) -> list[wsproto.events.Event]:
+        """
+        Receive the events available from the server, all at once.
+
+        Waits for a first event, then takes the ones already queued behind it,
+        up to `max_messages`, without waiting any further. Consumers processing
+        messages in bulk, like writing them to a database, save a queue access
+        and a thread switch for each of them.
+
+        In the middle of a streamed message, with `stream_messages`,
+        the rest of the message is still waited for.
+        If the server closed the websocket or an error occured after some events,
+        those events are returned first, and the next call raises.
+
+        Args:
+            max_messages:
+                Maximum number of events to return.
+            timeout:
+                Number of seconds to wait for the first event.
+                If `None`, will block until an event is available.
+
+        Returns:
+            A list of raw [wsproto.events.Event][wsproto.events.Event],
+            with at least one event.
+
+        Raises:
+            TimeoutError: No event was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Insert the messages in a database, in batches.
+
+                while True:
+                    events = ws.receive_many(max_messages=500)
+                    db.insert_many([event.data for event in events])
+        """
+        assert max_messages > 0
+        events = [self.receive(timeout)]
+        get_event = self._events.get_nowait
+        while len(events) < max_messages:
+            try:
+                event = get_event()
+            except queue.Empty:
+                break
+            if self._overflow_events:
+                self._refill_events()
+            if isinstance(event, wsproto.events.Message):
+                if self._partial_message:
+                    # Rest of a message abandoned by receive_stream()
+                    self._partial_message = not event.message_finished
+                    continue
+                if self._stream_messages:
+                    try:
+                        event = self._assemble_message(event, timeout)
+                    except TimeoutError:
+                        # The assembler keeps the fragments for the next call
+                        break
+                    except HTTPXWSException as e:
+                        self._deferred_event = e
+                        break
+            elif isinstance(event, wsproto.events.CloseConnection | HTTPXWSException):
+                self._deferred_event = event
+                break
+            events.append(event)
+        return events
+
+    def receive_stream(
+        self, timeout: float | None = None
+    ) -> typing.Iterator[str | bytes]:
+        """
+        Receive a message piece by piece, as its fragments arrive.
+
+        The fragments are only handed over as they arrive if the session
+        was created with `stream_messages`. Otherwise, the message is
+        reassembled first, and given as a single piece.
+
+        Args:
+            timeout:
+                Number of seconds to wait for each fragment.
+                If `None`, will block until a fragment is available.
+
+        Yields:
+            The fragments of the message.
+            Strings for a text message, bytes for a binary message.
+
+        Raises:
+            TimeoutError: No fragment was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: The received event was not a message.
+
+        Examples:
+            Write a large binary message to a file, without holding it in memory.
+
+                with open("dump.bin", "wb") as file:
+                    for chunk in ws.receive_stream():
+                        file.write(chunk)
+        """
+        event = self._next_event(timeout)
+        if not isinstance(event, wsproto.events.Message):
+            raise WebSocketInvalidTypeReceived(event)
+        self._partial_message = not event.message_finished
+        yield event.data
+        while not event.message_finished:
+            event = typing.cast(
+                wsproto.events.Message, self._next_event(timeout, continuation=True)
+            )
+            self._partial_message = not event.message_finished
+            yield event.data
+
     def receive_text(self, timeout: float | None = None) -> str:
         """
         Receive text from the server.
@@ -314,6 +905,8 @@ class WebSocketSession:
             WebSocketDisconnect: The server closed the websocket.
             WebSocketNetworkError: A network error occured.
             WebSocketInvalidTypeReceived: The received event was not a text message.
+            WebSocketInvalidTextReceived: The text message isn't valid UTF-8,
+                with `validate_utf8=False`.
 
         Examples:
             Wait for text until available.
@@ -334,7 +927,39 @@ class WebSocketSession:
         """
         event = self.receive(timeout)
         if isinstance(event, wsproto.events.TextMessage):
-            return event.data
+            return _text(event)
+        raise WebSocketInvalidTypeReceived(event)
+
+    def receive_text_bytes(self, timeout: float | None = None) -> bytes:
+        """
+        Receive text from the server, as UTF-8 bytes.
+
+        Useful for parsers working on bytes. If the session was created
+        with `raw_text`, the text is handed over as received, without being
+        decoded. Otherwise, it's encoded again.
+
+        Args:
+            timeout:
+                Number of seconds to wait for an event.
+                If `None`, will block until an event is available.
+
+        Returns:
+            Text data, encoded in UTF-8.
+
+        Raises:
+            TimeoutError: No event was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: The received event was not a text message.
+
+        Examples:
+            Parse a text message with orjson.
+
+                data = orjson.loads(ws.receive_text_bytes())
+        """
+        event = self.receive(timeout)
+        if isinstance(event, wsproto.events.TextMessage):
+            return _text_bytes(event.data)
         raise WebSocketInvalidTypeReceived(event)
 
     def receive_bytes(self, timeout: float | None = None) -> bytes:
@@ -374,16 +999,21 @@ class WebSocketSession:
         """
         event = self.receive(timeout)
         if isinstance(event, wsproto.events.BytesMessage):
-            return event.data
+            return _bytes(event.data)
         raise WebSocketInvalidTypeReceived(event)
 
     def receive_json(
-        self, timeout: float | None = None, mode: JSONMode = "text"
+        self,
+        timeout: float | None = None,
+        mode: JSONMode = "text",
+        type: typing.Any = None,
     ) -> typing.Any:
         """
         Receive JSON data from the server.
 
-        The received data should be parseable by [json.loads][json.loads].
+        The received data should be parseable by the
+        [JSON codec][httpx_ws.JSONCodec] of the session,
+        [json.loads][json.loads] by default.
 
         Args:
             timeout:
@@ -391,6 +1021,12 @@ class WebSocketSession:
                 If `None`, will block until an event is available.
             mode:
                 Receive mode. Should either be `'text'` or `'bytes'`.
+            type:
+                Type to decode the data into, like a dataclass.
+                The decoder is compiled once per type, and cached by the
+                [JSON codec][httpx_ws.JSONCodec].
+                Defaults to `None`, meaning the `json_type` of the session,
+                if any. Pass `typing.Any` to get the data as parsed.
 
         Returns:
             Parsed JSON data.
@@ -401,6 +1037,7 @@ class WebSocketSession:
             WebSocketNetworkError: A network error occured.
             WebSocketInvalidTypeReceived: The received event
                 didn't correspond to the specified mode.
+            ValueError: The data isn't valid JSON, or doesn't match the type.
 
         Examples:
             Wait for data until available.
@@ -418,146 +1055,735 @@ class WebSocketSession:
                     print("No data received.")
                 except WebSocketDisconnect:
                     print("Connection closed")
+
+            Decode an order.
+
+                @dataclasses.dataclass
+                class Order:
+                    id: int
+                    items: list[str]
+
+                order = ws.receive_json(type=Order)
         """
         assert mode in ["text", "binary"]
         data: str | bytes
-        if mode == "text":
+        if mode == "text" and self._raw_text:
+            data = self.receive_text_bytes(timeout)
+        elif mode == "text":
             data = self.receive_text(timeout)
         elif mode == "binary":
             data = self.receive_bytes(timeout)
-        return json.loads(data)
+        return self._json_codec.decode(
+            data, type if type is not None else self._json_type
+        )
 
-    def close(self, code: int = 1000, reason: str | None = None):
+    def __iter__(self) -> typing.Iterator[str | bytes]:
         """
-        Close the WebSocket session.
-
-        Internally, it'll send the
-        [CloseConnection][wsproto.events.CloseConnection] event.
+        Iterate over the messages, until the server closes the connection.
 
-        *This method is automatically called when exiting the context manager.*
+        Yields:
+            Strings for text messages, bytes for binary messages.
 
-        Args:
-            code:
-                The integer close code to indicate why the connection has closed.
-            reason:
-                Additional reasoning for why the connection has closed.
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTextReceived: A text message isn't valid UTF-8,
+                with `validate_utf8=False`.
 
         Examples:
-            Close the WebSocket session.
+            Print the messages.
 
-                ws.close()
+                for message in ws:
+                    print(message)
         """
-        self._should_close.set()
-        if self._executor is not None:
-            self._executor.shutdown(False)
-        if self.connection.state not in {
-            wsproto.connection.ConnectionState.LOCAL_CLOSING,
-            wsproto.connection.ConnectionState.CLOSED,
-        }:
-            event = wsproto.events.CloseConnection(code, reason)
-            data = self.connection.send(event)
-            try:
-                with self._write_lock:
-                    self.stream.write(data)
-            except httpcore.WriteError:
-                pass
-        self.stream.close()
+        for event in self._iter_messages():
+            yield _message_data(event)
 
-    def _background_receive(self, max_bytes: int) -> None:
+    def iter_text(self) -> typing.Iterator[str]:
         """
-        Background thread listening for data from the server.
+        Iterate over the text messages, until the server closes the connection.
 
-        Internally, it'll:
+        Yields:
+            Text data.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: A message was not a text message.
+            WebSocketInvalidTextReceived: A text message isn't valid UTF-8,
+                with `validate_utf8=False`.
+
+        Examples:
+            Print the messages.
+
+                for text in ws.iter_text():
+                    print(text)
+        """
+        for event in self._iter_messages():
+            if not isinstance(event, wsproto.events.TextMessage):
+                raise WebSocketInvalidTypeReceived(event)
+            yield _text(event)
+
+    def iter_bytes(self) -> typing.Iterator[bytes]:
+        """
+        Iterate over the binary messages, until the server closes the connection.
+
+        Yields:
+            Bytes data.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: A message was not a binary message.
+
+        Examples:
+            Write the messages to a file.
+
+                for data in ws.iter_bytes():
+                    file.write(data)
+        """
+        for event in self._iter_messages():
+            if not isinstance(event, wsproto.events.BytesMessage):
+                raise WebSocketInvalidTypeReceived(event)
+            yield _bytes(event.data)
+
+    def iter_json(
+        self, mode: JSONMode = "text", type: typing.Any = None
+    ) -> typing.Iterator[typing.Any]:
+        """
+        Iterate over the JSON messages, until the server closes the connection.
+
+        Args:
+            mode:
+                Receive mode. Should either be `'text'` or `'bytes'`.
+            type:
+                Type to decode the data into, like in
+                [receive_json()][httpx_ws.WebSocketSession.receive_json].
+                Defaults to `None`, meaning the `json_type` of the session,
+                if any.
+
+        Yields:
+            Parsed JSON data.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: A message
+                didn't correspond to the specified mode.
+            ValueError: The data isn't valid JSON, or doesn't match the type.
+
+        Examples:
+            Process the orders.
+
+                for order in ws.iter_json(type=Order):
+                    process(order)
+        """
+        assert mode in ["text", "binary"]
+        message_type = (
+            wsproto.events.TextMessage
+            if mode == "text"
+            else wsproto.events.BytesMessage
+        )
+        decode = self._json_codec.decode
+        if type is None:
+            type = self._json_type
+        for event in self._iter_messages():
+            if not isinstance(event, message_type):
+                raise WebSocketInvalidTypeReceived(event)
+            data = event.data
+            yield decode(data if isinstance(data, str) else _bytes(data), type)
+
+    @property
+    def router(self) -> MessageRouter | None:
+        """
+        The [MessageRouter][httpx_ws.MessageRouter] of the session, if any.
+
+        A session opened without router can be given one,
+        if it doesn't have `stream_messages` or an `on_message` handler.
+        It can't be replaced: add routes to the current one instead.
+
+        Raises:
+            ValueError: The session already has a router.
+        """
+        return self._router
+
+    @router.setter
+    def router(self, router: MessageRouter) -> None:
+        assert not (self._stream_messages or self._on_message)
+        if self._router is not None:
+            raise ValueError("The session already has a router")
+        # Before the router, since the receive loop may use it right away
+        if self.handler_stats is None:
+            self.handler_stats = HandlerStats()
+        self._router = router
+
+    def add_close_callback(self, callback: typing.Callable[[], None]) -> None:
+        """
+        Register a function called once the session starts closing,
+        either side closing it.
+
+        It's called from the receive thread or from the thread closing
+        the session, so it must be quick. If the session is already closing,
+        it's called right away.
+
+        Args:
+            callback: The function to call, without arguments.
+
+        Examples:
+            Stop a worker when the connection closes.
+
+                ws.add_close_callback(worker.stop)
+        """
+        with self._close_lock:
+            if not self._should_close.is_set():
+                self._close_callbacks.append(callback)
+                return
+        callback()
+
+    def intercept(self, predicate: Predicate, handler: RouteHandler) -> None:
+        """
+        Take messages in the receive thread, before the router
+        and the `on_message` handler, whatever their routes.
+
+        Interceptors are checked in the order they were added, and only
+        see the messages of this session, even if its router is shared.
+        It's how an [RpcChannel][httpx_ws.RpcChannel] takes the responses
+        to its calls.
+
+        Args:
+            predicate:
+                Function telling whether to take a message. It's called
+                in the receive thread for every message: it should be cheap.
+            handler:
+                Function called with the messages taken, from the receive thread.
+                It must be quick: nothing is read from the network while it runs.
+        """
+        assert not self._stream_messages
+        # Before the interceptor, since the receive thread may use it right away
+        if self.handler_stats is None:
+            self.handler_stats = HandlerStats()
+        self._interceptors.append((predicate, handler))
+
+    def close(self, code: int = 1000, reason: str | None = None):
+        """
+        Close the WebSocket session.
+
+        Internally, it'll send the
+        [CloseConnection][wsproto.events.CloseConnection] event.
+
+        *This method is automatically called when exiting the context manager.*
+
+        Args:
+            code:
+                The integer close code to indicate why the connection has closed.
+            reason:
+                Additional reasoning for why the connection has closed.
+
+        Examples:
+            Close the WebSocket session.
+
+                ws.close()
+        """
+        self._start_closing()
+        self._stop_writer()
+        # Wake up the keepalive thread if it's waiting for a Pong
+        if self._keepalive_pong_callback is not None:
+            self._keepalive_pong_callback.set()
+        if self.connection.state not in {
+            wsproto.connection.ConnectionState.LOCAL_CLOSING,
+            wsproto.connection.ConnectionState.CLOSED,
+        }:
+            event = wsproto.events.CloseConnection(code, reason)
+            data = self.connection.send(event)
+            try:
+                with self._write_lock:
+                    self._write(data, flush=True)
+            except httpcore.WriteError:
+                pass
+        # Make sure the reactor is done with the stream before closing it
+        if self._reactor is not None:
+            self._reactor.unregister(self)
+        self._shutdown_stream()
+        self.stream.close()
+
+    def _start_closing(self) -> None:
+        """
+        Flag the session as closing, and notify the ones waiting on it.
+        """
+        with self._close_lock:
+            self._should_close.set()
+            callbacks, self._close_callbacks = self._close_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _send_buffer(self, data: Buffer, opcode: Opcode, compress: bool | None) -> None:
+        """
+        Send a message from any buffer, see `_frame_buffer()`.
+        """
+        try:
+            self._acquire_write_lock()
+            try:
+                data = _frame_buffer(
+                    self.connection, self._compression, data, compress, opcode
+                )
+                self._write(data)
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+
+    def _iter_messages(self) -> typing.Iterator[wsproto.events.Message]:
+        """
+        Iterate over the messages, until the server closes the connection.
+
+        A lighter loop than calling `receive()` for each message:
+        it waits without timeout, and ends on the closing events
+        instead of raising them.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+        """
+        if self._deferred_event is not None:
+            event, self._deferred_event = self._deferred_event, None
+            if isinstance(event, HTTPXWSException) and not isinstance(
+                event, WebSocketDisconnect
+            ):
+                raise event
+            return
+        get_event = self._events.get
+        while True:
+            event = get_event()
+            if self._overflow_events:
+                self._refill_events()
+            if isinstance(event, wsproto.events.Message):
+                if self._partial_message:
+                    # Rest of a message abandoned by receive_stream()
+                    self._partial_message = not event.message_finished
+                    continue
+                if self._stream_messages:
+                    try:
+                        event = self._assemble_message(event, None)
+                    except WebSocketDisconnect:
+                        return
+                yield event
+            elif isinstance(
+                event, wsproto.events.CloseConnection | WebSocketDisconnect
+            ):
+                return
+            elif isinstance(event, HTTPXWSException):
+                raise event
+
+    def _next_event(
+        self, timeout: float | None, continuation: bool = False
+    ) -> wsproto.events.Event:
+        """
+        Get the next event from the queue.
+
+        Args:
+            timeout: Number of seconds to wait for an event.
+            continuation: Whether it's to continue the message
+                streamed by receive_stream().
+
+        Raises:
+            TimeoutError: No event was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+        """
+        if self._deferred_event is not None:
+            event, self._deferred_event = self._deferred_event, None
+        else:
+            while True:
+                try:
+                    event = self._events.get(block=True, timeout=timeout)
+                except queue.Empty as e:
+                    raise TimeoutError from e
+                if self._overflow_events:
+                    self._refill_events()
+                if (
+                    continuation
+                    or not self._partial_message
+                    or not isinstance(event, wsproto.events.Message)
+                ):
+                    break
+                # Rest of a message abandoned by receive_stream()
+                self._partial_message = not event.message_finished
+        if isinstance(event, HTTPXWSException):
+            raise event
+        if isinstance(event, wsproto.events.CloseConnection):
+            raise WebSocketDisconnect(event.code, event.reason)
+        return event
+
+    def _assemble_message(
+        self, event: wsproto.events.Message, timeout: float | None
+    ) -> wsproto.events.Message:
+        """
+        Reassemble a streamed message from its fragments.
+
+        Raises:
+            TimeoutError: No fragment was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket,
+                or the message exceeded `max_message_size`.
+            WebSocketNetworkError: A network error occured.
+        """
+        try:
+            while (message := self._message_assembler.feed(event)) is None:
+                event = typing.cast(wsproto.events.Message, self._next_event(timeout))
+        except MessageTooBig:
+            self._partial_message = not event.message_finished
+            self.close(CloseReason.MESSAGE_TOO_BIG, "Message too big")
+            raise WebSocketDisconnect(
+                CloseReason.MESSAGE_TOO_BIG, "Message too big"
+            ) from None
+        return message
+
+    def _background_receive(self, read_size: ReadSize) -> None:
+        """
+        Background thread listening for data from the server.
+
+        Args:
+            read_size: The number of bytes to read at each iteration.
+        """
+        try:
+            while not self._should_close.is_set():
+                self._receive(read_size)
+        except (
+            httpcore.ReadError,
+            httpcore.WriteError,
+            EndOfStream,
+            MessageTooBig,
+            WebSocketHandlerError,
+        ) as e:
+            self._handle_receive_error(e)
+
+    def _receive(self, read_size: ReadSize) -> None:
+        """
+        Read data from the server and process it.
+
+        Internally, it'll:
 
         * Answer to Ping events.
         * Acknowledge Pong events.
+        * Reassemble fragmented messages.
         * Put other events in the [_events][_events]
         queue that'll eventually be consumed by the user.
 
         Args:
-            max_bytes: The maximum chunk size to read at each iteration.
+            read_size: The number of bytes to read.
+
+        Raises:
+            EndOfStream: The server closed the stream.
+            MessageTooBig: A message exceeded `max_message_size`.
+        """
+        data = self._read_stream(read_size.size)
+        read_size.update(len(data))
+        self._receive_data(data)
+
+    def _receive_data(self, data: bytes) -> None:
+        """
+        Process data read from the server, see `_receive()`.
+
+        Args:
+            data: The data read from the stream.
+
+        Raises:
+            MessageTooBig: A message exceeded `max_message_size`.
+        """
+        self.connection.receive_data(data)
+        for event in self.connection.events():
+            if self._raw_text:
+                event = raw_text_event(event)
+            if isinstance(event, wsproto.events.Ping):
+                self._reply_ping(event)
+                continue
+            if isinstance(event, wsproto.events.Pong):
+                self._ping_manager.ack(event.payload)
+                continue
+            if isinstance(event, wsproto.events.CloseConnection):
+                self._start_closing()
+            if isinstance(event, wsproto.events.Message) and not self._stream_messages:
+                full_message_event = self._message_assembler.feed(event)
+                if full_message_event is None:
+                    continue
+                if self._interceptors and self._intercept(full_message_event):
+                    continue
+                if self._router is not None:
+                    self._route_message(full_message_event)
+                elif self._on_message is not None:
+                    self._dispatch_handler(self._on_message, full_message_event)
+                else:
+                    self._put_event(full_message_event)
+                continue
+            self._put_event(event)
+
+    def _send_pong(self, event: wsproto.events.Ping) -> None:
+        with self._write_lock:
+            self._write(self.connection.send(event.response()))
+
+    def _intercept(self, event: wsproto.events.Message) -> bool:
+        """
+        Hand a message to the first interceptor taking it, if any.
+
+        Returns:
+            Whether an interceptor took the message.
+
+        Raises:
+            WebSocketHandlerError: The interceptor raised an exception.
         """
-        partial_message_buffer: str | bytes | None = None
         try:
-            while not self._should_close.is_set():
-                data = self._wait_until_closed(self._read_stream, max_bytes)
-                self.connection.receive_data(data)
-                for event in self.connection.events():
-                    if isinstance(event, wsproto.events.Ping):
-                        data = self.connection.send(event.response())
-                        with self._write_lock:
-                            self.stream.write(data)
-                        continue
-                    if isinstance(event, wsproto.events.Pong):
-                        self._ping_manager.ack(event.payload)
-                        continue
-                    if isinstance(event, wsproto.events.CloseConnection):
-                        self._should_close.set()
-                    if isinstance(event, wsproto.events.Message):
-                        # Unfinished message: bufferize
-                        if not event.message_finished:
-                            if partial_message_buffer is None:
-                                partial_message_buffer = event.data
-                            else:
-                                partial_message_buffer += event.data
-                        # Finished message but no buffer: just emit the event
-                        elif partial_message_buffer is None:
-                            self._events.put(event)
-                        # Finished message with buffer: emit the full event
-                        else:
-                            event_type = type(event)
-                            full_message_event = event_type(
-                                partial_message_buffer + event.data
-                            )
-                            partial_message_buffer = None
-                            self._events.put(full_message_event)
-                        continue
-                    self._events.put(event)
-        except (httpcore.ReadError, httpcore.WriteError, EndOfStream):
-            self.close(CloseReason.INTERNAL_ERROR, "Stream error")
-            self._events.put(WebSocketNetworkError())
-        except ShouldClose:
-            pass
+            message = _message_data(event)
+            for predicate, handler in self._interceptors:
+                if predicate(message):
+                    break
+            else:
+                return False
+        except Exception as e:
+            raise WebSocketHandlerError() from e
+        self._dispatch_handler(handler, event)
+        return True
+
+    def _route_message(self, event: wsproto.events.Message) -> None:
+        """
+        Queue a message, hand it to a handler, or drop it,
+        depending on the route it matches.
+
+        Raises:
+            WebSocketHandlerError: The router or the handler raised an exception.
+        """
+        assert self._router is not None
+        try:
+            route = self._router._match(_message_data(event))
+        except Exception as e:
+            raise WebSocketHandlerError() from e
+        if route is None:
+            return
+        if route.handler is None:
+            self._put_event(event)
+        else:
+            self._dispatch_handler(route.handler, event)
+
+    def _call_handler(
+        self,
+        handler: typing.Callable[[str | bytes], typing.Any],
+        event: wsproto.events.Message,
+    ) -> None:
+        """
+        Call a message handler, in the receive thread.
+
+        Raises:
+            WebSocketHandlerError: The handler raised an exception,
+                or the text of the message isn't valid UTF-8.
+        """
+        assert self.handler_stats is not None
+        start = time.perf_counter()
+        try:
+            # Text that isn't valid UTF-8 fails here, without `validate_utf8`
+            handler(_message_data(event))
+        except Exception as e:
+            raise WebSocketHandlerError() from e
+        finally:
+            self.handler_stats.record(time.perf_counter() - start)
+
+    def _handle_receive_error(self, exc: Exception) -> None:
+        """
+        Close the session after an error while receiving data,
+        and report it to the user.
+        """
+        if isinstance(exc, MessageTooBig):
+            self.close(CloseReason.MESSAGE_TOO_BIG, "Message too big")
+            self._put_event(
+                WebSocketDisconnect(CloseReason.MESSAGE_TOO_BIG, "Message too big")
+            )
+            return
+        if isinstance(exc, WebSocketHandlerError):
+            self.close(CloseReason.INTERNAL_ERROR, "Message handler error")
+            self._put_event(exc)
+            return
+        # The stream was shut down by close(), there is nothing to report
+        if self._should_close.is_set():
+            return
+        self.close(CloseReason.INTERNAL_ERROR, "Stream error")
+        self._put_event(WebSocketNetworkError())
+
+    def _put_event_nowait(self, event: wsproto.events.Event | HTTPXWSException) -> None:
+        """
+        Put an event in the queue without blocking, for sessions driven by a reactor.
+
+        If the queue is full, the event is kept aside
+        and the reactor stops reading from this session until the consumer
+        catches up.
+        """
+        with self._overflow_lock:
+            if not self._overflow_events:
+                try:
+                    self._events.put_nowait(event)
+                    return
+                except queue.Full:
+                    pass
+            self._overflow_events.append(event)
+            # The consumer may have made room since the queue was found full
+            drained = self._move_overflow_events()
+        assert self._reactor is not None
+        if drained:
+            self._reactor.resume(self)
+        else:
+            self._reactor.pause(self)
+
+    def _refill_events(self) -> None:
+        """
+        Move the events kept aside by the reactor to the queue,
+        and resume reading once they all fit.
+        """
+        with self._overflow_lock:
+            drained = self._move_overflow_events()
+        if drained and self._reactor is not None:
+            self._reactor.resume(self)
+
+    def _move_overflow_events(self) -> bool:
+        """
+        Move as many overflow events as possible to the queue.
+        Must be called with `_overflow_lock` held.
+
+        Returns:
+            Whether all the overflow events were moved.
+        """
+        while self._overflow_events:
+            try:
+                self._events.put_nowait(self._overflow_events[0])
+            except queue.Full:
+                return False
+            self._overflow_events.popleft()
+        return True
 
     def _background_keepalive_ping(
         self, interval_seconds: float, timeout_seconds: float | None = None
     ) -> None:
-        try:
-            while not self._should_close.is_set():
-                should_close = self._wait_until_closed(
-                    self._should_close.wait, interval_seconds
-                )
-                if should_close:
-                    raise ShouldClose()
+        while not self._should_close.wait(interval_seconds):
+            try:
                 pong_callback = self.ping()
-                if timeout_seconds is not None:
-                    acknowledged = self._wait_until_closed(
-                        pong_callback.wait, timeout_seconds
-                    )
-                    if not acknowledged:
-                        self.close(CloseReason.INTERNAL_ERROR, "Keepalive ping timeout")
-                        self._events.put(WebSocketNetworkError())
-        except ShouldClose:
-            pass
-
-    def _wait_until_closed(
-        self, callable: typing.Callable[..., TaskResult], *args, **kwargs
-    ) -> TaskResult:
-        try:
-            executor, should_close_task = self._get_executor_should_close_task()
-            todo_task = executor.submit(callable, *args, **kwargs)
-        except RuntimeError as e:
-            raise ShouldClose() from e
-        else:
-            done, _ = concurrent.futures.wait(
-                (todo_task, should_close_task),  # type: ignore[misc]
-                return_when=concurrent.futures.FIRST_COMPLETED,
-            )
-            if should_close_task in done:
-                raise ShouldClose()
-            assert todo_task in done
-            result = todo_task.result()
-        return result
+            # Connection is closing, exit the thread
+            except wsproto.utilities.LocalProtocolError:
+                return
+            except WebSocketNetworkError as e:
+                self._put_event(e)
+                return
+
+            if timeout_seconds is not None:
+                self._keepalive_pong_callback = pong_callback
+                acknowledged = pong_callback.wait(timeout_seconds)
+                if self._should_close.is_set():
+                    return
+                if not acknowledged:
+                    self.close(CloseReason.INTERNAL_ERROR, "Keepalive ping timeout")
+                    self._put_event(WebSocketNetworkError())
+
+    def _acquire_write_lock(self, message: bool = True) -> None:
+        """
+        Acquire `_write_lock`, to send a message or a control frame.
+
+        A message has to wait for the end of the message sent
+        in fragments, if any: their frames can't be interleaved.
+
+        Args:
+            message: Whether it's to send a message.
+        """
+        while True:
+            self._write_lock.acquire()
+            fragmented_message = self._fragmented_message
+            if fragmented_message is None or not message:
+                return
+            self._write_lock.release()
+            fragmented_message.wait()
+
+    def _write(self, data: bytes | bytearray, flush: bool = False) -> None:
+        """
+        Write data to the stream, or hold it back while batching.
+
+        Must be called with `_write_lock` held.
+
+        Args:
+            data: The data to write.
+            flush: Whether to write the data held back right away.
+        """
+        data = self._coalesce(data, flush)
+        if not data:
+            return
+        if self._send_queue is None:
+            with self._stream_lock:
+                # Frames may be bytearrays: streams write any bytes-like object
+                self.stream.write(data)  # type: ignore[arg-type]
+            return
+        if self._write_error is not None:
+            raise httpcore.WriteError() from self._write_error
+        self._send_queue.put(data)
+
+    def _coalesce(
+        self, data: bytes | bytearray, flush: bool = False
+    ) -> bytes | bytearray:
+        """
+        Hold back data while batching.
+
+        Must be called with `_write_lock` held.
+
+        Args:
+            data: The data to write.
+            flush: Whether to release the data held back right away.
+
+        Returns:
+            The data to write now, empty if it's held back.
+        """
+        if self._batch_depth > 0 or self._batch:
+            self._batch.append(data)
+            self._batch_size += len(data)
+            if (
+                not flush
+                and self._batch_depth > 0
+                and self._batch_size < self._batch_max_bytes
+            ):
+                return b""
+            data = b"".join(self._batch)
+            self._batch = []
+            self._batch_size = 0
+        return data
+
+    def _background_write(
+        self, send_queue: queue.Queue[bytes | bytearray | None]
+    ) -> None:
+        """
+        Background thread writing the queued frames to the stream.
+
+        After a write error, the next frames are discarded
+        and the next sends raise the error.
+
+        Args:
+            send_queue: The queue of frames to write, ended by `None`.
+        """
+        while True:
+            data = send_queue.get()
+            try:
+                if data is None:
+                    return
+                if self._write_error is None:
+                    try:
+                        with self._stream_lock:
+                            self.stream.write(data)  # type: ignore[arg-type]
+                    except httpcore.WriteError as e:
+                        self._write_error = e
+                        self._shutdown_stream()
+            finally:
+                send_queue.task_done()
+
+    def _stop_writer(self) -> None:
+        """
+        Wait for the background writer to send the queued frames, and stop it.
+
+        The next frames are written directly to the stream.
+        """
+        if self._send_queue is None:
+            return
+        with self._write_lock:
+            if self._send_queue is None:
+                return
+            if self._background_write_task is not None:
+                self._send_queue.put(None)
+                self._background_write_task.join()
+            self._send_queue = None
 
     def _read_stream(self, max_bytes: int) -> bytes:
         data = self.stream.read(max_bytes)
@@ -565,6 +1791,18 @@ class WebSocketSession:
             raise EndOfStream()
         return data
 
+    def _shutdown_stream(self) -> None:
+        """
+        Shut down the underlying socket, if any.
+
+        It makes a blocking read in the receive thread return immediately,
+        so the thread can exit without waiting for the server.
+        """
+        sock = self.stream.get_extra_info("socket")
+        if isinstance(sock, socket.socket):
+            with contextlib.suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+
 
 class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
     """
@@ -604,105 +1842,443 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
     _send_event: MemoryObjectSendStream[wsproto.events.Event | HTTPXWSException]
     _receive_event: MemoryObjectReceiveStream[wsproto.events.Event | HTTPXWSException]
 
-    def __init__(
-        self,
-        stream: AsyncNetworkStream,
-        *,
-        max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
-        queue_size: int = DEFAULT_QUEUE_SIZE,
-        keepalive_ping_interval_seconds: float
-        | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
-        keepalive_ping_timeout_seconds: float
-        | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
-        response: httpx.Response | None = None,
+    def __init__(
+        self,
+        stream: AsyncNetworkStream,
+        *,
+        max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
+        read_size: ReadSizeOption | None = None,
+        max_message_size: int | None = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        keepalive_ping_interval_seconds: float
+        | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
+        keepalive_ping_timeout_seconds: float
+        | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
+        compression: CompressionOption | None = None,
+        send_queue_size: int | None = None,
+        stream_messages: bool = False,
+        raw_text: bool = False,
+        validate_utf8: bool = True,
+        json_codec: JSONCodec | None = None,
+        json_type: typing.Any = None,
+        on_message: AsyncMessageHandler | None = None,
+        router: MessageRouter | None = None,
+        response: httpx.Response | None = None,
+    ) -> None:
+        self.stream = stream
+        self.response = response
+        if self.response is not None:
+            self.subprotocol = self.response.headers.get("sec-websocket-protocol")
+        else:
+            self.subprotocol = None
+        self._compression = _negotiate_compression(
+            get_compression(compression), response
+        )
+        self.connection = wsproto.connection.Connection(
+            wsproto.ConnectionType.CLIENT,
+            [self._compression] if self._compression is not None else [],
+        )
+        if raw_text or not validate_utf8:
+            install_raw_text_decoder(self.connection, validate_utf8)
+
+        self._ping_manager = AsyncPingManager()
+        self._should_close = anyio.Event()
+        # Called once the session starts closing, see add_close_callback()
+        self._close_callbacks: list[typing.Callable[[], None]] = []
+        self._write_lock = anyio.Lock()
+        # Frames held back while batching, see batch()
+        self._batch: list[bytes | bytearray] = []
+        self._batch_size = 0
+        self._batch_depth = 0
+        self._batch_max_bytes = DEFAULT_BATCH_MAX_BYTES
+        # Frames waiting for the background writer, if any
+        assert send_queue_size is None or send_queue_size > 0
+        self._send_queue_size = send_queue_size
+        self._send_queue: MemoryObjectSendStream[bytes | bytearray] | None = None
+        self._write_error: httpcore.WriteError | None = None
+        self._pending_writes = 0
+        self._writes_drained = anyio.Event()
+        self._writer_done = anyio.Event()
+        # Set while a message is sent in fragments, see send_stream()
+        self._fragmented_message: anyio.Event | None = None
+        self._resume_reading: anyio.Event | None = None
+        # Reassembles the fragmented messages in the consumer,
+        # if they are streamed. Otherwise, the receive task does it.
+        self._message_assembler = MessageAssembler(max_message_size)
+        self._stream_messages = stream_messages
+        self._raw_text = raw_text or not validate_utf8
+        self._json_codec = json_codec if json_codec is not None else DEFAULT_JSON_CODEC
+        self._json_type = json_type
+        assert on_message is None or not stream_messages
+        assert router is None or not (stream_messages or on_message)
+        self._on_message = on_message
+        self._router = router
+        # Checked before the router and the handler, see intercept()
+        self._interceptors: list[tuple[Predicate, RouteHandler]] = []
+        # Runtime of the message handlers
+        self.handler_stats = (
+            HandlerStats() if on_message is not None or router is not None else None
+        )
+        # Whether receive_stream() is in the middle of a message:
+        # if it's abandoned, the rest of the message is dropped.
+        self._partial_message = False
+        # Closing event or error taken from the queue by receive_many(),
+        # handed over by the next call
+        self._deferred_event: wsproto.events.Event | HTTPXWSException | None = None
+
+        self._read_size = read_size if read_size is not None else max_message_size_bytes
+        self._max_message_size = max_message_size
+        self._queue_size = queue_size
+        # Reading from the network is paused when the queue reaches the high
+        # watermark, and resumed when the consumer drained it to the low watermark.
+        self._queue_high_watermark = queue_size if queue_size > 0 else None
+        self._queue_low_watermark = queue_size // 2
+
+        # Always disable keepalive ping when emulating ASGI
+        if isinstance(stream, ASGIWebSocketAsyncNetworkStream):
+            self._keepalive_ping_interval_seconds = None
+            self._keepalive_ping_timeout_seconds = None
+        else:
+            self._keepalive_ping_interval_seconds = keepalive_ping_interval_seconds
+            self._keepalive_ping_timeout_seconds = keepalive_ping_timeout_seconds
+
+    @contextlib.asynccontextmanager
+    async def __asynccontextmanager__(
+        self,
+    ) -> "typing.AsyncGenerator[AsyncWebSocketSession, None]":
+        self._send_event, self._receive_event = anyio.create_memory_object_stream[
+            wsproto.events.Event | HTTPXWSException
+        ](self._queue_size)
+        self._background_task_group = anyio.create_task_group()
+
+        async with self._send_event, self._receive_event, self._background_task_group:
+            self._background_task_group.start_soon(
+                self._background_receive, get_read_size(self._read_size)
+            )
+            if self._send_queue_size is not None:
+                self._send_queue, receive_queue = anyio.create_memory_object_stream[
+                    bytes | bytearray
+                ](self._send_queue_size)
+                self._background_task_group.start_soon(
+                    self._background_write, receive_queue
+                )
+            if self._keepalive_ping_interval_seconds is not None:
+                self._background_task_group.start_soon(
+                    self._background_keepalive_ping,
+                    self._keepalive_ping_interval_seconds,
+                    self._keepalive_ping_timeout_seconds,
+                )
+
+            try:
+                yield self
+            finally:
+                # Let the writer send the queued frames before it's cancelled
+                with anyio.CancelScope(shield=True):
+                    await self._stop_writer()
+                self._background_task_group.cancel_scope.cancel()
+                with anyio.CancelScope(shield=True):
+                    await self.close()
+
+    async def ping(self, payload: bytes = b"") -> anyio.Event:
+        """
+        Send a Ping message.
+
+        Args:
+            payload:
+                Payload to attach to the Ping event.
+                Internally, it's used to track this specific event.
+                If left empty, a random one will be generated.
+
+        Returns:
+            An event that can be used to wait for the corresponding Pong response.
+
+        Examples:
+            Send a Ping and wait for the Pong
+
+                pong_callback = await ws.ping()
+                # Will block until the corresponding Pong is received.
+                await pong_callback.wait()
+        """
+        ping_id, callback = self._ping_manager.create(payload)
+        event = wsproto.events.Ping(ping_id)
+        await self.send(event)
+        return callback
+
+    async def send(
+        self, event: wsproto.events.Event, compress: bool | None = None
+    ) -> None:
+        """
+        Send an Event message.
+
+        Mainly useful to send events that are not supported by the library.
+        Most of the time, [ping()][httpx_ws.AsyncWebSocketSession.ping],
+        [send_text()][httpx_ws.AsyncWebSocketSession.send_text],
+        [send_bytes()][httpx_ws.AsyncWebSocketSession.send_bytes]
+        and [send_json()][httpx_ws.AsyncWebSocketSession.send_json] are preferred.
+
+        Args:
+            event: The event to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Send an event.
+
+                event = await wsproto.events.Message(b"Hello!")
+                ws.send(event)
+        """
+        try:
+            # Serialize under the lock: compressed frames must be sent in order
+            await self._acquire_write_lock(isinstance(event, wsproto.events.Message))
+            try:
+                if self._compression is not None:
+                    self._compression.compress_next_message = compress
+                await self._write(self.connection.send(event))
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+
+    async def send_text(self, data: str, compress: bool | None = None) -> None:
+        """
+        Send a text message.
+
+        Args:
+            data: The text to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Send a text message.
+
+                await ws.send_text("Hello!")
+
+            Send a short message uncompressed.
+
+                await ws.send_text("ack", compress=False)
+        """
+        event = wsproto.events.TextMessage(data=data)
+        await self.send(event, compress)
+
+    async def send_bytes(self, data: Buffer, compress: bool | None = None) -> None:
+        """
+        Send a bytes message.
+
+        The data is masked straight into the outgoing frame, so it can be
+        any object supporting the buffer protocol, like a `bytearray`,
+        a `memoryview` or an array, without converting it to `bytes` first.
+
+        Args:
+            data: The data to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Send a bytes message.
+
+                await ws.send_bytes(b"Hello!")
+
+            Send a slice of a buffer, without copying it.
+
+                await ws.send_bytes(memoryview(buffer)[offset:offset + size])
+        """
+        await self._send_buffer(data, Opcode.BINARY, compress)
+
+    async def send_json(
+        self,
+        data: typing.Any,
+        mode: JSONMode = "text",
+        compress: bool | None = None,
+    ) -> None:
+        """
+        Send JSON data.
+
+        Args:
+            data:
+                The data to send. Must be serializable by the
+                [JSON codec][httpx_ws.JSONCodec] of the session,
+                [json.dumps][json.dumps] by default.
+            mode:
+                The sending mode. Should either be `'text'` or `'bytes'`.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Send JSON data.
+
+                data = {"message": "Hello!"}
+                await ws.send_json(data)
+        """
+        assert mode in ["text", "binary"]
+        serialized_data = self._json_codec.dumps(data)
+        if isinstance(serialized_data, str):
+            if mode == "text":
+                await self.send_text(serialized_data, compress)
+                return
+            serialized_data = serialized_data.encode("utf-8")
+        # Already UTF-8: no need to decode it for a text message
+        opcode = Opcode.TEXT if mode == "text" else Opcode.BINARY
+        await self._send_buffer(serialized_data, opcode, compress)
+
+    async def send_prepared(
+        self, message: PreparedMessage, compress: bool | None = None
     ) -> None:
-        self.stream = stream
-        self.connection = wsproto.connection.Connection(wsproto.ConnectionType.CLIENT)
-        self.response = response
-        if self.response is not None:
-            self.subprotocol = self.response.headers.get("sec-websocket-protocol")
-        else:
-            self.subprotocol = None
+        """
+        Send a [PreparedMessage][httpx_ws.PreparedMessage].
 
-        self._ping_manager = AsyncPingManager()
-        self._should_close = anyio.Event()
-        self._write_lock = anyio.Lock()
+        The message is serialized and framed only once,
+        whatever the number of sessions it's sent to.
 
-        self._max_message_size_bytes = max_message_size_bytes
-        self._queue_size = queue_size
+        Args:
+            message: The prepared message to send.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
-        # Always disable keepalive ping when emulating ASGI
-        if isinstance(stream, ASGIWebSocketAsyncNetworkStream):
-            self._keepalive_ping_interval_seconds = None
-            self._keepalive_ping_timeout_seconds = None
-        else:
-            self._keepalive_ping_interval_seconds = keepalive_ping_interval_seconds
-            self._keepalive_ping_timeout_seconds = keepalive_ping_timeout_seconds
+        Raises:
+            WebSocketNetworkError: A network error occured.
 
-    @contextlib.asynccontextmanager
-    async def __asynccontextmanager__(
-        self,
-    ) -> "typing.AsyncGenerator[AsyncWebSocketSession, None]":
-        self._send_event, self._receive_event = anyio.create_memory_object_stream[
-            wsproto.events.Event | HTTPXWSException
-        ]()
-        self._background_task_group = anyio.create_task_group()
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
 
-        async with self._send_event, self._receive_event, self._background_task_group:
-            self._background_task_group.start_soon(
-                self._background_receive, self._max_message_size_bytes
-            )
-            if self._keepalive_ping_interval_seconds is not None:
-                self._background_task_group.start_soon(
-                    self._background_keepalive_ping,
-                    self._keepalive_ping_interval_seconds,
-                    self._keepalive_ping_timeout_seconds,
-                )
+        Examples:
+            Send the same message to many sessions.
 
+                message = PreparedMessage.from_json({"message": "Hello!"})
+                for ws in sessions:
+                    await ws.send_prepared(message)
+        """
+        try:
+            await self._acquire_write_lock()
             try:
-                yield self
+                data = message.frame(self.connection, self._compression, compress)
+                await self._write(data)
             finally:
-                self._background_task_group.cancel_scope.cancel()
-                with anyio.CancelScope(shield=True):
-                    await self.close()
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
 
-    async def ping(self, payload: bytes = b"") -> anyio.Event:
+    async def send_many(
+        self, messages: typing.Iterable[typing.Any], compress: bool | None = None
+    ) -> None:
         """
-        Send a Ping message.
+        Send many messages in a single write.
+
+        The messages are framed one after the other under a single lock
+        and written at once, which is much cheaper than sending them one by one
+        when there are many small ones.
 
         Args:
-            payload:
-                Payload to attach to the Ping event.
-                Internally, it's used to track this specific event.
-                If left empty, a random one will be generated.
+            messages:
+                The messages to send. Text if it's a string, binary if it's
+                bytes or another buffer. Other objects, like dictionaries,
+                are serialized into JSON text messages with the JSON codec
+                of the session. They're all serialized before any is sent.
+            compress:
+                Whether to compress the messages, if compression was negotiated.
+                Defaults to `None`, meaning each one is compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
-        Returns:
-            An event that can be used to wait for the corresponding Pong response.
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
 
         Examples:
-            Send a Ping and wait for the Pong
+            Replay a backlog of messages.
 
-                pong_callback = await ws.ping()
-                # Will block until the corresponding Pong is received.
-                await pong_callback.wait()
+                await ws.send_many(backlog)
         """
-        ping_id, callback = self._ping_manager.create(payload)
-        event = wsproto.events.Ping(ping_id)
-        await self.send(event)
-        return callback
+        serialized = _serialize_messages(messages, self._json_codec)
+        try:
+            await self._acquire_write_lock()
+            try:
+                data = _frame_messages(
+                    self.connection, self._compression, serialized, compress
+                )
+                await self._write(data)
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
 
-    async def send(self, event: wsproto.events.Event) -> None:
+    async def send_stream(
+        self,
+        chunks: typing.Iterable[str | bytes] | typing.AsyncIterable[str | bytes],
+        fragment_size: int | None = None,
+        compress: bool | None = None,
+    ) -> None:
         """
-        Send an Event message.
+        Send a message produced piece by piece, in fragmented frames.
 
-        Mainly useful to send events that are not supported by the library.
-        Most of the time, [ping()][httpx_ws.AsyncWebSocketSession.ping],
-        [send_text()][httpx_ws.AsyncWebSocketSession.send_text],
-        [send_bytes()][httpx_ws.AsyncWebSocketSession.send_bytes]
-        and [send_json()][httpx_ws.AsyncWebSocketSession.send_json] are preferred.
+        Each chunk is sent as soon as it's produced,
+        so the whole message never needs to be held in memory.
+        The other messages wait until this one is finished,
+        while Ping and Pong frames can still be sent in between.
 
         Args:
-            event: The event to send.
+            chunks:
+                The pieces of the message, from a sync or async iterable.
+                Text if they're strings, binary if they're bytes.
+                Without any, an empty binary message is sent,
+                like for an empty file with `send_file()`.
+            fragment_size:
+                Maximum size of the frames, in bytes for a binary message
+                and characters for a text message. Larger chunks are split.
+                Defaults to `None`, meaning a frame per chunk.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if its first chunk
+                is at least [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -713,25 +2289,73 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             outside the `async with` block.
 
         Examples:
-            Send an event.
+            Send the rows of a large report as a single message.
 
-                event = await wsproto.events.Message(b"Hello!")
-                ws.send(event)
+                await ws.send_stream(f"{row}\\n" for row in rows)
         """
+        fragmented_message: anyio.Event | None = None
+        fragment: str | bytes = b""
         try:
-            data = self.connection.send(event)
+            async for chunk in _aiterate(chunks):
+                for fragment in _fragments(chunk, fragment_size):
+                    if fragmented_message is None:
+                        await self._acquire_write_lock()
+                        fragmented_message = anyio.Event()
+                        self._fragmented_message = fragmented_message
+                        if self._compression is not None:
+                            self._compression.compress_next_message = compress
+                    else:
+                        await self._write_lock.acquire()
+                    try:
+                        event = _fragment_event(fragment)
+                        await self._write(self.connection.send(event))
+                    finally:
+                        self._write_lock.release()
+            if fragmented_message is None:
+                # The peer still expects a message
+                await self._send_buffer(b"", Opcode.BINARY, compress)
+                return
             async with self._write_lock:
-                await self.stream.write(data)
+                event = _fragment_event(fragment[:0], message_finished=True)
+                await self._write(self.connection.send(event))
         except httpcore.WriteError as e:
             await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
             raise WebSocketNetworkError() from e
-
-    async def send_text(self, data: str) -> None:
+        except BaseException:
+            # The peer can't make sense of the next messages anymore
+            if fragmented_message is not None:
+                with anyio.CancelScope(shield=True):
+                    await self.close(CloseReason.INTERNAL_ERROR, "Message stream error")
+            raise
+        finally:
+            if fragmented_message is not None:
+                self._fragmented_message = None
+                fragmented_message.set()
+
+    async def send_file(
+        self,
+        file: str | os.PathLike[str] | typing.BinaryIO,
+        fragment_size: int = DEFAULT_FRAGMENT_SIZE,
+        compress: bool | None = None,
+    ) -> None:
         """
-        Send a text message.
+        Send the content of a file as a binary message, in fragmented frames.
+
+        The file is read and sent one fragment at a time,
+        so it never needs to be held in memory.
 
         Args:
-            data: The text to send.
+            file:
+                Path of the file, or file opened in binary mode.
+                A file passed as an object is read from its current position,
+                and isn't closed.
+            fragment_size:
+                Size of the frames, in bytes.
+                Defaults to 64 KiB.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if its first fragment
+                is at least [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -742,19 +2366,86 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             outside the `async with` block.
 
         Examples:
-            Send a text message.
+            Upload a file.
 
-                await ws.send_text("Hello!")
+                await ws.send_file("backup.tar.gz")
         """
-        event = wsproto.events.TextMessage(data=data)
-        await self.send(event)
+        if isinstance(file, str | os.PathLike):
+            async with await anyio.open_file(file, "rb") as f:
+                await self.send_stream(
+                    _aread_chunks(f, fragment_size), compress=compress
+                )
+        else:
+            await self.send_stream(
+                _aread_chunks(anyio.wrap_file(file), fragment_size), compress=compress
+            )
 
-    async def send_bytes(self, data: bytes) -> None:
+    def send_nowait(self, message: typing.Any, compress: bool | None = None) -> None:
         """
-        Send a bytes message.
+        Queue a message for the background writer, without waiting.
+
+        Only available if the session has a send queue,
+        see `send_queue_size`.
 
         Args:
-            data: The data to send.
+            message:
+                The message to send. Text if it's a string, binary if it's
+                bytes or another buffer. Other objects, like dictionaries,
+                are serialized into a JSON text message with the JSON codec
+                of the session.
+            compress:
+                Whether to compress the message, if compression was negotiated.
+                Defaults to `None`, meaning it's compressed if it's at least
+                [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+        Raises:
+            WebSocketSendQueueFull:
+                The send queue is full, or a message is being sent
+                in fragments.
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Drop the updates the network can't keep up with.
+
+                try:
+                    ws.send_nowait(update)
+                except WebSocketSendQueueFull:
+                    dropped += 1
+        """
+        if self._send_queue_size is None:
+            raise RuntimeError("send_nowait() requires a send queue")
+        serialized = _serialize_messages([message], self._json_codec)
+        try:
+            self._write_lock.acquire_nowait()
+        except anyio.WouldBlock:
+            raise WebSocketSendQueueFull() from None
+        try:
+            if self._fragmented_message is not None:
+                raise WebSocketSendQueueFull()
+            if self._send_queue is not None:
+                statistics = self._send_queue.statistics()
+                if statistics.current_buffer_used >= statistics.max_buffer_size:
+                    raise WebSocketSendQueueFull()
+            data = self._coalesce(
+                _frame_messages(
+                    self.connection, self._compression, serialized, compress
+                )
+            )
+            if not data:
+                return
+            if self._write_error is not None:
+                raise WebSocketNetworkError() from self._write_error
+            assert self._send_queue is not None
+            self._pending_writes += 1
+            self._send_queue.send_nowait(data)
+        finally:
+            self._write_lock.release()
+
+    async def drain(self) -> None:
+        """
+        Wait until the background writer sent the queued frames to the network.
+
+        Returns immediately if the session has no send queue.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -765,22 +2456,40 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             outside the `async with` block.
 
         Examples:
-            Send a bytes message.
+            Make sure the messages are sent before doing something else.
 
-                await ws.send_bytes(b"Hello!")
+                for update in updates:
+                    ws.send_nowait(update)
+                await ws.drain()
         """
-        event = wsproto.events.BytesMessage(data=data)
-        await self.send(event)
+        while self._pending_writes > 0:
+            if self._writes_drained.is_set():
+                self._writes_drained = anyio.Event()
+            await self._writes_drained.wait()
+        if self._write_error is not None:
+            await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from self._write_error
 
-    async def send_json(self, data: typing.Any, mode: JSONMode = "text") -> None:
+    @contextlib.asynccontextmanager
+    async def batch(
+        self, max_bytes: int = DEFAULT_BATCH_MAX_BYTES
+    ) -> typing.AsyncGenerator[None, None]:
         """
-        Send JSON data.
+        Coalesce the frames sent in the block into fewer writes to the network.
+
+        Inside the block, frames aren't written to the network right away:
+        they're held back and written at once when exiting the block,
+        or earlier if they exceed `max_bytes`.
+        It also applies to frames sent by the background tasks,
+        like Pong replies.
+
+        It saves system calls when sending bursts of small messages.
 
         Args:
-            data:
-                The data to send. Must be serializable by [json.dumps][json.dumps].
-            mode:
-                The sending mode. Should either be `'text'` or `'bytes'`.
+            max_bytes:
+                Number of held back bytes above which they are written
+                without waiting for the end of the block.
+                Defaults to 65 KiB.
 
         Raises:
             WebSocketNetworkError: A network error occured.
@@ -791,17 +2500,75 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             outside the `async with` block.
 
         Examples:
-            Send JSON data.
+            Send many small messages in a few writes.
 
-                data = {"message": "Hello!"}
-                await ws.send_json(data)
+                async with ws.batch():
+                    for order in orders:
+                        await ws.send_json(order)
         """
-        assert mode in ["text", "binary"]
-        serialized_data = json.dumps(data)
-        if mode == "text":
-            await self.send_text(serialized_data)
-        else:
-            await self.send_bytes(serialized_data.encode("utf-8"))
+        async with self._write_lock:
+            self._batch_depth += 1
+            if self._batch_depth == 1:
+                self._batch_max_bytes = max_bytes
+        try:
+            yield
+        finally:
+            try:
+                with anyio.CancelScope(shield=True):
+                    async with self._write_lock:
+                        self._batch_depth -= 1
+                        if self._batch_depth == 0:
+                            await self._write(b"", flush=True)
+            except httpcore.WriteError as e:
+                await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+                raise WebSocketNetworkError() from e
+
+    async def _send_prepared_within(
+        self,
+        message: PreparedMessage,
+        compress: bool | None,
+        timeout: float | None,
+        evict: bool,
+    ) -> None:
+        """
+        Send a prepared message, giving up after `timeout` seconds.
+
+        If the delay expires while waiting for another write to finish,
+        nothing was sent and the session is left open, unless `evict` is set.
+        If it expires in the middle of the write, the frame is truncated:
+        the session can't be used anymore and is always aborted.
+
+        Raises:
+            TimeoutError: The message wasn't sent in time.
+            WebSocketNetworkError: A network error occured.
+        """
+        writing = False
+        with anyio.move_on_after(timeout) as scope:
+            try:
+                await self._acquire_write_lock()
+                try:
+                    data = message.frame(self.connection, self._compression, compress)
+                    writing = True
+                    await self._write(data)
+                finally:
+                    self._write_lock.release()
+            except httpcore.WriteError as e:
+                await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+                raise WebSocketNetworkError() from e
+        if scope.cancelled_caught:
+            if writing or evict:
+                await self._abort()
+            raise TimeoutError()
+
+    async def _abort(self) -> None:
+        """
+        Close the stream without the closing handshake.
+
+        The receive task then reports
+        [WebSocketNetworkError][httpx_ws.WebSocketNetworkError] to the consumer.
+        """
+        with anyio.CancelScope(shield=True):
+            await self.stream.aclose()
 
     async def receive(self, timeout: float | None = None) -> wsproto.events.Event:
         """
@@ -847,14 +2614,264 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
                 except WebSocketDisconnect:
                     print("Connection closed")
         """
-        with anyio.fail_after(timeout):
-            event = await self._receive_event.receive()
+        event = await self._next_event(timeout)
+        if self._stream_messages and isinstance(event, wsproto.events.Message):
+            return await self._assemble_message(event, timeout)
+        return event
+
+    async def receive_many(
+        self, max_messages: int = 100, timeout: float | None = None
+    ) -> list[wsproto.events.Event]:
+        """
+        Receive the events available from the server, all at once.
+
+        Waits for a first event, then takes the ones already queued behind it,
+        up to `max_messages`, without waiting any further. Consumers processing
+        messages in bulk, like writing them to a database, save a queue access
+        and a task switch for each of them.
+
+        In the middle of a streamed message, with `stream_messages`,
+        the rest of the message is still waited for.
+        If the server closed the websocket or an error occured after some events,
+        those events are returned first, and the next call raises.
+
+        Args:
+            max_messages:
+                Maximum number of events to return.
+            timeout:
+                Number of seconds to wait for the first event.
+                If `None`, will block until an event is available.
+
+        Returns:
+            A list of raw [wsproto.events.Event][wsproto.events.Event],
+            with at least one event.
+
+        Raises:
+            TimeoutError: No event was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Insert the messages in a database, in batches.
+
+                while True:
+                    events = await ws.receive_many(max_messages=500)
+                    await db.insert_many([event.data for event in events])
+        """
+        assert max_messages > 0
+        events = [await self.receive(timeout)]
+        get_event = self._receive_event.receive_nowait
+        while len(events) < max_messages:
+            try:
+                event = get_event()
+            except anyio.WouldBlock:
+                break
+            if isinstance(event, wsproto.events.Message):
+                if self._partial_message:
+                    # Rest of a message abandoned by receive_stream()
+                    self._partial_message = not event.message_finished
+                    continue
+                if self._stream_messages:
+                    try:
+                        event = await self._assemble_message(event, timeout)
+                    except TimeoutError:
+                        # The assembler keeps the fragments for the next call
+                        break
+                    except HTTPXWSException as e:
+                        self._deferred_event = e
+                        break
+            elif isinstance(event, wsproto.events.CloseConnection | HTTPXWSException):
+                self._deferred_event = event
+                break
+            events.append(event)
+        self._check_resume_reading()
+        return events
+
+    async def receive_stream(
+        self, timeout: float | None = None
+    ) -> typing.AsyncIterator[str | bytes]:
+        """
+        Receive a message piece by piece, as its fragments arrive.
+
+        The fragments are only handed over as they arrive if the session
+        was created with `stream_messages`. Otherwise, the message is
+        reassembled first, and given as a single piece.
+
+        Args:
+            timeout:
+                Number of seconds to wait for each fragment.
+                If `None`, will block until a fragment is available.
+
+        Yields:
+            The fragments of the message.
+            Strings for a text message, bytes for a binary message.
+
+        Raises:
+            TimeoutError: No fragment was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: The received event was not a message.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Write a large binary message to a file, without holding it in memory.
+
+                async with await anyio.open_file("dump.bin", "wb") as file:
+                    async for chunk in ws.receive_stream():
+                        await file.write(chunk)
+        """
+        event = await self._next_event(timeout)
+        if not isinstance(event, wsproto.events.Message):
+            raise WebSocketInvalidTypeReceived(event)
+        self._partial_message = not event.message_finished
+        yield event.data
+        while not event.message_finished:
+            event = typing.cast(
+                wsproto.events.Message,
+                await self._next_event(timeout, continuation=True),
+            )
+            self._partial_message = not event.message_finished
+            yield event.data
+
+    def _start_closing(self) -> None:
+        """
+        Flag the session as closing, and notify the ones waiting on it.
+        """
+        self._should_close.set()
+        callbacks, self._close_callbacks = self._close_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    async def _send_buffer(
+        self, data: Buffer, opcode: Opcode, compress: bool | None
+    ) -> None:
+        """
+        Send a message from any buffer, see `_frame_buffer()`.
+        """
+        try:
+            await self._acquire_write_lock()
+            try:
+                data = _frame_buffer(
+                    self.connection, self._compression, data, compress, opcode
+                )
+                await self._write(data)
+            finally:
+                self._write_lock.release()
+        except httpcore.WriteError as e:
+            await self.close(CloseReason.INTERNAL_ERROR, "Stream write error")
+            raise WebSocketNetworkError() from e
+
+    async def _iter_messages(self) -> typing.AsyncIterator[wsproto.events.Message]:
+        """
+        Iterate over the messages, until the server closes the connection.
+
+        A lighter loop than calling `receive()` for each message:
+        it waits without timeout, and ends on the closing events
+        instead of raising them.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+        """
+        if self._deferred_event is not None:
+            event, self._deferred_event = self._deferred_event, None
+            if isinstance(event, HTTPXWSException) and not isinstance(
+                event, WebSocketDisconnect
+            ):
+                raise event
+            return
+        receive_event = self._receive_event.receive
+        while True:
+            event = await receive_event()
+            self._check_resume_reading()
+            if isinstance(event, wsproto.events.Message):
+                if self._partial_message:
+                    # Rest of a message abandoned by receive_stream()
+                    self._partial_message = not event.message_finished
+                    continue
+                if self._stream_messages:
+                    try:
+                        event = await self._assemble_message(event, None)
+                    except WebSocketDisconnect:
+                        return
+                yield event
+            elif isinstance(
+                event, wsproto.events.CloseConnection | WebSocketDisconnect
+            ):
+                return
+            elif isinstance(event, HTTPXWSException):
+                raise event
+
+    async def _next_event(
+        self, timeout: float | None, continuation: bool = False
+    ) -> wsproto.events.Event:
+        """
+        Get the next event from the queue.
+
+        Args:
+            timeout: Number of seconds to wait for an event.
+            continuation: Whether it's to continue the message
+                streamed by receive_stream().
+
+        Raises:
+            TimeoutError: No event was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+        """
+        if self._deferred_event is not None:
+            event, self._deferred_event = self._deferred_event, None
+        else:
+            with anyio.fail_after(timeout):
+                while True:
+                    event = await self._receive_event.receive()
+                    self._check_resume_reading()
+                    if (
+                        continuation
+                        or not self._partial_message
+                        or not isinstance(event, wsproto.events.Message)
+                    ):
+                        break
+                    # Rest of a message abandoned by receive_stream()
+                    self._partial_message = not event.message_finished
         if isinstance(event, HTTPXWSException):
             raise event
         if isinstance(event, wsproto.events.CloseConnection):
             raise WebSocketDisconnect(event.code, event.reason)
         return event
 
+    async def _assemble_message(
+        self, event: wsproto.events.Message, timeout: float | None
+    ) -> wsproto.events.Message:
+        """
+        Reassemble a streamed message from its fragments.
+
+        Raises:
+            TimeoutError: No fragment was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket,
+                or the message exceeded `max_message_size`.
+            WebSocketNetworkError: A network error occured.
+        """
+        try:
+            while (message := self._message_assembler.feed(event)) is None:
+                event = typing.cast(
+                    wsproto.events.Message, await self._next_event(timeout)
+                )
+        except MessageTooBig:
+            self._partial_message = not event.message_finished
+            await self.close(CloseReason.MESSAGE_TOO_BIG, "Message too big")
+            raise WebSocketDisconnect(
+                CloseReason.MESSAGE_TOO_BIG, "Message too big"
+            ) from None
+        return message
+
     async def receive_text(self, timeout: float | None = None) -> str:
         """
         Receive text from the server.
@@ -872,6 +2889,8 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             WebSocketDisconnect: The server closed the websocket.
             WebSocketNetworkError: A network error occured.
             WebSocketInvalidTypeReceived: The received event was not a text message.
+            WebSocketInvalidTextReceived: The text message isn't valid UTF-8,
+                with `validate_utf8=False`.
 
         Note:
             Exceptions not caught inside the context manager will be
@@ -897,7 +2916,44 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
         """
         event = await self.receive(timeout)
         if isinstance(event, wsproto.events.TextMessage):
-            return event.data
+            return _text(event)
+        raise WebSocketInvalidTypeReceived(event)
+
+    async def receive_text_bytes(self, timeout: float | None = None) -> bytes:
+        """
+        Receive text from the server, as UTF-8 bytes.
+
+        Useful for parsers working on bytes. If the session was created
+        with `raw_text`, the text is handed over as received, without being
+        decoded. Otherwise, it's encoded again.
+
+        Args:
+            timeout:
+                Number of seconds to wait for an event.
+                If `None`, will block until an event is available.
+
+        Returns:
+            Text data, encoded in UTF-8.
+
+        Raises:
+            TimeoutError: No event was received before the timeout delay.
+            WebSocketDisconnect: The server closed the websocket.
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: The received event was not a text message.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Parse a text message with orjson.
+
+                data = orjson.loads(await ws.receive_text_bytes())
+        """
+        event = await self.receive(timeout)
+        if isinstance(event, wsproto.events.TextMessage):
+            return _text_bytes(event.data)
         raise WebSocketInvalidTypeReceived(event)
 
     async def receive_bytes(self, timeout: float | None = None) -> bytes:
@@ -942,16 +2998,21 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
         """
         event = await self.receive(timeout)
         if isinstance(event, wsproto.events.BytesMessage):
-            return event.data
+            return _bytes(event.data)
         raise WebSocketInvalidTypeReceived(event)
 
     async def receive_json(
-        self, timeout: float | None = None, mode: JSONMode = "text"
+        self,
+        timeout: float | None = None,
+        mode: JSONMode = "text",
+        type: typing.Any = None,
     ) -> typing.Any:
         """
         Receive JSON data from the server.
 
-        The received data should be parseable by [json.loads][json.loads].
+        The received data should be parseable by the
+        [JSON codec][httpx_ws.JSONCodec] of the session,
+        [json.loads][json.loads] by default.
 
         Args:
             timeout:
@@ -959,6 +3020,12 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
                 If `None`, will block until an event is available.
             mode:
                 Receive mode. Should either be `'text'` or `'bytes'`.
+            type:
+                Type to decode the data into, like a dataclass.
+                The decoder is compiled once per type, and cached by the
+                [JSON codec][httpx_ws.JSONCodec].
+                Defaults to `None`, meaning the `json_type` of the session,
+                if any. Pass `typing.Any` to get the data as parsed.
 
         Returns:
             Parsed JSON data.
@@ -969,6 +3036,7 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             WebSocketNetworkError: A network error occured.
             WebSocketInvalidTypeReceived: The received event
                 didn't correspond to the specified mode.
+            ValueError: The data isn't valid JSON, or doesn't match the type.
 
         Note:
             Exceptions not caught inside the context manager will be
@@ -991,14 +3059,230 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
                     print("No data received.")
                 except WebSocketDisconnect:
                     print("Connection closed")
+
+            Decode an order.
+
+                @dataclasses.dataclass
+                class Order:
+                    id: int
+                    items: list[str]
+
+                order = await ws.receive_json(type=Order)
         """
         assert mode in ["text", "binary"]
         data: str | bytes
-        if mode == "text":
+        if mode == "text" and self._raw_text:
+            data = await self.receive_text_bytes(timeout)
+        elif mode == "text":
             data = await self.receive_text(timeout)
         elif mode == "binary":
             data = await self.receive_bytes(timeout)
-        return json.loads(data)
+        return self._json_codec.decode(
+            data, type if type is not None else self._json_type
+        )
+
+    async def __aiter__(self) -> typing.AsyncIterator[str | bytes]:
+        """
+        Iterate over the messages, until the server closes the connection.
+
+        Yields:
+            Strings for text messages, bytes for binary messages.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTextReceived: A text message isn't valid UTF-8,
+                with `validate_utf8=False`.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Print the messages.
+
+                async for message in ws:
+                    print(message)
+        """
+        async for event in self._iter_messages():
+            yield _message_data(event)
+
+    async def iter_text(self) -> typing.AsyncIterator[str]:
+        """
+        Iterate over the text messages, until the server closes the connection.
+
+        Yields:
+            Text data.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: A message was not a text message.
+            WebSocketInvalidTextReceived: A text message isn't valid UTF-8,
+                with `validate_utf8=False`.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Print the messages.
+
+                async for text in ws.iter_text():
+                    print(text)
+        """
+        async for event in self._iter_messages():
+            if not isinstance(event, wsproto.events.TextMessage):
+                raise WebSocketInvalidTypeReceived(event)
+            yield _text(event)
+
+    async def iter_bytes(self) -> typing.AsyncIterator[bytes]:
+        """
+        Iterate over the binary messages, until the server closes the connection.
+
+        Yields:
+            Bytes data.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: A message was not a binary message.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Write the messages to a file.
+
+                async for data in ws.iter_bytes():
+                    await file.write(data)
+        """
+        async for event in self._iter_messages():
+            if not isinstance(event, wsproto.events.BytesMessage):
+                raise WebSocketInvalidTypeReceived(event)
+            yield _bytes(event.data)
+
+    async def iter_json(
+        self, mode: JSONMode = "text", type: typing.Any = None
+    ) -> typing.AsyncIterator[typing.Any]:
+        """
+        Iterate over the JSON messages, until the server closes the connection.
+
+        Args:
+            mode:
+                Receive mode. Should either be `'text'` or `'bytes'`.
+            type:
+                Type to decode the data into, like in
+                [receive_json()][httpx_ws.AsyncWebSocketSession.receive_json].
+                Defaults to `None`, meaning the `json_type` of the session,
+                if any.
+
+        Yields:
+            Parsed JSON data.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+            WebSocketInvalidTypeReceived: A message
+                didn't correspond to the specified mode.
+            ValueError: The data isn't valid JSON, or doesn't match the type.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+
+        Examples:
+            Process the orders.
+
+                async for order in ws.iter_json(type=Order):
+                    await process(order)
+        """
+        assert mode in ["text", "binary"]
+        message_type = (
+            wsproto.events.TextMessage
+            if mode == "text"
+            else wsproto.events.BytesMessage
+        )
+        if type is None:
+            type = self._json_type
+        async for event in self._iter_messages():
+            if not isinstance(event, message_type):
+                raise WebSocketInvalidTypeReceived(event)
+            data = event.data
+            yield self._json_codec.decode(
+                data if isinstance(data, str) else _bytes(data), type
+            )
+
+    @property
+    def router(self) -> MessageRouter | None:
+        """
+        The [MessageRouter][httpx_ws.MessageRouter] of the session, if any.
+
+        A session opened without router can be given one,
+        if it doesn't have `stream_messages` or an `on_message` handler.
+        It can't be replaced: add routes to the current one instead.
+
+        Raises:
+            ValueError: The session already has a router.
+        """
+        return self._router
+
+    @router.setter
+    def router(self, router: MessageRouter) -> None:
+        assert not (self._stream_messages or self._on_message)
+        if self._router is not None:
+            raise ValueError("The session already has a router")
+        # Before the router, since the receive loop may use it right away
+        if self.handler_stats is None:
+            self.handler_stats = HandlerStats()
+        self._router = router
+
+    def add_close_callback(self, callback: typing.Callable[[], None]) -> None:
+        """
+        Register a function called once the session starts closing,
+        either side closing it.
+
+        It's called from the receive task or from the task closing
+        the session, so it must be quick. If the session is already closing,
+        it's called right away.
+
+        Args:
+            callback: The function to call, without arguments.
+
+        Examples:
+            Stop a worker when the connection closes.
+
+                ws.add_close_callback(worker.stop)
+        """
+        if not self._should_close.is_set():
+            self._close_callbacks.append(callback)
+            return
+        callback()
+
+    def intercept(self, predicate: Predicate, handler: RouteHandler) -> None:
+        """
+        Take messages in the receive task, before the router
+        and the `on_message` handler, whatever their routes.
+
+        Interceptors are checked in the order they were added, and only
+        see the messages of this session, even if its router is shared.
+        It's how an [AsyncRpcChannel][httpx_ws.AsyncRpcChannel] takes
+        the responses to its calls.
+
+        Args:
+            predicate:
+                Function telling whether to take a message. It's called
+                in the receive task for every message: it should be cheap.
+            handler:
+                Coroutine function called with the messages taken, from the
+                receive task. It must be quick: nothing is read from the network while it runs.
+        """
+        assert not self._stream_messages
+        # Before the interceptor, since the receive task may use it right away
+        if self.handler_stats is None:
+            self.handler_stats = HandlerStats()
+        self._interceptors.append((predicate, handler))
 
     async def close(self, code: int = 1000, reason: str | None = None):
         """
@@ -1020,7 +3304,8 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
 
                 await ws.close()
         """
-        self._should_close.set()
+        self._start_closing()
+        await self._stop_writer()
         if self.connection.state not in {
             wsproto.connection.ConnectionState.LOCAL_CLOSING,
             wsproto.connection.ConnectionState.CLOSED,
@@ -1029,12 +3314,12 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
             data = self.connection.send(event)
             try:
                 async with self._write_lock:
-                    await self.stream.write(data)
+                    await self._write(data, flush=True)
             except httpcore.WriteError:
                 pass
         await self.stream.aclose()
 
-    async def _background_receive(self, max_bytes: int) -> None:
+    async def _background_receive(self, read_size: ReadSize) -> None:
         """
         Background task listening for data from the server.
 
@@ -1042,51 +3327,128 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
 
         * Answer to Ping events.
         * Acknowledge Pong events.
+        * Reassemble fragmented messages.
         * Put other events in the [_events][_events]
         queue that'll eventually be consumed by the user.
 
         Args:
-            max_bytes: The maximum chunk size to read at each iteration.
+            read_size: The number of bytes to read at each iteration.
         """
-        partial_message_buffer: str | bytes | None = None
+        message_assembler = MessageAssembler(self._max_message_size)
         try:
             while not self._should_close.is_set():
-                data = await self._read_stream(max_bytes)
+                data = await self._read_stream(read_size.size)
+                read_size.update(len(data))
                 self.connection.receive_data(data)
                 for event in self.connection.events():
+                    if self._raw_text:
+                        event = raw_text_event(event)
                     if isinstance(event, wsproto.events.Ping):
-                        data = self.connection.send(event.response())
                         async with self._write_lock:
-                            await self.stream.write(data)
+                            await self._write(self.connection.send(event.response()))
                         continue
                     if isinstance(event, wsproto.events.Pong):
                         self._ping_manager.ack(event.payload)
                         continue
                     if isinstance(event, wsproto.events.CloseConnection):
-                        self._should_close.set()
-                    if isinstance(event, wsproto.events.Message):
-                        # Unfinished message: bufferize
-                        if not event.message_finished:
-                            if partial_message_buffer is None:
-                                partial_message_buffer = event.data
-                            else:
-                                partial_message_buffer += event.data
-                        # Finished message but no buffer: just emit the event
-                        elif partial_message_buffer is None:
-                            await self._send_event.send(event)
-                        # Finished message with buffer: emit the full event
-                        else:
-                            event_type = type(event)
-                            full_message_event = event_type(
-                                partial_message_buffer + event.data
+                        self._start_closing()
+                    if (
+                        isinstance(event, wsproto.events.Message)
+                        and not self._stream_messages
+                    ):
+                        full_message_event = message_assembler.feed(event)
+                        if full_message_event is None:
+                            continue
+                        if self._interceptors and await self._intercept(
+                            full_message_event
+                        ):
+                            continue
+                        if self._router is not None:
+                            await self._route_message(full_message_event)
+                        elif self._on_message is not None:
+                            await self._call_handler(
+                                self._on_message, full_message_event
                             )
-                            partial_message_buffer = None
+                        else:
                             await self._send_event.send(full_message_event)
                         continue
                     await self._send_event.send(event)
+                await self._wait_queue_drained()
         except (httpcore.ReadError, httpcore.WriteError, EndOfStream):
             await self.close(CloseReason.INTERNAL_ERROR, "Stream error")
             await self._send_event.send(WebSocketNetworkError())
+        except MessageTooBig:
+            await self.close(CloseReason.MESSAGE_TOO_BIG, "Message too big")
+            await self._send_event.send(
+                WebSocketDisconnect(CloseReason.MESSAGE_TOO_BIG, "Message too big")
+            )
+        except WebSocketHandlerError as e:
+            await self.close(CloseReason.INTERNAL_ERROR, "Message handler error")
+            await self._send_event.send(e)
+
+    async def _intercept(self, event: wsproto.events.Message) -> bool:
+        """
+        Hand a message to the first interceptor taking it, if any.
+
+        Returns:
+            Whether an interceptor took the message.
+
+        Raises:
+            WebSocketHandlerError: The interceptor raised an exception.
+        """
+        try:
+            message = _message_data(event)
+            for predicate, handler in self._interceptors:
+                if predicate(message):
+                    break
+            else:
+                return False
+        except Exception as e:
+            raise WebSocketHandlerError() from e
+        await self._call_handler(handler, event)
+        return True
+
+    async def _route_message(self, event: wsproto.events.Message) -> None:
+        """
+        Queue a message, hand it to a handler, or drop it,
+        depending on the route it matches.
+
+        Raises:
+            WebSocketHandlerError: The router or the handler raised an exception.
+        """
+        assert self._router is not None
+        try:
+            route = self._router._match(_message_data(event))
+        except Exception as e:
+            raise WebSocketHandlerError() from e
+        if route is None:
+            return
+        if route.handler is None:
+            await self._send_event.send(event)
+        else:
+            await self._call_handler(route.handler, event)
+
+    async def _call_handler(
+        self,
+        handler: typing.Callable[[str | bytes], typing.Awaitable[typing.Any]],
+        event: wsproto.events.Message,
+    ) -> None:
+        """
+        Call a message handler, in the receive task.
+
+        Raises:
+            WebSocketHandlerError: The handler raised an exception,
+                or the text of the message isn't valid UTF-8.
+        """
+        assert self.handler_stats is not None
+        start = time.perf_counter()
+        try:
+            # Text that isn't valid UTF-8 fails here, without `validate_utf8`
+            await handler(_message_data(event))
+        except Exception as e:
+            raise WebSocketHandlerError() from e
+        finally:
+            self.handler_stats.record(time.perf_counter() - start)
 
     async def _background_keepalive_ping(
         self, interval_seconds: float, timeout_seconds: float | None = None
@@ -1110,6 +3472,159 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
                     )
                     await self._send_event.send(WebSocketNetworkError())
 
+    async def _wait_queue_drained(self) -> None:
+        """
+        Pause reading from the network while the queue is above its high watermark.
+
+        Reading resumes once the consumer has drained it to its low watermark.
+        """
+        if (
+            self._queue_high_watermark is not None
+            and self._send_event.statistics().current_buffer_used
+            >= self._queue_high_watermark
+        ):
+            self._resume_reading = anyio.Event()
+            await self._resume_reading.wait()
+
+    def _check_resume_reading(self) -> None:
+        """
+        Resume reading from the network once the consumer
+        has drained the queue to its low watermark.
+        """
+        if (
+            self._resume_reading is not None
+            and self._receive_event.statistics().current_buffer_used
+            <= self._queue_low_watermark
+        ):
+            self._resume_reading.set()
+            self._resume_reading = None
+
+    async def _acquire_write_lock(self, message: bool = True) -> None:
+        """
+        Acquire `_write_lock`, to send a message or a control frame.
+
+        A message has to wait for the end of the message sent
+        in fragments, if any: their frames can't be interleaved.
+
+        Args:
+            message: Whether it's to send a message.
+        """
+        while True:
+            await self._write_lock.acquire()
+            fragmented_message = self._fragmented_message
+            if fragmented_message is None or not message:
+                return
+            self._write_lock.release()
+            await fragmented_message.wait()
+
+    async def _write(self, data: bytes | bytearray, flush: bool = False) -> None:
+        """
+        Write data to the stream, or hold it back while batching.
+
+        Must be called with `_write_lock` held.
+
+        Args:
+            data: The data to write.
+            flush: Whether to write the data held back right away.
+        """
+        data = self._coalesce(data, flush)
+        if not data:
+            return
+        if self._send_queue is None:
+            # Frames may be bytearrays: streams write any bytes-like object
+            await self.stream.write(data)  # type: ignore[arg-type]
+            return
+        if self._write_error is not None:
+            raise httpcore.WriteError() from self._write_error
+        self._pending_writes += 1
+        try:
+            # Without giving up the lock while the queue has room:
+            # send_nowait() takes a held lock for a full queue.
+            try:
+                self._send_queue.send_nowait(data)
+            except anyio.WouldBlock:
+                await self._send_queue.send(data)
+        except BaseException:
+            self._write_done()
+            raise
+
+    def _coalesce(
+        self, data: bytes | bytearray, flush: bool = False
+    ) -> bytes | bytearray:
+        """
+        Hold back data while batching.
+
+        Must be called with `_write_lock` held.
+
+        Args:
+            data: The data to write.
+            flush: Whether to release the data held back right away.
+
+        Returns:
+            The data to write now, empty if it's held back.
+        """
+        if self._batch_depth > 0 or self._batch:
+            self._batch.append(data)
+            self._batch_size += len(data)
+            if (
+                not flush
+                and self._batch_depth > 0
+                and self._batch_size < self._batch_max_bytes
+            ):
+                return b""
+            data = b"".join(self._batch)
+            self._batch = []
+            self._batch_size = 0
+        return data
+
+    async def _background_write(
+        self, receive_queue: MemoryObjectReceiveStream[bytes | bytearray]
+    ) -> None:
+        """
+        Background task writing the queued frames to the stream.
+
+        After a write error, the stream is aborted, the next frames are discarded
+        and the next sends raise the error.
+
+        Args:
+            receive_queue: The queue of frames to write.
+        """
+        try:
+            async with receive_queue:
+                async for data in receive_queue:
+                    if self._write_error is None:
+                        try:
+                            await self.stream.write(data)  # type: ignore[arg-type]
+                        except httpcore.WriteError as e:
+                            self._write_error = e
+                            await self._abort()
+                    self._write_done()
+        finally:
+            self._writer_done.set()
+
+    def _write_done(self) -> None:
+        """
+        Account for a queued frame that was written or discarded.
+        """
+        self._pending_writes -= 1
+        if self._pending_writes == 0:
+            self._writes_drained.set()
+
+    async def _stop_writer(self) -> None:
+        """
+        Wait for the background writer to send the queued frames, and stop it.
+
+        The next frames are written directly to the stream.
+        """
+        if self._send_queue is None:
+            return
+        async with self._write_lock:
+            if self._send_queue is None:
+                return
+            await self._send_queue.aclose()
+            self._send_queue = None
+            await self._writer_done.wait()
+
     async def _read_stream(self, max_bytes: int) -> bytes:
         data = await self.stream.read(max_bytes)
         if data == b"":
@@ -1119,6 +3634,7 @@ class AsyncWebSocketSession(anyio.AsyncContextManagerMixin):
 
 def _get_headers(
     subprotocols: list[str] | None,
+    compression: CompressionOption | None = None,
 ) -> dict[str, typing.Any]:
     headers = {
         "connection": "upgrade",
@@ -1128,9 +3644,216 @@ def _get_headers(
     }
     if subprotocols is not None:
         headers["sec-websocket-protocol"] = ", ".join(subprotocols)
+    compression_options = get_compression(compression)
+    if compression_options is not None:
+        headers["sec-websocket-extensions"] = compression_options.offer()
     return headers
 
 
+def _negotiate_compression(
+    compression: PerMessageDeflateOptions | None,
+    response: httpx.Response | None,
+) -> PerMessageDeflate | None:
+    """
+    Build the compression extension accepted by the server
+    in the handshake response, if any.
+
+    Raises:
+        WebSocketUpgradeError: The server accepted extensions we didn't offer.
+    """
+    if compression is None or response is None:
+        return None
+    try:
+        return compression.negotiate(response.headers.get("sec-websocket-extensions"))
+    except ValueError as e:
+        raise WebSocketUpgradeError(response) from e
+
+
+def _serialize_messages(
+    messages: typing.Iterable[typing.Any], json_codec: JSONCodec
+) -> list[tuple[Message, Opcode]]:
+    """
+    Tell the text, binary and JSON messages apart, serializing the JSON ones.
+
+    Done before framing any of them: a message failing to serialize
+    doesn't leave the others framed, but never written.
+    """
+    serialized: list[tuple[Message, Opcode]] = []
+    for message in messages:
+        if isinstance(message, str):
+            serialized.append((message, Opcode.TEXT))
+        elif isinstance(message, PreparedMessage):
+            serialized.append((message, message.opcode))
+        elif isinstance(message, bytes | bytearray | memoryview):
+            serialized.append((message, Opcode.BINARY))
+        else:
+            try:
+                memoryview(message)
+            except TypeError:
+                # Neither text nor a buffer: a JSON value, sent as text
+                serialized.append((json_codec.dumps(message), Opcode.TEXT))
+            else:
+                serialized.append((message, Opcode.BINARY))
+    return serialized
+
+
+def _frame_messages(
+    connection: wsproto.connection.Connection,
+    compression: PerMessageDeflate | None,
+    messages: typing.Iterable[tuple[Message, Opcode]],
+    compress: bool | None,
+) -> bytes:
+    """
+    Frame messages one after the other, to send them in a single write.
+
+    Must be called with the write lock held.
+
+    Args:
+        messages: The messages and their opcode, see `_serialize_messages()`.
+    """
+    frames: list[bytes | bytearray] = []
+    for message, opcode in messages:
+        if isinstance(message, PreparedMessage):
+            frames.append(message.frame(connection, compression, compress))
+            continue
+        if not isinstance(message, str):
+            frames.append(
+                _frame_buffer(connection, compression, message, compress, opcode)
+            )
+            continue
+        if compression is not None:
+            compression.compress_next_message = compress
+        frames.append(connection.send(wsproto.events.TextMessage(message)))
+    return b"".join(frames)
+
+
+def _frame_buffer(
+    connection: wsproto.connection.Connection,
+    compression: PerMessageDeflate | None,
+    data: Buffer,
+    compress: bool | None,
+    opcode: Opcode = Opcode.BINARY,
+) -> bytes | bytearray:
+    """
+    Frame a message from any buffer: binary, or UTF-8 text.
+
+    Uncompressed messages are masked straight from the buffer into the frame,
+    instead of going through wsproto, which copies the payload several times.
+
+    Must be called with the write lock held.
+    """
+    view = memoryview(data)
+    if compression is not None and compression.should_compress(view.nbytes, compress):
+        compression.compress_next_message = compress
+        event: wsproto.events.Message
+        if opcode == Opcode.TEXT:
+            event = wsproto.events.TextMessage(str(view, "utf-8"))
+        else:
+            event = wsproto.events.BytesMessage(view)  # type: ignore[arg-type]
+        return connection.send(event)
+    if connection.state != wsproto.connection.ConnectionState.OPEN:
+        raise wsproto.utilities.LocalProtocolError(
+            f"Message cannot be sent in state {connection.state}."
+        )
+    return mask_frame(frame_header(0x80 | opcode, view.nbytes), view)
+
+
+def _bytes(data: bytes | bytearray) -> bytes:
+    """
+    Data of a binary message, typed by wsproto as bytes or a bytearray.
+    """
+    if isinstance(data, bytes):
+        return data
+    return bytes(data)
+
+
+def _text(event: wsproto.events.TextMessage) -> str:
+    """
+    Text of a text message, kept as UTF-8 bytes with `raw_text`.
+
+    Raises:
+        WebSocketInvalidTextReceived: The message isn't valid UTF-8,
+            which wasn't checked with `validate_utf8=False`.
+    """
+    data: str | bytes = event.data
+    if isinstance(data, str):
+        return data
+    try:
+        return str(data, "utf-8")
+    except UnicodeDecodeError as e:
+        raise WebSocketInvalidTextReceived(event) from e
+
+
+def _message_data(event: wsproto.events.Message) -> str | bytes:
+    """
+    Data of a message as handed to the handlers: text as a string.
+    """
+    if isinstance(event, wsproto.events.TextMessage):
+        return _text(event)
+    return _bytes(event.data)
+
+
+def _text_bytes(data: str | bytes) -> bytes:
+    """
+    UTF-8 bytes of a text message, kept as is with `raw_text`.
+    """
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    return data
+
+
+def _fragments(
+    chunk: str | bytes, fragment_size: int | None
+) -> typing.Iterator[str | bytes]:
+    """
+    Split a chunk of a message in fragments of at most `fragment_size`.
+    """
+    if fragment_size is None or len(chunk) <= fragment_size:
+        yield chunk
+        return
+    for start in range(0, len(chunk), fragment_size):
+        yield chunk[start : start + fragment_size]
+
+
+def _fragment_event(
+    fragment: str | bytes, message_finished: bool = False
+) -> wsproto.events.Message:
+    if isinstance(fragment, str):
+        return wsproto.events.TextMessage(fragment, message_finished=message_finished)
+    return wsproto.events.BytesMessage(fragment, message_finished=message_finished)
+
+
+async def _aiterate(
+    chunks: typing.Iterable[str | bytes] | typing.AsyncIterable[str | bytes],
+) -> typing.AsyncIterator[str | bytes]:
+    if isinstance(chunks, typing.AsyncIterable):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+def _read_chunks(file: typing.BinaryIO, size: int) -> typing.Iterator[bytes]:
+    """
+    Read a file by chunks of `size` bytes. An empty file gives an empty chunk.
+    """
+    yield file.read(size)
+    while chunk := file.read(size):
+        yield chunk
+
+
+async def _aread_chunks(
+    file: anyio.AsyncFile[bytes], size: int
+) -> typing.AsyncIterator[bytes]:
+    """
+    Read a file by chunks of `size` bytes. An empty file gives an empty chunk.
+    """
+    yield await file.read(size)
+    while chunk := await file.read(size):
+        yield chunk
+
+
 class WebSocketClient(typing.Generic[SyncSession]):
     """
     An sync WebSocket client.
@@ -1142,8 +3865,21 @@ class WebSocketClient(typing.Generic[SyncSession]):
             HTTPX client to use.
             If not provided, a default one will be initialized.
         max_message_size_bytes:
-            Message size in bytes to receive from the server.
+            Maximum number of bytes to read from the network at once.
+            Superseded by `read_size`, which takes precedence when set.
             Defaults to 65 KiB.
+        read_size:
+            Number of bytes to read from the network at once.
+            Set it to `"adaptive"` to let the client grow it when reads fill it
+            and shrink it when the connection is idle, between 4 KiB and 1 MiB.
+            Defaults to `None`, meaning `max_message_size_bytes` is used.
+        max_message_size:
+            Maximum size of a message received from the server,
+            in bytes for binary messages and in characters for text messages.
+            Fragmented messages are checked while they are reassembled.
+            If exceeded, the connection is closed with the code 1009
+            and [WebSocketDisconnect][httpx_ws.WebSocketDisconnect] is raised.
+            Defaults to `None`, meaning no limit.
         queue_size:
             Size of the queue where the received messages will be held
             until they are consumed.
@@ -1160,6 +3896,68 @@ class WebSocketClient(typing.Generic[SyncSession]):
             [WebSocketNetworkError][httpx_ws.WebSocketNetworkError]
             will be raised and the connection closed.
             Defaults to 20 seconds.
+        compression:
+            Set it to `"deflate"` to negotiate the permessage-deflate extension
+            with the server, compressing messages in both directions.
+            Pass [PerMessageDeflateOptions][httpx_ws.PerMessageDeflateOptions]
+            to tune it.
+            Defaults to `None`, meaning no compression.
+        send_queue_size:
+            Size of the queue where the outgoing frames are held
+            until a background writer sends them to the network.
+            Sending a message then only waits if the queue is full,
+            and [send_nowait()][httpx_ws.WebSocketSession.send_nowait]
+            becomes available.
+            Defaults to `None`, meaning the frames are written directly
+            by the sending code.
+        stream_messages:
+            Set it to `True` to hand over the fragments of the messages
+            as they arrive, instead of reassembling them in the background.
+            [receive_stream()][httpx_ws.WebSocketSession.receive_stream]
+            can then consume large messages incrementally.
+            Defaults to `False`.
+        raw_text:
+            Set it to `True` to keep the payload of the text messages
+            as UTF-8 bytes. It's still validated, but not decoded:
+            [receive_text_bytes()][httpx_ws.WebSocketSession.receive_text_bytes]
+            and [receive_json()][httpx_ws.WebSocketSession.receive_json]
+            then hand it over without decoding and encoding it again.
+            Defaults to `False`.
+        validate_utf8:
+            Set it to `False` to skip the validation of the text messages,
+            which are then kept as UTF-8 bytes, like with `raw_text`.
+            Saves CPU on links to trusted servers, but it's unsafe with
+            untrusted peers: invalid UTF-8 is handed over as is.
+            The methods decoding text to strings then raise
+            [WebSocketInvalidTextReceived][httpx_ws.WebSocketInvalidTextReceived].
+            Defaults to `True`.
+        json_codec:
+            [JSONCodec][httpx_ws.JSONCodec] serializing and parsing the messages
+            of `send_json()` and `receive_json()`.
+            Defaults to `None`, meaning the standard [json][json] module is used.
+        json_type:
+            Type that [receive_json()][httpx_ws.WebSocketSession.receive_json]
+            decodes the messages into by default, like a dataclass.
+            Defaults to `None`, meaning the messages are returned as parsed.
+        on_message:
+            Handler called with each message straight from the receive thread,
+            instead of queuing it for `receive()`. Text messages are given
+            as strings, binary messages as bytes. It must be quick and
+            must not block: nothing is read from the network while it runs.
+            Its runtime is reported in `handler_stats`, and if it raises,
+            the session is closed. Not compatible with `stream_messages`.
+            Defaults to `None`.
+        router:
+            [MessageRouter][httpx_ws.MessageRouter] matching each message
+            against its routes in the receive thread: the messages are
+            queued, handed to a handler, or dropped if no route matches.
+            Not compatible with `stream_messages` and `on_message`.
+            Defaults to `None`, meaning all the messages are queued.
+        reactor:
+            Optional [WebSocketReactor][httpx_ws.WebSocketReactor] driving
+            the session instead of its own receive and keepalive threads.
+            Useful to run many sessions from a small number of threads.
+            Defaults to `None`.
         session_class:
             The session class to use.
             Defaults to [WebSocketSession][httpx_ws.WebSocketSession].
@@ -1170,18 +3968,42 @@ class WebSocketClient(typing.Generic[SyncSession]):
         client: httpx.Client,
         *,
         max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
+        read_size: ReadSizeOption | None = None,
+        max_message_size: int | None = None,
         queue_size: int = DEFAULT_QUEUE_SIZE,
         keepalive_ping_interval_seconds: float
         | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
         keepalive_ping_timeout_seconds: float
         | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
+        compression: CompressionOption | None = None,
+        send_queue_size: int | None = None,
+        stream_messages: bool = False,
+        raw_text: bool = False,
+        validate_utf8: bool = True,
+        json_codec: JSONCodec | None = None,
+        json_type: typing.Any = None,
+        on_message: MessageHandler | None = None,
+        router: MessageRouter | None = None,
+        reactor: WebSocketReactor | None = None,
         session_class: type[SyncSession] = WebSocketSession,  # type: ignore[assignment]
     ) -> None:
         self.client = client
         self.max_message_size_bytes = max_message_size_bytes
+        self.read_size = read_size
+        self.max_message_size = max_message_size
         self.queue_size = queue_size
         self.keepalive_ping_interval_seconds = keepalive_ping_interval_seconds
         self.keepalive_ping_timeout_seconds = keepalive_ping_timeout_seconds
+        self.compression = compression
+        self.send_queue_size = send_queue_size
+        self.stream_messages = stream_messages
+        self.raw_text = raw_text
+        self.validate_utf8 = validate_utf8
+        self.json_codec = json_codec
+        self.json_type = json_type
+        self.on_message = on_message
+        self.router = router
+        self.reactor = reactor
         self.session_class = session_class
 
     @contextlib.contextmanager
@@ -1221,7 +4043,7 @@ class WebSocketClient(typing.Generic[SyncSession]):
         """
 
         headers = kwargs.pop("headers", {})
-        headers.update(_get_headers(subprotocols))
+        headers.update(_get_headers(subprotocols, self.compression))
 
         with self.client.stream("GET", url, headers=headers, **kwargs) as response:
             if response.status_code != 101:
@@ -1230,9 +4052,21 @@ class WebSocketClient(typing.Generic[SyncSession]):
             session = self.session_class(
                 response.extensions["network_stream"],
                 max_message_size_bytes=self.max_message_size_bytes,
+                read_size=self.read_size,
+                max_message_size=self.max_message_size,
                 queue_size=self.queue_size,
                 keepalive_ping_interval_seconds=self.keepalive_ping_interval_seconds,
                 keepalive_ping_timeout_seconds=self.keepalive_ping_timeout_seconds,
+                compression=self.compression,
+                send_queue_size=self.send_queue_size,
+                stream_messages=self.stream_messages,
+                raw_text=self.raw_text,
+                validate_utf8=self.validate_utf8,
+                json_codec=self.json_codec,
+                json_type=self.json_type,
+                on_message=self.on_message,
+                router=self.router,
+                reactor=self.reactor,
                 response=response,
             )
             with session:
@@ -1245,11 +4079,23 @@ def connect_ws(
     client: httpx.Client | None = None,
     *,
     max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
+    read_size: ReadSizeOption | None = None,
+    max_message_size: int | None = None,
     queue_size: int = DEFAULT_QUEUE_SIZE,
     keepalive_ping_interval_seconds: float
     | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
     keepalive_ping_timeout_seconds: float
     | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
+    compression: CompressionOption | None = None,
+    send_queue_size: int | None = None,
+    stream_messages: bool = False,
+    raw_text: bool = False,
+    validate_utf8: bool = True,
+    json_codec: JSONCodec | None = None,
+    json_type: typing.Any = None,
+    on_message: MessageHandler | None = None,
+    router: MessageRouter | None = None,
+    reactor: WebSocketReactor | None = None,
     subprotocols: list[str] | None = None,
     session_class: type[SyncSession] = WebSocketSession,  # type: ignore[assignment]
     **kwargs: typing.Any,
@@ -1266,8 +4112,21 @@ def connect_ws(
             HTTPX client to use.
             If not provided, a default one will be initialized.
         max_message_size_bytes:
-            Message size in bytes to receive from the server.
+            Maximum number of bytes to read from the network at once.
+            Superseded by `read_size`, which takes precedence when set.
             Defaults to 65 KiB.
+        read_size:
+            Number of bytes to read from the network at once.
+            Set it to `"adaptive"` to let the client grow it when reads fill it
+            and shrink it when the connection is idle, between 4 KiB and 1 MiB.
+            Defaults to `None`, meaning `max_message_size_bytes` is used.
+        max_message_size:
+            Maximum size of a message received from the server,
+            in bytes for binary messages and in characters for text messages.
+            Fragmented messages are checked while they are reassembled.
+            If exceeded, the connection is closed with the code 1009
+            and [WebSocketDisconnect][httpx_ws.WebSocketDisconnect] is raised.
+            Defaults to `None`, meaning no limit.
         queue_size:
             Size of the queue where the received messages will be held
             until they are consumed.
@@ -1284,6 +4143,68 @@ def connect_ws(
             [WebSocketNetworkError][httpx_ws.WebSocketNetworkError]
             will be raised and the connection closed.
             Defaults to 20 seconds.
+        compression:
+            Set it to `"deflate"` to negotiate the permessage-deflate extension
+            with the server, compressing messages in both directions.
+            Pass [PerMessageDeflateOptions][httpx_ws.PerMessageDeflateOptions]
+            to tune it.
+            Defaults to `None`, meaning no compression.
+        send_queue_size:
+            Size of the queue where the outgoing frames are held
+            until a background writer sends them to the network.
+            Sending a message then only waits if the queue is full,
+            and [send_nowait()][httpx_ws.WebSocketSession.send_nowait]
+            becomes available.
+            Defaults to `None`, meaning the frames are written directly
+            by the sending code.
+        stream_messages:
+            Set it to `True` to hand over the fragments of the messages
+            as they arrive, instead of reassembling them in the background.
+            [receive_stream()][httpx_ws.WebSocketSession.receive_stream]
+            can then consume large messages incrementally.
+            Defaults to `False`.
+        raw_text:
+            Set it to `True` to keep the payload of the text messages
+            as UTF-8 bytes. It's still validated, but not decoded:
+            [receive_text_bytes()][httpx_ws.WebSocketSession.receive_text_bytes]
+            and [receive_json()][httpx_ws.WebSocketSession.receive_json]
+            then hand it over without decoding and encoding it again.
+            Defaults to `False`.
+        validate_utf8:
+            Set it to `False` to skip the validation of the text messages,
+            which are then kept as UTF-8 bytes, like with `raw_text`.
+            Saves CPU on links to trusted servers, but it's unsafe with
+            untrusted peers: invalid UTF-8 is handed over as is.
+            The methods decoding text to strings then raise
+            [WebSocketInvalidTextReceived][httpx_ws.WebSocketInvalidTextReceived].
+            Defaults to `True`.
+        json_codec:
+            [JSONCodec][httpx_ws.JSONCodec] serializing and parsing the messages
+            of `send_json()` and `receive_json()`.
+            Defaults to `None`, meaning the standard [json][json] module is used.
+        json_type:
+            Type that [receive_json()][httpx_ws.WebSocketSession.receive_json]
+            decodes the messages into by default, like a dataclass.
+            Defaults to `None`, meaning the messages are returned as parsed.
+        on_message:
+            Handler called with each message straight from the receive thread,
+            instead of queuing it for `receive()`. Text messages are given
+            as strings, binary messages as bytes. It must be quick and
+            must not block: nothing is read from the network while it runs.
+            Its runtime is reported in `handler_stats`, and if it raises,
+            the session is closed. Not compatible with `stream_messages`.
+            Defaults to `None`.
+        router:
+            [MessageRouter][httpx_ws.MessageRouter] matching each message
+            against its routes in the receive thread: the messages are
+            queued, handed to a handler, or dropped if no route matches.
+            Not compatible with `stream_messages` and `on_message`.
+            Defaults to `None`, meaning all the messages are queued.
+        reactor:
+            Optional [WebSocketReactor][httpx_ws.WebSocketReactor] driving
+            the session instead of its own receive and keepalive threads.
+            Useful to run many sessions from a small number of threads.
+            Defaults to `None`.
         subprotocols:
             Optional list of subprotocols to negotiate with the server.
         session_class:
@@ -1318,9 +4239,21 @@ def connect_ws(
             ws_client = WebSocketClient(
                 client=client,
                 max_message_size_bytes=max_message_size_bytes,
+                read_size=read_size,
+                max_message_size=max_message_size,
                 queue_size=queue_size,
                 keepalive_ping_interval_seconds=keepalive_ping_interval_seconds,
                 keepalive_ping_timeout_seconds=keepalive_ping_timeout_seconds,
+                compression=compression,
+                send_queue_size=send_queue_size,
+                stream_messages=stream_messages,
+                raw_text=raw_text,
+                validate_utf8=validate_utf8,
+                json_codec=json_codec,
+                json_type=json_type,
+                on_message=on_message,
+                router=router,
+                reactor=reactor,
                 session_class=session_class,
             )
             with ws_client.connect(
@@ -1331,9 +4264,21 @@ def connect_ws(
         ws_client = WebSocketClient(
             client=client,
             max_message_size_bytes=max_message_size_bytes,
+            read_size=read_size,
+            max_message_size=max_message_size,
             queue_size=queue_size,
             keepalive_ping_interval_seconds=keepalive_ping_interval_seconds,
             keepalive_ping_timeout_seconds=keepalive_ping_timeout_seconds,
+            compression=compression,
+            send_queue_size=send_queue_size,
+            stream_messages=stream_messages,
+            raw_text=raw_text,
+            validate_utf8=validate_utf8,
+            json_codec=json_codec,
+            json_type=json_type,
+            on_message=on_message,
+            router=router,
+            reactor=reactor,
             session_class=session_class,
         )
         with ws_client.connect(url, subprotocols=subprotocols, **kwargs) as websocket:
@@ -1351,13 +4296,26 @@ class AsyncWebSocketClient(typing.Generic[AsyncSession]):
             HTTPX client to use.
             If not provided, a default one will be initialized.
         max_message_size_bytes:
-            Message size in bytes to receive from the server.
+            Maximum number of bytes to read from the network at once.
+            Superseded by `read_size`, which takes precedence when set.
             Defaults to 65 KiB.
+        read_size:
+            Number of bytes to read from the network at once.
+            Set it to `"adaptive"` to let the client grow it when reads fill it
+            and shrink it when the connection is idle, between 4 KiB and 1 MiB.
+            Defaults to `None`, meaning `max_message_size_bytes` is used.
+        max_message_size:
+            Maximum size of a message received from the server,
+            in bytes for binary messages and in characters for text messages.
+            Fragmented messages are checked while they are reassembled.
+            If exceeded, the connection is closed with the code 1009
+            and [WebSocketDisconnect][httpx_ws.WebSocketDisconnect] is raised.
+            Defaults to `None`, meaning no limit.
         queue_size:
             Size of the queue where the received messages will be held
             until they are consumed.
             If the queue is full, the client will stop receive messages
-            from the server until the queue has room available.
+            from the server until the queue has been drained to half of its size.
             Defaults to 512.
         keepalive_ping_interval_seconds:
             Interval at which the client will automatically send a Ping event
@@ -1369,6 +4327,64 @@ class AsyncWebSocketClient(typing.Generic[AsyncSession]):
             [WebSocketNetworkError][httpx_ws.WebSocketNetworkError]
             will be raised in an [ExceptionGroup][ExceptionGroup] and the connection closed.
             Defaults to 20 seconds.
+        compression:
+            Set it to `"deflate"` to negotiate the permessage-deflate extension
+            with the server, compressing messages in both directions.
+            Pass [PerMessageDeflateOptions][httpx_ws.PerMessageDeflateOptions]
+            to tune it.
+            Defaults to `None`, meaning no compression.
+        send_queue_size:
+            Size of the queue where the outgoing frames are held
+            until a background writer sends them to the network.
+            Sending a message then only waits if the queue is full,
+            and [send_nowait()][httpx_ws.AsyncWebSocketSession.send_nowait]
+            becomes available.
+            Defaults to `None`, meaning the frames are written directly
+            by the sending code.
+        stream_messages:
+            Set it to `True` to hand over the fragments of the messages
+            as they arrive, instead of reassembling them in the background.
+            [receive_stream()][httpx_ws.AsyncWebSocketSession.receive_stream]
+            can then consume large messages incrementally.
+            Defaults to `False`.
+        raw_text:
+            Set it to `True` to keep the payload of the text messages
+            as UTF-8 bytes. It's still validated, but not decoded:
+            [receive_text_bytes()][httpx_ws.AsyncWebSocketSession.receive_text_bytes]
+            and [receive_json()][httpx_ws.AsyncWebSocketSession.receive_json]
+            then hand it over without decoding and encoding it again.
+            Defaults to `False`.
+        validate_utf8:
+            Set it to `False` to skip the validation of the text messages,
+            which are then kept as UTF-8 bytes, like with `raw_text`.
+            Saves CPU on links to trusted servers, but it's unsafe with
+            untrusted peers: invalid UTF-8 is handed over as is.
+            The methods decoding text to strings then raise
+            [WebSocketInvalidTextReceived][httpx_ws.WebSocketInvalidTextReceived].
+            Defaults to `True`.
+        json_codec:
+            [JSONCodec][httpx_ws.JSONCodec] serializing and parsing the messages
+            of `send_json()` and `receive_json()`.
+            Defaults to `None`, meaning the standard [json][json] module is used.
+        json_type:
+            Type that [receive_json()][httpx_ws.AsyncWebSocketSession.receive_json]
+            decodes the messages into by default, like a dataclass.
+            Defaults to `None`, meaning the messages are returned as parsed.
+        on_message:
+            Coroutine function called with each message straight from
+            the receive task, instead of queuing it for `receive()`.
+            Text messages are given as strings, binary messages as bytes.
+            It must be quick and must not wait for long: nothing is read
+            from the network while it runs. Its runtime is reported
+            in `handler_stats`, and if it raises, the session is closed.
+            Not compatible with `stream_messages`.
+            Defaults to `None`.
+        router:
+            [MessageRouter][httpx_ws.MessageRouter] matching each message
+            against its routes in the receive task: the messages are
+            queued, handed to a handler, or dropped if no route matches.
+            Not compatible with `stream_messages` and `on_message`.
+            Defaults to `None`, meaning all the messages are queued.
         session_class:
             The session class to use.
             Defaults to [AsyncWebSocketSession][httpx_ws.AsyncWebSocketSession].
@@ -1379,18 +4395,40 @@ class AsyncWebSocketClient(typing.Generic[AsyncSession]):
         client: httpx.AsyncClient,
         *,
         max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
+        read_size: ReadSizeOption | None = None,
+        max_message_size: int | None = None,
         queue_size: int = DEFAULT_QUEUE_SIZE,
         keepalive_ping_interval_seconds: float
         | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
         keepalive_ping_timeout_seconds: float
         | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
+        compression: CompressionOption | None = None,
+        send_queue_size: int | None = None,
+        stream_messages: bool = False,
+        raw_text: bool = False,
+        validate_utf8: bool = True,
+        json_codec: JSONCodec | None = None,
+        json_type: typing.Any = None,
+        on_message: AsyncMessageHandler | None = None,
+        router: MessageRouter | None = None,
         session_class: type[AsyncSession] = AsyncWebSocketSession,  # type: ignore[assignment]
     ) -> None:
         self.client = client
         self.max_message_size_bytes = max_message_size_bytes
+        self.read_size = read_size
+        self.max_message_size = max_message_size
         self.queue_size = queue_size
         self.keepalive_ping_interval_seconds = keepalive_ping_interval_seconds
         self.keepalive_ping_timeout_seconds = keepalive_ping_timeout_seconds
+        self.compression = compression
+        self.send_queue_size = send_queue_size
+        self.stream_messages = stream_messages
+        self.raw_text = raw_text
+        self.validate_utf8 = validate_utf8
+        self.json_codec = json_codec
+        self.json_type = json_type
+        self.on_message = on_message
+        self.router = router
         self.session_class = session_class
 
     @contextlib.asynccontextmanager
@@ -1429,7 +4467,7 @@ class AsyncWebSocketClient(typing.Generic[AsyncSession]):
                         await ws.send_text("Hello!")
         """
         headers = kwargs.pop("headers", {})
-        headers.update(_get_headers(subprotocols))
+        headers.update(_get_headers(subprotocols, self.compression))
 
         async with self.client.stream(
             "GET", url, headers=headers, **kwargs
@@ -1440,9 +4478,20 @@ class AsyncWebSocketClient(typing.Generic[AsyncSession]):
             session = self.session_class(
                 response.extensions["network_stream"],
                 max_message_size_bytes=self.max_message_size_bytes,
+                read_size=self.read_size,
+                max_message_size=self.max_message_size,
                 queue_size=self.queue_size,
                 keepalive_ping_interval_seconds=self.keepalive_ping_interval_seconds,
                 keepalive_ping_timeout_seconds=self.keepalive_ping_timeout_seconds,
+                compression=self.compression,
+                send_queue_size=self.send_queue_size,
+                stream_messages=self.stream_messages,
+                raw_text=self.raw_text,
+                validate_utf8=self.validate_utf8,
+                json_codec=self.json_codec,
+                json_type=self.json_type,
+                on_message=self.on_message,
+                router=self.router,
                 response=response,
             )
             async with session:
@@ -1455,11 +4504,22 @@ async def aconnect_ws(
     client: httpx.AsyncClient | None = None,
     *,
     max_message_size_bytes: int = DEFAULT_MAX_MESSAGE_SIZE_BYTES,
+    read_size: ReadSizeOption | None = None,
+    max_message_size: int | None = None,
     queue_size: int = DEFAULT_QUEUE_SIZE,
     keepalive_ping_interval_seconds: float
     | None = DEFAULT_KEEPALIVE_PING_INTERVAL_SECONDS,
     keepalive_ping_timeout_seconds: float
     | None = DEFAULT_KEEPALIVE_PING_TIMEOUT_SECONDS,
+    compression: CompressionOption | None = None,
+    send_queue_size: int | None = None,
+    stream_messages: bool = False,
+    raw_text: bool = False,
+    validate_utf8: bool = True,
+    json_codec: JSONCodec | None = None,
+    json_type: typing.Any = None,
+    on_message: AsyncMessageHandler | None = None,
+    router: MessageRouter | None = None,
     subprotocols: list[str] | None = None,
     session_class: type[AsyncSession] = AsyncWebSocketSession,  # type: ignore[assignment]
     **kwargs: typing.Any,
@@ -1476,13 +4536,26 @@ async def aconnect_ws(
             HTTPX client to use.
             If not provided, a default one will be initialized.
         max_message_size_bytes:
-            Message size in bytes to receive from the server.
+            Maximum number of bytes to read from the network at once.
+            Superseded by `read_size`, which takes precedence when set.
             Defaults to 65 KiB.
+        read_size:
+            Number of bytes to read from the network at once.
+            Set it to `"adaptive"` to let the client grow it when reads fill it
+            and shrink it when the connection is idle, between 4 KiB and 1 MiB.
+            Defaults to `None`, meaning `max_message_size_bytes` is used.
+        max_message_size:
+            Maximum size of a message received from the server,
+            in bytes for binary messages and in characters for text messages.
+            Fragmented messages are checked while they are reassembled.
+            If exceeded, the connection is closed with the code 1009
+            and [WebSocketDisconnect][httpx_ws.WebSocketDisconnect] is raised.
+            Defaults to `None`, meaning no limit.
         queue_size:
             Size of the queue where the received messages will be held
             until they are consumed.
             If the queue is full, the client will stop receive messages
-            from the server until the queue has room available.
+            from the server until the queue has been drained to half of its size.
             Defaults to 512.
         keepalive_ping_interval_seconds:
             Interval at which the client will automatically send a Ping event
@@ -1494,6 +4567,64 @@ async def aconnect_ws(
             [WebSocketNetworkError][httpx_ws.WebSocketNetworkError]
             will be raised in an [ExceptionGroup][ExceptionGroup] and the connection closed.
             Defaults to 20 seconds.
+        compression:
+            Set it to `"deflate"` to negotiate the permessage-deflate extension
+            with the server, compressing messages in both directions.
+            Pass [PerMessageDeflateOptions][httpx_ws.PerMessageDeflateOptions]
+            to tune it.
+            Defaults to `None`, meaning no compression.
+        send_queue_size:
+            Size of the queue where the outgoing frames are held
+            until a background writer sends them to the network.
+            Sending a message then only waits if the queue is full,
+            and [send_nowait()][httpx_ws.AsyncWebSocketSession.send_nowait]
+            becomes available.
+            Defaults to `None`, meaning the frames are written directly
+            by the sending code.
+        stream_messages:
+            Set it to `True` to hand over the fragments of the messages
+            as they arrive, instead of reassembling them in the background.
+            [receive_stream()][httpx_ws.AsyncWebSocketSession.receive_stream]
+            can then consume large messages incrementally.
+            Defaults to `False`.
+        raw_text:
+            Set it to `True` to keep the payload of the text messages
+            as UTF-8 bytes. It's still validated, but not decoded:
+            [receive_text_bytes()][httpx_ws.AsyncWebSocketSession.receive_text_bytes]
+            and [receive_json()][httpx_ws.AsyncWebSocketSession.receive_json]
+            then hand it over without decoding and encoding it again.
+            Defaults to `False`.
+        validate_utf8:
+            Set it to `False` to skip the validation of the text messages,
+            which are then kept as UTF-8 bytes, like with `raw_text`.
+            Saves CPU on links to trusted servers, but it's unsafe with
+            untrusted peers: invalid UTF-8 is handed over as is.
+            The methods decoding text to strings then raise
+            [WebSocketInvalidTextReceived][httpx_ws.WebSocketInvalidTextReceived].
+            Defaults to `True`.
+        json_codec:
+            [JSONCodec][httpx_ws.JSONCodec] serializing and parsing the messages
+            of `send_json()` and `receive_json()`.
+            Defaults to `None`, meaning the standard [json][json] module is used.
+        json_type:
+            Type that [receive_json()][httpx_ws.AsyncWebSocketSession.receive_json]
+            decodes the messages into by default, like a dataclass.
+            Defaults to `None`, meaning the messages are returned as parsed.
+        on_message:
+            Coroutine function called with each message straight from
+            the receive task, instead of queuing it for `receive()`.
+            Text messages are given as strings, binary messages as bytes.
+            It must be quick and must not wait for long: nothing is read
+            from the network while it runs. Its runtime is reported
+            in `handler_stats`, and if it raises, the session is closed.
+            Not compatible with `stream_messages`.
+            Defaults to `None`.
+        router:
+            [MessageRouter][httpx_ws.MessageRouter] matching each message
+            against its routes in the receive task: the messages are
+            queued, handed to a handler, or dropped if no route matches.
+            Not compatible with `stream_messages` and `on_message`.
+            Defaults to `None`, meaning all the messages are queued.
         subprotocols:
             Optional list of subprotocols to negotiate with the server.
         session_class:
@@ -1528,9 +4659,20 @@ async def aconnect_ws(
             ws_client = AsyncWebSocketClient(
                 client=client,
                 max_message_size_bytes=max_message_size_bytes,
+                read_size=read_size,
+                max_message_size=max_message_size,
                 queue_size=queue_size,
                 keepalive_ping_interval_seconds=keepalive_ping_interval_seconds,
                 keepalive_ping_timeout_seconds=keepalive_ping_timeout_seconds,
+                compression=compression,
+                send_queue_size=send_queue_size,
+                stream_messages=stream_messages,
+                raw_text=raw_text,
+                validate_utf8=validate_utf8,
+                json_codec=json_codec,
+                json_type=json_type,
+                on_message=on_message,
+                router=router,
                 session_class=session_class,
             )
             async with ws_client.connect(
@@ -1541,9 +4683,20 @@ async def aconnect_ws(
         ws_client = AsyncWebSocketClient(
             client=client,
             max_message_size_bytes=max_message_size_bytes,
+            read_size=read_size,
+            max_message_size=max_message_size,
             queue_size=queue_size,
             keepalive_ping_interval_seconds=keepalive_ping_interval_seconds,
             keepalive_ping_timeout_seconds=keepalive_ping_timeout_seconds,
+            compression=compression,
+            send_queue_size=send_queue_size,
+            stream_messages=stream_messages,
+            raw_text=raw_text,
+            validate_utf8=validate_utf8,
+            json_codec=json_codec,
+            json_type=json_type,
+            on_message=on_message,
+            router=router,
             session_class=session_class,
         )
         async with ws_client.connect(
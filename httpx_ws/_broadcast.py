@@ -0,0 +1,87 @@
+import typing
+
+import anyio
+
+from ._prepared import PreparedMessage
+
+if typing.TYPE_CHECKING:
+    from ._api import AsyncWebSocketSession
+
+BroadcastTimeoutMode = typing.Literal["skip", "evict"]
+
+
+async def broadcast(
+    sessions: typing.Iterable["AsyncWebSocketSession"],
+    message: str | bytes | PreparedMessage,
+    *,
+    timeout: float | None = None,
+    on_timeout: BroadcastTimeoutMode = "skip",
+    compress: bool | None = None,
+) -> dict["AsyncWebSocketSession", Exception | None]:
+    """
+    Send a message to many sessions concurrently.
+
+    The message is prepared once, as a [PreparedMessage][httpx_ws.PreparedMessage],
+    and sent to all sessions at the same time: a slow session
+    doesn't delay the others.
+
+    Args:
+        sessions: The sessions to send the message to.
+        message:
+            The message. Text if it's a string, binary if it's bytes.
+        timeout:
+            Maximum number of seconds to wait for each session to accept
+            the message. Defaults to `None`, meaning no limit.
+        on_timeout:
+            What to do with a session that didn't accept the message in time.
+            With `"skip"`, the message is dropped for this session,
+            which stays open.
+            With `"evict"`, the session is aborted: its pending and future
+            `receive()` calls raise
+            [WebSocketNetworkError][httpx_ws.WebSocketNetworkError].
+            In both cases, a session whose timeout expired in the middle
+            of writing the message is aborted, since its stream holds
+            a truncated frame.
+            Defaults to `"skip"`.
+        compress:
+            Whether to compress the message, for sessions that negotiated
+            compression. Defaults to `None`, meaning it's compressed if it's
+            at least [min_size][httpx_ws.PerMessageDeflateOptions] bytes.
+
+    Returns:
+        The result for each session: `None` if the message was sent,
+        or the exception raised while sending it, like
+        [TimeoutError][TimeoutError] or
+        [WebSocketNetworkError][httpx_ws.WebSocketNetworkError].
+
+    Examples:
+        Send a message to all the sessions, evicting the slow ones.
+
+            results = await broadcast(
+                sessions, "Hello!", timeout=1.0, on_timeout="evict"
+            )
+            for ws, error in results.items():
+                if error is not None:
+                    sessions.remove(ws)
+    """
+    assert on_timeout in ["skip", "evict"]
+    if not isinstance(message, PreparedMessage):
+        message = PreparedMessage(message)
+
+    results: dict[AsyncWebSocketSession, Exception | None] = {}
+
+    async def _send(session: "AsyncWebSocketSession") -> None:
+        try:
+            await session._send_prepared_within(
+                message, compress, timeout, on_timeout == "evict"
+            )
+        except Exception as e:
+            results[session] = e
+        else:
+            results[session] = None
+
+    async with anyio.create_task_group() as task_group:
+        for session in sessions:
+            task_group.start_soon(_send, session)
+
+    return results
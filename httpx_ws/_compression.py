@@ -0,0 +1,216 @@
+import typing
+import zlib
+
+import wsproto.extensions
+from wsproto.frame_protocol import FrameDecoder, FrameProtocol, Opcode, RsvBits
+
+DEFAULT_MEMORY_LEVEL = 8
+DEFAULT_MIN_SIZE = 0
+
+
+class PerMessageDeflateOptions:
+    """
+    Options of the permessage-deflate extension, as defined in
+    [RFC 7692](https://datatracker.ietf.org/doc/html/rfc7692).
+
+    The server may not support the extension, or lower the window sizes:
+    the session then uses what the server accepted.
+
+    Args:
+        server_max_window_bits:
+            Maximum size of the LZ77 sliding window the server may use
+            to compress its messages, as a power of two between 9 and 15.
+            Defaults to `None`, meaning the server is free to choose.
+        client_max_window_bits:
+            Maximum size of the LZ77 sliding window the client uses
+            to compress its messages, as a power of two between 9 and 15.
+            Defaults to `None`, meaning 15.
+        server_no_context_takeover:
+            Whether to ask the server to reset its compression context
+            after each message.
+            Trades compression ratio for memory on the server.
+            Defaults to `False`.
+        client_no_context_takeover:
+            Whether the client resets its compression context after each message.
+            Trades compression ratio for memory on the client.
+            Defaults to `False`.
+        memory_level:
+            Memory used by the client compressor, between 1 and 9.
+            Lower values use less memory but compress less and more slowly.
+            Defaults to 8.
+        min_size:
+            Messages smaller than this number of bytes are sent uncompressed:
+            compressing them costs more CPU than it saves bandwidth.
+            Defaults to 0, meaning all messages are compressed.
+    """
+
+    def __init__(
+        self,
+        *,
+        server_max_window_bits: int | None = None,
+        client_max_window_bits: int | None = None,
+        server_no_context_takeover: bool = False,
+        client_no_context_takeover: bool = False,
+        memory_level: int = DEFAULT_MEMORY_LEVEL,
+        min_size: int = DEFAULT_MIN_SIZE,
+    ) -> None:
+        for window_bits in (server_max_window_bits, client_max_window_bits):
+            if window_bits is not None and not 9 <= window_bits <= 15:
+                raise ValueError("Window size must be between 9 and 15 inclusive")
+        if not 1 <= memory_level <= 9:
+            raise ValueError("Memory level must be between 1 and 9 inclusive")
+        if min_size < 0:
+            raise ValueError("Minimum size must be positive")
+        self.server_max_window_bits = server_max_window_bits
+        self.client_max_window_bits = client_max_window_bits
+        self.server_no_context_takeover = server_no_context_takeover
+        self.client_no_context_takeover = client_no_context_takeover
+        self.memory_level = memory_level
+        self.min_size = min_size
+
+    def offer(self) -> str:
+        """
+        Build the `Sec-WebSocket-Extensions` header value offering the extension.
+        """
+        parameters = [PerMessageDeflate.name]
+        if self.server_max_window_bits is not None:
+            parameters.append(f"server_max_window_bits={self.server_max_window_bits}")
+        if self.client_max_window_bits is not None:
+            parameters.append(f"client_max_window_bits={self.client_max_window_bits}")
+        else:
+            # Let the server limit our window if it wants to
+            parameters.append("client_max_window_bits")
+        if self.server_no_context_takeover:
+            parameters.append("server_no_context_takeover")
+        if self.client_no_context_takeover:
+            parameters.append("client_no_context_takeover")
+        return "; ".join(parameters)
+
+    def negotiate(self, accepted: str | None) -> "PerMessageDeflate | None":
+        """
+        Build the extension from the `Sec-WebSocket-Extensions` response header.
+
+        Returns:
+            The extension, or `None` if the server didn't accept it.
+
+        Raises:
+            ValueError: The server's answer doesn't match our offer.
+        """
+        if accepted is None:
+            return None
+        extension: PerMessageDeflate | None = None
+        for accept in accepted.split(","):
+            name = accept.split(";", 1)[0].strip()
+            if name != PerMessageDeflate.name or extension is not None:
+                raise ValueError(f"Unexpected extension {name!r}")
+            extension = PerMessageDeflate(self)
+            try:
+                extension.finalize(accept)
+            except IndexError as e:
+                raise ValueError(f"Invalid parameters in {accept!r}") from e
+        return extension
+
+
+CompressionOption = PerMessageDeflateOptions | typing.Literal["deflate"]
+
+
+def get_compression(
+    compression: CompressionOption | None,
+) -> PerMessageDeflateOptions | None:
+    if compression == "deflate":
+        return PerMessageDeflateOptions()
+    assert compression is None or isinstance(compression, PerMessageDeflateOptions)
+    return compression
+
+
+class PerMessageDeflate(wsproto.extensions.PerMessageDeflate):
+    """
+    wsproto's permessage-deflate extension, with a configurable memory level
+    and the ability to send some messages uncompressed.
+
+    Attributes:
+        compress_next_message:
+            Whether to compress the next message sent.
+            If `None`, it's compressed if it's at least `min_size` bytes.
+            Reset once the message is sent.
+    """
+
+    def __init__(self, options: PerMessageDeflateOptions) -> None:
+        super().__init__(
+            client_no_context_takeover=options.client_no_context_takeover,
+            client_max_window_bits=options.client_max_window_bits,
+            server_no_context_takeover=options.server_no_context_takeover,
+            server_max_window_bits=options.server_max_window_bits,
+        )
+        self._memory_level = options.memory_level
+        self._min_size = options.min_size
+        self.compress_next_message: bool | None = None
+        # Whether the message being sent, which may span multiple frames,
+        # is compressed
+        self._outbound_compressed = True
+
+    def should_compress(self, size: int, compress: bool | None = None) -> bool:
+        """
+        Whether to compress a message of this size.
+
+        Args:
+            size: The size of the message payload, in bytes.
+            compress: An explicit choice, taking precedence over `min_size`.
+        """
+        if compress is None:
+            return size >= self._min_size
+        return compress
+
+    def compress_message(self, payload: bytes) -> bytes:
+        """
+        Compress a whole message with a fresh compression context,
+        independently from the messages sent by this extension.
+
+        Returns:
+            The compressed payload, to be sent with RSV1 set.
+        """
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION,
+            zlib.DEFLATED,
+            -self.client_max_window_bits,
+            self._memory_level,
+        )
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-4]
+
+    def reset_compressor(self) -> None:
+        """
+        Start a fresh compression context for the next message.
+
+        Must be called after sending a message compressed outside of this
+        extension: the peer decompressed it in the shared context, so our
+        compressor can't refer to the data that came before anymore.
+        """
+        self._compressor = None
+
+    def frame_outbound(
+        self,
+        proto: FrameDecoder | FrameProtocol,
+        opcode: Opcode,
+        rsv: RsvBits,
+        data: bytes,
+        fin: bool,
+    ) -> tuple[RsvBits, bytes]:
+        if opcode in (Opcode.TEXT, Opcode.BINARY):
+            self._outbound_compressed = self.should_compress(
+                len(data), self.compress_next_message
+            )
+            self.compress_next_message = None
+        if not self._outbound_compressed and self._compressible_opcode(opcode):
+            # RSV1 stays unset: the peer won't try to decompress it
+            return (rsv, data)
+
+        # Create the compressor ourselves, wsproto doesn't expose the memory level
+        if self._compressor is None and opcode in (Opcode.TEXT, Opcode.BINARY):
+            self._compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION,
+                zlib.DEFLATED,
+                -self.client_max_window_bits,
+                self._memory_level,
+            )
+        return super().frame_outbound(proto, opcode, rsv, data, fin)
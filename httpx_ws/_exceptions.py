@@ -1,3 +1,5 @@
+import typing
+
 import httpx
 import wsproto
 
@@ -44,6 +46,18 @@ class WebSocketInvalidTypeReceived(HTTPXWSException):
         self.event = event
 
 
+class WebSocketInvalidTextReceived(HTTPXWSException):
+    """
+    Raised when a text message isn't valid UTF-8.
+
+    Only happens with `validate_utf8=False`: otherwise, such a message
+    closes the connection. The session stays open.
+    """
+
+    def __init__(self, event: wsproto.events.TextMessage) -> None:
+        self.event = event
+
+
 class WebSocketNetworkError(HTTPXWSException):
     """
     Raised when a network error occured,
@@ -51,3 +65,45 @@ class WebSocketNetworkError(HTTPXWSException):
     """
 
     pass
+
+
+class WebSocketHandlerError(HTTPXWSException):
+    """
+    Raised when the message handler of the session raised an exception.
+
+    The session is closed, and the original exception is the `__cause__`.
+    """
+
+    pass
+
+
+class WebSocketRpcError(HTTPXWSException):
+    """
+    Raised when the server answered a remote procedure call with an error.
+
+    Args:
+        code:
+            The integer error code.
+        message:
+            The description of the error.
+        data:
+            Additional information about the error, if any.
+    """
+
+    def __init__(self, code: int, message: str = "", data: typing.Any = None) -> None:
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+class WebSocketSendQueueFull(HTTPXWSException):
+    """
+    Raised when a message can't be queued without waiting,
+    because the send queue is full.
+    """
+
+    pass
+
+
+class EndOfStream(Exception):
+    pass
@@ -0,0 +1,41 @@
+import typing
+
+MessageHandler = typing.Callable[[str | bytes], None]
+AsyncMessageHandler = typing.Callable[[str | bytes], typing.Awaitable[None]]
+
+
+class HandlerStats:
+    """
+    Runtime of the message handler of a session, see `on_message`.
+
+    Attributes:
+        calls: Number of messages handled.
+        total_seconds: Time spent in the handler, in seconds.
+        max_seconds: Longest run of the handler, in seconds.
+
+    Examples:
+        Check that the handler keeps up.
+
+            stats = ws.handler_stats
+            print(f"{stats.calls} messages, {stats.mean_seconds * 1e6:.1f}µs each")
+    """
+
+    __slots__ = ("calls", "total_seconds", "max_seconds")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        """
+        Average run of the handler, in seconds.
+        """
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+    def record(self, seconds: float) -> None:
+        self.calls += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
@@ -0,0 +1,176 @@
+import dataclasses
+import json
+import types
+import typing
+
+Decoder = typing.Callable[[str | bytes], typing.Any]
+
+
+class JSONCodec:
+    """
+    Functions serializing and parsing the JSON messages.
+
+    The standard [json][json] module is used by default. A faster library,
+    like [orjson](https://github.com/ijl/orjson) or
+    [msgspec](https://jcristharif.com/msgspec/), can take over
+    to lower the CPU cost of JSON messages.
+
+    Args:
+        dumps:
+            Serializes data to JSON, as a string or as UTF-8 bytes.
+            Bytes go straight into the frame, even for text messages,
+            without being decoded to a string first.
+        loads:
+            Parses JSON, from a string for text messages
+            or from bytes for binary messages. Text messages are bytes too
+            if the session keeps them as UTF-8, with `raw_text`.
+        decoder:
+            Compiles a decoder for a type, parsing JSON straight into
+            an instance of this type, like `msgspec.json.Decoder(type).decode`.
+            It's called once per type: the decoders are cached.
+            Defaults to `None`, meaning `loads` is used, and its result
+            converted to the type. Dataclasses, lists, dictionaries
+            and optional values are supported.
+
+    Examples:
+        Use orjson.
+
+            codec = JSONCodec(orjson.dumps, orjson.loads)
+            with connect_ws("http://localhost:8000/ws", json_codec=codec) as ws:
+                ws.send_json({"message": "Hello!"})
+
+        Use msgspec, decoding typed messages with precompiled decoders.
+
+            codec = JSONCodec(
+                msgspec.json.encode,
+                msgspec.json.decode,
+                decoder=lambda type: msgspec.json.Decoder(type).decode,
+            )
+    """
+
+    def __init__(
+        self,
+        dumps: typing.Callable[[typing.Any], str | bytes],
+        loads: typing.Callable[[str | bytes], typing.Any],
+        decoder: typing.Callable[[typing.Any], Decoder] | None = None,
+    ) -> None:
+        self.dumps = dumps
+        self.loads = loads
+        self._compile_decoder = (
+            decoder if decoder is not None else self._compile_default_decoder
+        )
+        self._decoders: dict[typing.Any, Decoder] = {}
+
+    def decode(self, data: str | bytes, type: typing.Any = None) -> typing.Any:
+        """
+        Parse JSON, possibly into a given type.
+
+        Args:
+            data: The JSON to parse.
+            type: The type to decode the data into.
+                Defaults to `None`, meaning the result of `loads` is returned.
+
+        Raises:
+            ValueError: The data isn't valid JSON, or doesn't match the type.
+        """
+        if type is None:
+            return self.loads(data)
+        try:
+            decoder = self._decoders[type]
+        except KeyError:
+            decoder = self._decoders[type] = self._compile_decoder(type)
+        return decoder(data)
+
+    def _compile_default_decoder(self, type: typing.Any) -> Decoder:
+        convert = _compile_converter(type)
+        loads = self.loads
+        return lambda data: convert(loads(data))
+
+
+DEFAULT_JSON_CODEC = JSONCodec(json.dumps, json.loads)
+
+
+def _compile_converter(
+    annotation: typing.Any,
+) -> typing.Callable[[typing.Any], typing.Any]:
+    """
+    Build a function converting parsed JSON to a type, checking it on the way.
+
+    The work depending only on the type, like resolving the fields
+    of a dataclass, is done once here rather than for each message.
+    """
+    if isinstance(annotation, type) and dataclasses.is_dataclass(annotation):
+        hints = typing.get_type_hints(annotation)
+        fields = [
+            (field.name, _compile_converter(hints[field.name]))
+            for field in dataclasses.fields(annotation)
+            if field.init
+        ]
+
+        def convert_dataclass(value: typing.Any) -> typing.Any:
+            _check(value, dict, annotation)
+            try:
+                return annotation(
+                    **{
+                        name: convert(value[name])
+                        for name, convert in fields
+                        if name in value
+                    }
+                )
+            except TypeError as e:
+                raise ValueError(f"Invalid {annotation.__name__}: {e}") from e
+
+        return convert_dataclass
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Union or origin is types.UnionType:
+        members = [arg for arg in args if arg is not types.NoneType]
+        # No way to tell which member of a union was meant
+        if len(members) != 1:
+            return _identity
+        convert_member = _compile_converter(members[0])
+        return lambda value: None if value is None else convert_member(value)
+
+    if origin is list:
+        convert_item = _compile_converter(args[0]) if args else _identity
+
+        def convert_list(value: typing.Any) -> typing.Any:
+            _check(value, list, annotation)
+            return [convert_item(item) for item in value]
+
+        return convert_list
+
+    if origin is dict:
+        convert_value = _compile_converter(args[1]) if args else _identity
+
+        def convert_dict(value: typing.Any) -> typing.Any:
+            _check(value, dict, annotation)
+            return {key: convert_value(item) for key, item in value.items()}
+
+        return convert_dict
+
+    if annotation in (str, int, float, bool, list, dict):
+        return lambda value: _check(value, annotation, annotation)
+
+    return _identity
+
+
+def _identity(value: typing.Any) -> typing.Any:
+    return value
+
+
+def _check(value: typing.Any, expected: type, annotation: typing.Any) -> typing.Any:
+    valid = isinstance(value, expected)
+    # Integers are valid floats, but booleans aren't numbers in JSON
+    if expected is float:
+        valid = isinstance(value, int | float)
+    if isinstance(value, bool) and expected in (int, float):
+        valid = False
+    if not valid:
+        raise ValueError(
+            f"Expected {getattr(annotation, '__name__', annotation)}, "
+            f"got {value.__class__.__name__}"
+        )
+    return value
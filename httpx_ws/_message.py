@@ -0,0 +1,163 @@
+import codecs
+
+import wsproto
+import wsproto.connection
+from wsproto.frame_protocol import (
+    CloseReason,
+    Frame,
+    MessageDecoder,
+    Opcode,
+    ParseFailed,
+)
+
+
+class MessageTooBig(Exception):
+    pass
+
+
+class MessageAssembler:
+    """
+    Reassemble fragmented messages.
+
+    Fragments are accumulated in a list and joined once the message is finished,
+    so reassembly stays linear in the size of the message.
+
+    Args:
+        max_size:
+            Maximum size of a message. Bytes for binary messages,
+            characters for text messages.
+            If exceeded, `MessageTooBig` is raised.
+    """
+
+    def __init__(self, max_size: int | None = None) -> None:
+        self._max_size = max_size
+        self._chunks: list[str | bytes] = []
+        self._size = 0
+
+    def feed(self, event: wsproto.events.Message) -> wsproto.events.Message | None:
+        """
+        Feed a message event.
+
+        Returns:
+            The full message event if it's finished, `None` otherwise.
+
+        Raises:
+            MessageTooBig: The message exceeded the maximum size.
+        """
+        data = event.data
+        size = self._size + len(data)
+        if self._max_size is not None and size > self._max_size:
+            self.reset()
+            raise MessageTooBig()
+
+        if not event.message_finished:
+            self._chunks.append(data)
+            self._size = size
+            return None
+
+        # Unfragmented message: no need to copy anything
+        if not self._chunks:
+            return event
+
+        chunks = self._chunks
+        chunks.append(data)
+        self.reset()
+        return type(event)(chunks[0][:0].join(chunks))  # type: ignore[arg-type]
+
+    def reset(self) -> None:
+        self._chunks = []
+        self._size = 0
+
+
+class RawText(bytes):
+    """
+    UTF-8 payload of a text message, kept as bytes.
+    """
+
+
+class RawTextMessageDecoder(MessageDecoder):
+    """
+    wsproto's message decoder, keeping the payload of text messages as UTF-8 bytes.
+
+    The payload is validated, but not decoded to `str`. ASCII payloads,
+    the most common ones, are valid UTF-8 and are checked without decoding.
+
+    wsproto only makes text message events from `str` payloads: text frames
+    are handed over as binary frames holding a `RawText` payload,
+    turned back into text message events by `raw_text_event()`.
+
+    Args:
+        validate:
+            Whether to check that the payloads are valid UTF-8.
+            Only safe to disable with a trusted peer.
+    """
+
+    def __init__(self, validate: bool = True) -> None:
+        super().__init__()
+        self._validate = validate
+
+    def process_frame(self, frame: Frame) -> Frame:
+        if self.opcode is None and frame.opcode is Opcode.TEXT:
+            self.opcode = Opcode.TEXT
+            if self._validate:
+                self.decoder = codecs.getincrementaldecoder("utf-8")()
+        elif self.opcode is not Opcode.TEXT or frame.opcode is not Opcode.CONTINUATION:
+            return super().process_frame(frame)
+
+        finished = frame.frame_finished and frame.message_finished
+        payload = frame.payload
+        assert isinstance(payload, (bytes, bytearray))
+        # ASCII is valid UTF-8, unless it follows the start of a character
+        # split from the previous frame
+        if self.decoder is not None and (
+            not payload.isascii() or self.decoder.getstate()[0]
+        ):
+            try:
+                self.decoder.decode(payload, finished)
+            except UnicodeDecodeError as exc:
+                raise ParseFailed(str(exc), CloseReason.INVALID_FRAME_PAYLOAD_DATA)
+
+        if finished:
+            self.opcode = None
+            self.decoder = None
+
+        return Frame(Opcode.BINARY, RawText(payload), frame.frame_finished, finished)
+
+
+def install_raw_text_decoder(
+    connection: wsproto.connection.Connection, validate: bool = True
+) -> None:
+    """
+    Make the connection keep text messages as UTF-8 bytes,
+    see `RawTextMessageDecoder`.
+
+    wsproto has no API to change its message decoder: the one of its
+    frame protocol is replaced, after checking it's where it's expected.
+
+    Raises:
+        RuntimeError: The installed wsproto version doesn't support it.
+    """
+    proto = getattr(connection, "_proto", None)
+    decoder = getattr(proto, "_message_decoder", None)
+    if proto is None or not isinstance(decoder, MessageDecoder):
+        raise RuntimeError(
+            "raw_text and validate_utf8=False are not supported "
+            f"with wsproto {wsproto.__version__}."
+        )
+    proto._message_decoder = RawTextMessageDecoder(validate)
+
+
+def raw_text_event(event: wsproto.events.Event) -> wsproto.events.Event:
+    """
+    Turn a binary message event holding a `RawText` payload
+    back into a text message event.
+    """
+    if isinstance(event, wsproto.events.BytesMessage) and isinstance(
+        event.data, RawText
+    ):
+        return wsproto.events.TextMessage(
+            event.data,  # type: ignore[arg-type]
+            event.frame_finished,
+            event.message_finished,
+        )
+    return event
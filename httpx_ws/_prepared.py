@@ -0,0 +1,201 @@
+import secrets
+import struct
+import sys
+import typing
+
+import wsproto
+import wsproto.utilities
+from wsproto.frame_protocol import Opcode
+
+from ._compression import PerMessageDeflate
+from ._json import DEFAULT_JSON_CODEC, JSONCodec
+
+if typing.TYPE_CHECKING:
+    from ._api import JSONMode
+
+if sys.version_info >= (3, 12):
+    from collections.abc import Buffer
+else:
+    Buffer = bytes | bytearray | memoryview
+
+# Translation table XORing each byte with a given byte of the masking key
+_XOR_TABLES = [bytes(a ^ b for a in range(256)) for b in range(256)]
+
+
+class PreparedMessage:
+    """
+    A message serialized and framed once, that can be sent to many sessions.
+
+    Sending the same payload to many sessions with
+    [send_text()][httpx_ws.WebSocketSession.send_text] or
+    [send_json()][httpx_ws.WebSocketSession.send_json]
+    serializes, encodes, frames and possibly compresses it again for each session.
+    A prepared message does this work once: sending it with
+    [send_prepared()][httpx_ws.WebSocketSession.send_prepared]
+    only applies the mask specific to each frame.
+
+    The compressed payload is computed the first time it's sent to a session
+    that negotiated compression, and reused afterwards.
+
+    Args:
+        data: The message. Text if it's a string, binary otherwise.
+
+    Examples:
+        Send the same message to many sessions.
+
+            message = PreparedMessage("Hello!")
+            for ws in sessions:
+                ws.send_prepared(message)
+    """
+
+    def __init__(self, data: str | bytes) -> None:
+        if isinstance(data, str):
+            self.opcode = Opcode.TEXT
+            self.payload = data.encode("utf-8")
+        else:
+            self.opcode = Opcode.BINARY
+            self.payload = bytes(data)
+        # Frame header and payload, uncompressed (None) or for each window size
+        self._frames: dict[int | None, tuple[bytes, bytes]] = {}
+
+    @classmethod
+    def from_json(
+        cls,
+        data: typing.Any,
+        mode: "JSONMode" = "text",
+        json_codec: JSONCodec | None = None,
+    ) -> "PreparedMessage":
+        """
+        Prepare a JSON message.
+
+        Args:
+            data:
+                The data to send. Must be serializable by the JSON codec.
+            mode:
+                The sending mode. Should either be `'text'` or `'bytes'`.
+            json_codec:
+                [JSONCodec][httpx_ws.JSONCodec] serializing the data.
+                Defaults to `None`, meaning [json.dumps][json.dumps] is used.
+
+        Returns:
+            The prepared message.
+        """
+        assert mode in ["text", "binary"]
+        if json_codec is None:
+            json_codec = DEFAULT_JSON_CODEC
+        serialized_data = json_codec.dumps(data)
+        if isinstance(serialized_data, str):
+            if mode == "text":
+                return cls(serialized_data)
+            serialized_data = serialized_data.encode("utf-8")
+        message = cls(serialized_data)
+        # Already UTF-8: no need to decode it for a text message
+        if mode == "text":
+            message.opcode = Opcode.TEXT
+        return message
+
+    def frame(
+        self,
+        connection: wsproto.connection.Connection,
+        compression: PerMessageDeflate | None = None,
+        compress: bool | None = None,
+    ) -> bytes | bytearray:
+        """
+        Build the masked frame to send on a client connection.
+
+        Args:
+            connection: The connection the frame will be sent on.
+            compression: The compression extension negotiated on the connection.
+            compress: Whether to compress the message, taking precedence
+                over the `min_size` of the compression extension.
+
+        Returns:
+            The bytes to write on the stream.
+
+        Raises:
+            LocalProtocolError: The connection can't send messages anymore.
+        """
+        if connection.state != wsproto.connection.ConnectionState.OPEN:
+            raise wsproto.utilities.LocalProtocolError(
+                f"Message cannot be sent in state {connection.state}."
+            )
+
+        key: int | None = None
+        if compression is not None and compression.should_compress(
+            len(self.payload), compress
+        ):
+            key = compression.client_max_window_bits
+        try:
+            header, payload = self._frames[key]
+        except KeyError:
+            header, payload = self._frames[key] = self._build_frame(compression, key)
+
+        frame = mask_frame(header, payload)
+
+        # The peer decompressed the message in its context: ours is stale now
+        if key is not None:
+            assert compression is not None
+            compression.reset_compressor()
+
+        return frame
+
+    def _build_frame(
+        self, compression: PerMessageDeflate | None, window_bits: int | None
+    ) -> tuple[bytes, bytes]:
+        payload = self.payload
+        # FIN bit, and RSV1 bit for compressed messages
+        first_byte = 0x80 | self.opcode
+        if window_bits is not None:
+            assert compression is not None
+            payload = compression.compress_message(payload)
+            first_byte |= 0x40
+
+        return frame_header(first_byte, len(payload)), payload
+
+
+def frame_header(first_byte: int, length: int) -> bytes:
+    """
+    Build the header of a masked frame, up to the masking key.
+
+    Args:
+        first_byte: The FIN bit, RSV bits and opcode.
+        length: The length of the payload, in bytes.
+    """
+    # Client frames are always masked
+    if length <= 125:
+        return struct.pack("!BB", first_byte, 0x80 | length)
+    if length <= 0xFFFF:
+        return struct.pack("!BBH", first_byte, 0x80 | 126, length)
+    return struct.pack("!BBQ", first_byte, 0x80 | 127, length)
+
+
+def mask_frame(header: bytes, payload: Buffer) -> bytearray:
+    """
+    Build a masked frame in a single buffer.
+
+    The payload is copied once, straight from the caller's buffer,
+    and masked in place with a fresh masking key.
+
+    Args:
+        header: The frame header, built by `frame_header()`.
+        payload: The payload. Any object supporting the buffer protocol.
+
+    Returns:
+        The header, the masking key and the masked payload.
+    """
+    view = memoryview(payload)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    view = view.cast("B")
+
+    masking_key = secrets.token_bytes(4)
+    start = len(header) + 4
+    frame = bytearray(start + len(view))
+    frame[: start - 4] = header
+    frame[start - 4 : start] = masking_key
+    frame[start:] = view
+    for offset, key in enumerate(masking_key):
+        lane = slice(start + offset, None, 4)
+        frame[lane] = frame[lane].translate(_XOR_TABLES[key])
+    # Handed over as is: streams write any bytes-like object
+    return frame
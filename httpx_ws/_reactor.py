@@ -0,0 +1,664 @@
+import collections
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import selectors
+import socket
+import ssl
+import threading
+import time
+import typing
+
+import httpcore
+import wsproto.events
+import wsproto.utilities
+from httpcore import NetworkStream
+from wsproto.frame_protocol import CloseReason
+
+from ._exceptions import EndOfStream, WebSocketHandlerError, WebSocketNetworkError
+from ._read_size import ReadSize, get_read_size
+
+if typing.TYPE_CHECKING:
+    from ._api import WebSocketSession
+
+DEFAULT_REACTOR_THREADS = 1
+# Threads of each loop sending Pong answers and keepalive Pings,
+# calling the message handlers, and closing the sessions, without blocking the loop.
+REACTOR_WRITER_THREADS = 4
+# Number of operations a session can have waiting for the writer threads,
+# like messages for its handler, before the loop stops reading it.
+REACTOR_MAX_PENDING_TASKS = 64
+# How long a read waits for a write to the stream to finish, see _ReactorLoop._recv()
+READ_RETRY_DELAY_SECONDS = 0.005
+
+_MSG_DONTWAIT: int | None = getattr(socket, "MSG_DONTWAIT", None)
+
+
+def get_selectable_socket(stream: NetworkStream) -> socket.socket | None:
+    """
+    Return the socket a reactor can wait on for this stream, if any.
+
+    Streams without a socket, like the ASGI transport, can't be multiplexed.
+    Neither can TLS streams whose encryption doesn't happen on the socket itself,
+    like TLS tunnelled through an HTTPS proxy: decrypted data may be buffered
+    where the selector can't see it.
+    """
+    sock = stream.get_extra_info("socket")
+    if not isinstance(sock, socket.socket):
+        return None
+    if stream.get_extra_info("ssl_object") is not None and not isinstance(
+        sock, ssl.SSLSocket
+    ):
+        return None
+    return sock
+
+
+class _Registration:
+    __slots__ = (
+        "session",
+        "sock",
+        "read_size",
+        "paused",
+        "deferred",
+        "watched",
+        "pong_callback",
+        "timer_version",
+        "tasks",
+        "handler_failed",
+    )
+
+    def __init__(self, session: "WebSocketSession", sock: socket.socket) -> None:
+        self.session = session
+        self.sock = sock
+        self.read_size: ReadSize = get_read_size(session._read_size)
+        # Not read until the consumer catches up
+        self.paused = False
+        # Not read until a write to the stream is done, see _ReactorLoop._recv()
+        self.deferred = False
+        # Whether the socket is registered in the selector
+        self.watched = False
+        self.pong_callback: threading.Event | None = None
+        self.timer_version = 0
+        # Blocking operations, run one at a time by the writer threads
+        self.tasks: collections.deque[typing.Callable[[], None]] = collections.deque()
+        # Whether a message handler raised: the next messages aren't handled
+        self.handler_failed = False
+
+    def has_pending_data(self) -> bool:
+        """
+        Whether data can be read without waiting for the socket to be readable.
+        """
+        # Data received along with the handshake response, buffered by httpcore
+        if getattr(self.session.stream, "_leading_data", None):
+            return True
+        # Data already decrypted by the TLS layer
+        return isinstance(self.sock, ssl.SSLSocket) and self.sock.pending() > 0
+
+
+class _ReactorLoop:
+    """
+    A selector loop running in its own thread and driving a set of sessions.
+
+    Sessions are only touched from the loop thread: other threads submit
+    commands that are run between two iterations of the loop.
+
+    The loop thread never blocks on a session: sockets are read
+    without waiting, and the writes, like Pong answers and keepalive Pings,
+    as well as the message handlers, are handed to a few writer threads,
+    so a slow peer or handler only holds up its own session.
+    """
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, None)
+
+        self._commands: collections.deque[typing.Callable[[], None]] = (
+            collections.deque()
+        )
+        self._registrations: dict[WebSocketSession, _Registration] = {}
+        self._timers: list[tuple[float, int, typing.Callable[[], None]]] = []
+        self._timers_counter = itertools.count()
+        self._closing = False
+        # Number of sessions assigned to this loop, maintained by the reactor
+        self.sessions_count = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name="httpx-ws-reactor", daemon=True
+        )
+        self._writer = concurrent.futures.ThreadPoolExecutor(
+            REACTOR_WRITER_THREADS, thread_name_prefix="httpx-ws-reactor-writer"
+        )
+        # Number of sessions with tasks submitted to the writer threads
+        self._running_tasks = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._closing = True
+        self._wakeup()
+        self._thread.join()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def call_soon(self, callback: typing.Callable[[], None]) -> None:
+        """
+        Run the callback on the loop thread, without waiting for it.
+        """
+        self._commands.append(callback)
+        self._wakeup()
+
+    def call(self, callback: typing.Callable[[], None]) -> None:
+        """
+        Run the callback on the loop thread and wait for it to finish.
+        """
+        if threading.current_thread() is self._thread:
+            callback()
+            return
+        done = threading.Event()
+
+        def _callback() -> None:
+            try:
+                callback()
+            finally:
+                done.set()
+
+        self.call_soon(_callback)
+        while not done.wait(1.0):
+            # The loop stopped before running the callback
+            if not self._thread.is_alive():
+                return
+
+    def add(self, session: "WebSocketSession", sock: socket.socket) -> None:
+        self.call_soon(lambda: self._add(session, sock))
+
+    def remove(self, session: "WebSocketSession") -> None:
+        self.call(lambda: self._remove(session))
+
+    def pause(self, session: "WebSocketSession") -> None:
+        """
+        Stop reading from the session. Must be called from the loop thread.
+        """
+        registration = self._registrations.get(session)
+        if registration is not None and not registration.paused:
+            registration.paused = True
+            self._update_watch(registration)
+
+    def resume(self, session: "WebSocketSession") -> None:
+        self.call_soon(lambda: self._resume(session))
+
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_writer.send(b"\0")
+        # The loop already has pending wakeups
+        except BlockingIOError:
+            pass
+        # The loop is stopped
+        except OSError:
+            if not self._closing:
+                raise
+
+    def _run(self) -> None:
+        try:
+            while not self._closing:
+                for key, _ in self._selector.select(self._next_timeout()):
+                    if key.data is None:
+                        self._drain_wakeup()
+                    else:
+                        self._read(key.data)
+                self._run_commands()
+                self._run_timers()
+        finally:
+            self._shutdown()
+
+    def _run_commands(self) -> None:
+        while self._commands:
+            self._commands.popleft()()
+
+    def _shutdown(self) -> None:
+        self._run_commands()
+        for session, registration in list(self._registrations.items()):
+            self._remove(session)
+            self._close_session(registration, CloseReason.GOING_AWAY, "Reactor closed")
+        # The writer threads may need the loop to detach the sessions they close
+        while self._running_tasks:
+            self._selector.select()
+            self._drain_wakeup()
+            self._run_commands()
+        self._writer.shutdown()
+        self._selector.close()
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _add(self, session: "WebSocketSession", sock: socket.socket) -> None:
+        registration = _Registration(session, sock)
+        self._registrations[session] = registration
+        session._reply_ping = lambda event: self._submit(
+            registration, functools.partial(self._send_pong, registration, event)
+        )
+        session._dispatch_handler = lambda handler, event: self._submit(
+            registration,
+            functools.partial(self._call_handler, registration, handler, event),
+        )
+        self._update_watch(registration)
+        interval = session._keepalive_ping_interval_seconds
+        if interval is not None:
+            self._schedule(registration, time.monotonic() + interval)
+        if registration.has_pending_data():
+            self._read(registration)
+
+    def _remove(self, session: "WebSocketSession") -> None:
+        registration = self._registrations.pop(session, None)
+        if registration is None:
+            return
+        # Invalidate pending timers
+        registration.timer_version += 1
+        self._update_watch(registration)
+
+    def _resume(self, session: "WebSocketSession") -> None:
+        registration = self._registrations.get(session)
+        if registration is None or not registration.paused:
+            return
+        # The consumer may not have caught up with the events read meanwhile
+        if session._overflow_events:
+            return
+        # Nor the writer threads with the messages for the handler
+        if len(registration.tasks) >= REACTOR_MAX_PENDING_TASKS:
+            return
+        registration.paused = False
+        self._update_watch(registration)
+        if registration.watched and registration.has_pending_data():
+            self._read(registration)
+
+    def _update_watch(self, registration: _Registration) -> None:
+        """
+        Register the socket in the selector, or unregister it,
+        depending on whether the session can be read.
+        """
+        watch = (
+            not registration.paused
+            and not registration.deferred
+            and self._registrations.get(registration.session) is registration
+        )
+        if watch == registration.watched:
+            return
+        if watch:
+            self._selector.register(
+                registration.sock, selectors.EVENT_READ, registration
+            )
+        else:
+            self._selector.unregister(registration.sock)
+        registration.watched = watch
+
+    def _read(self, registration: _Registration) -> None:
+        session = registration.session
+        try:
+            while (data := self._recv(registration)) is not None:
+                session._receive_data(data)
+                if len(registration.tasks) >= REACTOR_MAX_PENDING_TASKS:
+                    self.pause(session)
+                if (
+                    registration.paused
+                    or session._should_close.is_set()
+                    or not registration.has_pending_data()
+                ):
+                    break
+        except Exception as e:
+            self._remove(session)
+            self._submit(
+                registration, functools.partial(session._handle_receive_error, e)
+            )
+            return
+
+        if session._should_close.is_set():
+            self._remove(session)
+            return
+
+        pong_callback = registration.pong_callback
+        if pong_callback is not None and pong_callback.is_set():
+            registration.pong_callback = None
+            interval = session._keepalive_ping_interval_seconds
+            assert interval is not None
+            self._schedule(registration, time.monotonic() + interval)
+
+    def _recv(self, registration: _Registration) -> bytes | None:
+        """
+        Read from the session without waiting.
+
+        Returns:
+            The data read, or `None` if there is nothing to read yet.
+
+        Raises:
+            EndOfStream: The server closed the stream.
+            httpcore.ReadError: The stream can't be read.
+        """
+        session = registration.session
+        sock = registration.sock
+        max_bytes = registration.read_size.size
+        try:
+            if getattr(session.stream, "_leading_data", None):
+                data = session.stream.read(max_bytes)
+            elif _MSG_DONTWAIT is not None and not isinstance(sock, ssl.SSLSocket):
+                data = sock.recv(max_bytes, _MSG_DONTWAIT)
+            else:
+                # The socket timeout is shared with the writers,
+                # and TLS sockets don't support flags.
+                if not session._stream_lock.acquire(blocking=False):
+                    self._defer(registration)
+                    return None
+                try:
+                    timeout = sock.gettimeout()
+                    sock.settimeout(0)
+                    try:
+                        data = sock.recv(max_bytes)
+                    finally:
+                        sock.settimeout(timeout)
+                finally:
+                    session._stream_lock.release()
+        # Nothing to read yet, like a partial TLS record
+        except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return None
+        except OSError as e:
+            raise httpcore.ReadError(str(e)) from e
+        if data == b"":
+            raise EndOfStream()
+        registration.read_size.update(len(data))
+        return data
+
+    def _defer(self, registration: _Registration) -> None:
+        """
+        Stop reading from the session for a moment, while a write is running.
+        """
+        registration.deferred = True
+        self._update_watch(registration)
+        self._call_later(READ_RETRY_DELAY_SECONDS, lambda: self._retry(registration))
+
+    def _retry(self, registration: _Registration) -> None:
+        registration.deferred = False
+        self._update_watch(registration)
+        if registration.watched:
+            self._read(registration)
+
+    def _submit(
+        self, registration: _Registration, callback: typing.Callable[[], None]
+    ) -> None:
+        """
+        Run a blocking operation on the writer threads.
+
+        The operations of a session run one after the other,
+        so a session stuck on a write holds at most one writer thread.
+        """
+        registration.tasks.append(callback)
+        if len(registration.tasks) == 1:
+            self._running_tasks += 1
+            self._writer.submit(self._run_task, registration, callback)
+
+    def _run_task(
+        self, registration: _Registration, callback: typing.Callable[[], None]
+    ) -> None:
+        try:
+            callback()
+        finally:
+            self.call_soon(lambda: self._task_done(registration))
+
+    def _task_done(self, registration: _Registration) -> None:
+        registration.tasks.popleft()
+        if registration.tasks:
+            self._writer.submit(self._run_task, registration, registration.tasks[0])
+        else:
+            self._running_tasks -= 1
+        if registration.paused:
+            self._resume(registration.session)
+
+    def _send_pong(
+        self, registration: _Registration, event: wsproto.events.Ping
+    ) -> None:
+        session = registration.session
+        try:
+            session._send_pong(event)
+        except Exception as e:
+            self.remove(session)
+            session._handle_receive_error(e)
+
+    def _call_handler(
+        self,
+        registration: _Registration,
+        handler: typing.Callable[[str | bytes], typing.Any],
+        event: wsproto.events.Message,
+    ) -> None:
+        """
+        Call a message handler of the session, on a writer thread.
+        """
+        if registration.handler_failed:
+            return
+        session = registration.session
+        try:
+            session._call_handler(handler, event)
+        except WebSocketHandlerError as e:
+            registration.handler_failed = True
+            self.remove(session)
+            session._handle_receive_error(e)
+
+    def _send_ping(self, registration: _Registration, ping_id: bytes) -> None:
+        session = registration.session
+        try:
+            session.send(wsproto.events.Ping(ping_id))
+        # Connection is closing
+        except wsproto.utilities.LocalProtocolError:
+            self.remove(session)
+        except WebSocketNetworkError as e:
+            self.remove(session)
+            session._put_event(e)
+
+    def _close_session(
+        self, registration: _Registration, code: int, reason: str
+    ) -> None:
+        """
+        Close a session removed from the loop, and report it to the user.
+        """
+        session = registration.session
+
+        def _close() -> None:
+            session.close(code, reason)
+            session._put_event(WebSocketNetworkError())
+
+        self._submit(registration, _close)
+
+    def _schedule(self, registration: _Registration, deadline: float) -> None:
+        """
+        Schedule the next keepalive step of the session, replacing the previous one.
+        """
+        registration.timer_version += 1
+        version = registration.timer_version
+
+        def _keepalive() -> None:
+            if version == registration.timer_version:
+                self._keepalive(registration, time.monotonic())
+
+        self._call_at(deadline, _keepalive)
+
+    def _call_later(self, delay: float, callback: typing.Callable[[], None]) -> None:
+        self._call_at(time.monotonic() + delay, callback)
+
+    def _call_at(self, deadline: float, callback: typing.Callable[[], None]) -> None:
+        heapq.heappush(self._timers, (deadline, next(self._timers_counter), callback))
+
+    def _next_timeout(self) -> float | None:
+        if not self._timers:
+            return None
+        return max(self._timers[0][0] - time.monotonic(), 0.0)
+
+    def _run_timers(self) -> None:
+        timers = self._timers
+        now = time.monotonic()
+        while timers and timers[0][0] <= now:
+            _, _, callback = heapq.heappop(timers)
+            callback()
+
+    def _keepalive(self, registration: _Registration, now: float) -> None:
+        session = registration.session
+        interval = session._keepalive_ping_interval_seconds
+        timeout = session._keepalive_ping_timeout_seconds
+        assert interval is not None
+
+        # Waiting for a Pong
+        pong_callback = registration.pong_callback
+        if pong_callback is not None:
+            registration.pong_callback = None
+            if pong_callback.is_set():
+                self._schedule(registration, now + interval)
+                return
+            self._remove(session)
+            self._close_session(
+                registration, CloseReason.INTERNAL_ERROR, "Keepalive ping timeout"
+            )
+            return
+
+        ping_id, pong_callback = session._ping_manager.create()
+        self._submit(
+            registration, functools.partial(self._send_ping, registration, ping_id)
+        )
+
+        if timeout is None:
+            self._schedule(registration, now + interval)
+        else:
+            registration.pong_callback = pong_callback
+            self._schedule(registration, now + timeout)
+
+
+class WebSocketReactor:
+    """
+    Shared I/O reactor driving many [WebSocketSession][httpx_ws.WebSocketSession]
+    from a small, fixed number of threads.
+
+    By default, each sync session runs a receive thread and a keepalive thread.
+    Sessions attached to a reactor don't run any thread of their own:
+    the reactor waits for incoming data on all their sockets at once,
+    processes it, answers Ping events and sends keepalive Pings.
+
+    [receive()][httpx_ws.WebSocketSession.receive],
+    [send()][httpx_ws.WebSocketSession.send] and the other session methods
+    behave the same. When the queue of a session is full, the reactor stops
+    reading from it until the consumer catches up,
+    without blocking the other sessions.
+
+    Sessions whose stream doesn't expose a socket the reactor can wait on,
+    like the ones opened with an ASGI transport,
+    transparently fall back to their own threads.
+
+    Args:
+        threads:
+            Number of reactor threads. Sessions are spread among them.
+
+    Examples:
+        Run many sessions from a single thread.
+
+            with WebSocketReactor() as reactor:
+                with httpx.Client() as client:
+                    with connect_ws("http://localhost:8000/ws", client, reactor=reactor) as ws:
+                        message = ws.receive_text()
+    """
+
+    def __init__(self, threads: int = DEFAULT_REACTOR_THREADS) -> None:
+        if threads < 1:
+            raise ValueError("A reactor needs at least one thread")
+        self._loops = [_ReactorLoop() for _ in range(threads)]
+        self._sessions: dict[WebSocketSession, _ReactorLoop] = {}
+        self._lock = threading.Lock()
+        self._running = False
+
+    def __enter__(self) -> "WebSocketReactor":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self) -> None:
+        """
+        Start the reactor threads.
+
+        *This method is automatically called when entering the context manager.*
+        """
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        for loop in self._loops:
+            loop.start()
+
+    def close(self) -> None:
+        """
+        Stop the reactor threads.
+
+        Sessions still attached are closed,
+        and their pending `receive()` calls raise
+        [WebSocketNetworkError][httpx_ws.WebSocketNetworkError].
+
+        *This method is automatically called when exiting the context manager.*
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._sessions.clear()
+            for loop in self._loops:
+                loop.sessions_count = 0
+        for loop in self._loops:
+            loop.stop()
+
+    def register(self, session: "WebSocketSession") -> bool:
+        """
+        Attach a session to the reactor.
+
+        Returns:
+            Whether the session was attached. If `False`,
+            the session doesn't expose a socket and needs its own threads.
+
+        Raises:
+            RuntimeError: The reactor is not running.
+        """
+        sock = get_selectable_socket(session.stream)
+        if sock is None:
+            return False
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("The reactor is not running.")
+            loop = min(self._loops, key=lambda loop: loop.sessions_count)
+            loop.sessions_count += 1
+            self._sessions[session] = loop
+        session._put_event = session._put_event_nowait
+        loop.add(session, sock)
+        return True
+
+    def unregister(self, session: "WebSocketSession") -> None:
+        """
+        Detach a session from the reactor.
+
+        Once this method returns, the reactor won't touch the session anymore.
+        """
+        with self._lock:
+            loop = self._sessions.pop(session, None)
+            if loop is not None:
+                loop.sessions_count -= 1
+        if loop is not None:
+            loop.remove(session)
+
+    def pause(self, session: "WebSocketSession") -> None:
+        loop = self._sessions.get(session)
+        if loop is not None:
+            loop.pause(session)
+
+    def resume(self, session: "WebSocketSession") -> None:
+        loop = self._sessions.get(session)
+        if loop is not None:
+            loop.resume(session)
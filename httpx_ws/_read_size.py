@@ -0,0 +1,50 @@
+import typing
+
+ReadSizeOption = int | typing.Literal["adaptive"]
+
+ADAPTIVE_READ_SIZE_MIN = 4_096
+ADAPTIVE_READ_SIZE_MAX = 1_048_576
+
+
+class ReadSize:
+    """
+    Fixed number of bytes to read from the network at once.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    def update(self, nbytes: int) -> None:
+        pass
+
+
+class AdaptiveReadSize(ReadSize):
+    """
+    Number of bytes to read from the network at once, adapted to the traffic.
+
+    The size doubles each time a read fills it completely, and halves each time
+    a read uses less than a quarter of it. Busy connections thus need
+    fewer reads, while idle ones don't keep large read buffers around.
+    """
+
+    def __init__(
+        self,
+        minimum: int = ADAPTIVE_READ_SIZE_MIN,
+        maximum: int = ADAPTIVE_READ_SIZE_MAX,
+    ) -> None:
+        super().__init__(minimum)
+        self._minimum = minimum
+        self._maximum = maximum
+
+    def update(self, nbytes: int) -> None:
+        if nbytes >= self.size:
+            self.size = min(self.size * 2, self._maximum)
+        elif nbytes < self.size // 4:
+            self.size = max(self.size // 2, self._minimum)
+
+
+def get_read_size(read_size: ReadSizeOption) -> ReadSize:
+    if read_size == "adaptive":
+        return AdaptiveReadSize()
+    assert isinstance(read_size, int)
+    return ReadSize(read_size)
@@ -0,0 +1,123 @@
+import typing
+
+Predicate = typing.Callable[[str | bytes], bool]
+TopicExtractor = typing.Callable[[str | bytes], typing.Hashable]
+RouteHandler = typing.Callable[[str | bytes], typing.Any]
+
+
+class _Route:
+    __slots__ = ("handler",)
+
+    def __init__(self, handler: RouteHandler | None) -> None:
+        self.handler = handler
+
+
+class MessageRouter:
+    """
+    Route the messages of a session right in its receive loop,
+    dropping the unwanted ones before they're queued.
+
+    Each message is matched against the routes: first by its topic,
+    if the router extracts one, then by the predicates, in the order
+    they were added. The first route matching takes the message.
+    Messages matching no route are dropped.
+
+    Like with `on_message`, text messages are given
+    as strings, binary messages as bytes.
+
+    Args:
+        extract_topic:
+            Function extracting the topic of a message, looked up
+            among the topic routes. Returning `None` skips the topic routes.
+            Defaults to `None`, meaning only the predicates are used.
+
+    Attributes:
+        dropped: Number of messages matching no route.
+
+    Examples:
+        Keep the trades, and handle the heartbeats in the receive thread,
+        from text messages like `trade:{...}`.
+
+            router = MessageRouter(
+                extract_topic=lambda message: message.partition(":")[0]
+            )
+            router.route("trade")
+            router.route("heartbeat", handler=on_heartbeat)
+            with connect_ws("http://localhost:8000/ws", router=router) as ws:
+                for trade in ws:
+                    ...
+    """
+
+    def __init__(self, extract_topic: TopicExtractor | None = None) -> None:
+        self._extract_topic = extract_topic
+        self._topics: dict[typing.Hashable, _Route] = {}
+        self._predicates: list[tuple[Predicate, _Route]] = []
+        self.dropped = 0
+
+    def route(
+        self,
+        topic: typing.Hashable | None = None,
+        *,
+        predicate: Predicate | None = None,
+        handler: RouteHandler | None = None,
+    ) -> None:
+        """
+        Add a route, for a topic or a predicate.
+
+        Args:
+            topic:
+                Topic of the messages to take, as extracted by `extract_topic`.
+            predicate:
+                Function telling whether to take a message. It's called
+                in the receive loop for every message not taken before:
+                it should be cheap, like a prefix check.
+            handler:
+                Function called with the messages taken, from the receive loop,
+                or coroutine function for async sessions. It must be quick,
+                and must not block: nothing is read from the network while it runs.
+                Defaults to `None`, meaning the messages are queued
+                for `receive()`, like without router.
+
+        Examples:
+            Give the order updates their own queue, without blocking
+            when it's full.
+
+                orders: queue.Queue[str | bytes] = queue.Queue(maxsize=1000)
+
+                def on_order(message: str | bytes) -> None:
+                    with contextlib.suppress(queue.Full):
+                        orders.put_nowait(message)
+
+                router.route(
+                    predicate=lambda message: message.startswith('{"order"'),
+                    handler=on_order,
+                )
+        """
+        if (topic is None) == (predicate is None):
+            raise ValueError("Either a topic or a predicate is expected")
+        route = _Route(handler)
+        if predicate is not None:
+            self._predicates.append((predicate, route))
+            return
+        if self._extract_topic is None:
+            raise ValueError("Topic routes need a router extracting topics")
+        if topic in self._topics:
+            raise ValueError(f"Topic {topic!r} is already routed")
+        self._topics[topic] = route
+
+    def _match(self, message: str | bytes) -> _Route | None:
+        """
+        Find the route taking a message, if any.
+        """
+        if self._topics:
+            assert self._extract_topic is not None
+            topic = self._extract_topic(message)
+            if topic is not None:
+                topic_route = self._topics.get(topic)
+                if topic_route is not None:
+                    return topic_route
+        for predicate, route in self._predicates:
+            if predicate(message):
+                return route
+        self.dropped += 1
+        return None
@@ -0,0 +1,333 @@
+import abc
+import concurrent.futures
+import contextlib
+import itertools
+import typing
+import weakref
+
+import anyio
+
+from ._exceptions import WebSocketDisconnect, WebSocketRpcError
+
+if typing.TYPE_CHECKING:
+    from ._api import AsyncWebSocketSession, WebSocketSession
+
+
+# Ids of the calls, by session
+_session_ids: weakref.WeakKeyDictionary[typing.Any, typing.Iterator[int]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class _BaseRpcChannel(abc.ABC):
+    """
+    Correlation of JSON-RPC 2.0 responses with the pending calls,
+    right in the receive loop of the session.
+    """
+
+    def __init__(
+        self,
+        session: "WebSocketSession | AsyncWebSocketSession",
+        resolve: typing.Callable[[str | bytes], typing.Any],
+    ) -> None:
+        # Shared by the channels of the session, so their ids don't collide
+        self._ids = _session_ids.setdefault(session, itertools.count(1))
+        self._pending: dict[int, typing.Any] = {}
+        self._loads = session._json_codec.loads
+        # Response parsed by _is_response(), taken by the resolve handler
+        # called right after it, in the receive loop.
+        self._response: dict[str, typing.Any] | None = None
+        # On the session, not on its router: a router may be shared
+        # by sessions, whose responses must not resolve the calls of others.
+        session.intercept(self._is_response, resolve)
+        session.add_close_callback(self._fail_pending)
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of calls waiting for their response.
+        """
+        return len(self._pending)
+
+    def _request(
+        self, method: str, params: typing.Any
+    ) -> tuple[int, dict[str, typing.Any]]:
+        call_id = next(self._ids)
+        request: dict[str, typing.Any] = {
+            "jsonrpc": "2.0",
+            "id": call_id,
+            "method": method,
+        }
+        if params is not None:
+            request["params"] = params
+        return call_id, request
+
+    def _is_response(self, message: str | bytes) -> bool:
+        """
+        Tell whether a message answers a pending call.
+        """
+        # Don't parse the messages when no call is waiting
+        if not self._pending:
+            return False
+        try:
+            response = self._loads(message)
+        except ValueError:
+            return False
+        if (
+            isinstance(response, dict)
+            and isinstance(response.get("id"), int)
+            and response["id"] in self._pending
+            and ("result" in response or "error" in response)
+        ):
+            self._response = response
+            return True
+        return False
+
+    def _take_response(self) -> tuple[typing.Any, typing.Any, Exception | None]:
+        """
+        Take the response parsed by _is_response().
+
+        Returns:
+            The pending call, the result, and the error, if any.
+        """
+        response, self._response = self._response, None
+        assert response is not None
+        pending = self._pending.pop(response["id"], None)
+        error = response.get("error")
+        if error is None:
+            return pending, response.get("result"), None
+        if not isinstance(error, dict):
+            error = {}
+        return (
+            pending,
+            None,
+            WebSocketRpcError(
+                error.get("code", 0), error.get("message", ""), error.get("data")
+            ),
+        )
+
+    @abc.abstractmethod
+    def _fail_pending(self) -> None:
+        """
+        Fail the pending calls, once the session starts closing.
+        """
+
+
+class RpcChannel(_BaseRpcChannel):
+    """
+    JSON-RPC 2.0 calls over a [WebSocketSession][httpx_ws.WebSocketSession].
+
+    Each call gets an id, and its response is matched in the receive
+    thread, handing the result over to the waiting caller. Any number
+    of calls can be in flight at once over the connection, from several
+    threads or with [submit()][httpx_ws.RpcChannel.submit].
+
+    The other messages, like notifications, are handled as usual:
+    queued for `receive()`, routed by the
+    [MessageRouter][httpx_ws.MessageRouter] of the session, or given
+    to its `on_message` handler. The responses are matched before them.
+
+    Args:
+        session:
+            The session to make calls over. Not compatible
+            with `stream_messages`.
+
+    Examples:
+        Call a method.
+
+            with connect_ws("http://localhost:8000/ws") as ws:
+                rpc = RpcChannel(ws)
+                total = rpc.call("add", [1, 2], timeout=5.0)
+    """
+
+    def __init__(self, session: "WebSocketSession") -> None:
+        super().__init__(session, self._resolve)
+        self._session = session
+
+    def call(
+        self, method: str, params: typing.Any = None, timeout: float | None = None
+    ) -> typing.Any:
+        """
+        Call a method, and wait for its result.
+
+        Args:
+            method:
+                Name of the method.
+            params:
+                Parameters of the method, as a list or a dictionary.
+                Defaults to `None`, meaning no parameters.
+            timeout:
+                Number of seconds to wait for the response.
+                If `None`, will block until the response arrives.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            TimeoutError: The response didn't arrive before the timeout delay.
+            WebSocketRpcError: The server answered with an error.
+            WebSocketDisconnect: The connection closed before the response.
+            WebSocketNetworkError: A network error occured.
+        """
+        future = self.submit(method, params)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError as e:
+            future.cancel()
+            raise TimeoutError() from e
+
+    def submit(
+        self, method: str, params: typing.Any = None
+    ) -> concurrent.futures.Future[typing.Any]:
+        """
+        Call a method, without waiting for its result.
+
+        Useful to pipeline many calls from a single thread.
+
+        Args:
+            method:
+                Name of the method.
+            params:
+                Parameters of the method, as a list or a dictionary.
+                Defaults to `None`, meaning no parameters.
+
+        Returns:
+            A [Future][concurrent.futures.Future] resolved with the result
+            of the call. Cancel it to stop waiting for the response.
+
+        Raises:
+            WebSocketNetworkError: A network error occured.
+
+        Examples:
+            Send a batch of calls, then wait for their results.
+
+                futures = [rpc.submit("get", [key]) for key in keys]
+                values = [future.result(timeout=5.0) for future in futures]
+        """
+        call_id, request = self._request(method, params)
+        future: concurrent.futures.Future[typing.Any] = concurrent.futures.Future()
+        self._pending[call_id] = future
+        future.add_done_callback(lambda _: self._pending.pop(call_id, None))
+        try:
+            self._session.send_json(request)
+        except BaseException:
+            future.cancel()
+            raise
+        return future
+
+    def _resolve(self, message: str | bytes) -> None:
+        future, result, error = self._take_response()
+        if future is None:
+            return
+        # The caller may have cancelled it meanwhile
+        with contextlib.suppress(concurrent.futures.InvalidStateError):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _fail_pending(self) -> None:
+        for future in list(self._pending.values()):
+            with contextlib.suppress(concurrent.futures.InvalidStateError):
+                future.set_exception(
+                    WebSocketDisconnect(1006, "Closed before the response")
+                )
+
+
+class _PendingCall:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = anyio.Event()
+        self.result: typing.Any = None
+        self.error: Exception | None = None
+
+
+class AsyncRpcChannel(_BaseRpcChannel):
+    """
+    JSON-RPC 2.0 calls over an [AsyncWebSocketSession][httpx_ws.AsyncWebSocketSession].
+
+    Each call gets an id, and its response is matched in the receive
+    task, waking up the waiting caller. Any number of calls can be
+    in flight at once over the connection, from concurrent tasks.
+
+    The other messages, like notifications, are handled as usual:
+    queued for `receive()`, routed by the
+    [MessageRouter][httpx_ws.MessageRouter] of the session, or given
+    to its `on_message` handler. The responses are matched before them.
+
+    Args:
+        session:
+            The session to make calls over. Not compatible
+            with `stream_messages`.
+
+    Examples:
+        Make calls concurrently.
+
+            async with aconnect_ws("http://localhost:8000/ws") as ws:
+                rpc = AsyncRpcChannel(ws)
+                async with anyio.create_task_group() as tg:
+                    for key in keys:
+                        tg.start_soon(rpc.call, "delete", [key])
+    """
+
+    def __init__(self, session: "AsyncWebSocketSession") -> None:
+        super().__init__(session, self._resolve)
+        self._session = session
+
+    async def call(
+        self, method: str, params: typing.Any = None, timeout: float | None = None
+    ) -> typing.Any:
+        """
+        Call a method, and wait for its result.
+
+        Args:
+            method:
+                Name of the method.
+            params:
+                Parameters of the method, as a list or a dictionary.
+                Defaults to `None`, meaning no parameters.
+            timeout:
+                Number of seconds to wait for the response.
+                If `None`, will wait until the response arrives.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            TimeoutError: The response didn't arrive before the timeout delay.
+            WebSocketRpcError: The server answered with an error.
+            WebSocketDisconnect: The connection closed before the response.
+            WebSocketNetworkError: A network error occured.
+
+        Note:
+            Exceptions not caught inside the context manager will be
+            wrapped in an [ExceptionGroup][ExceptionGroup]. Use `except*` to catch them
+            outside the `async with` block.
+        """
+        call_id, request = self._request(method, params)
+        pending = _PendingCall()
+        self._pending[call_id] = pending
+        try:
+            await self._session.send_json(request)
+            with anyio.fail_after(timeout):
+                await pending.event.wait()
+        finally:
+            self._pending.pop(call_id, None)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    async def _resolve(self, message: str | bytes) -> None:
+        pending, result, error = self._take_response()
+        if pending is None:
+            return
+        pending.result = result
+        pending.error = error
+        pending.event.set()
+
+    def _fail_pending(self) -> None:
+        for pending in self._pending.values():
+            if not pending.event.is_set():
+                pending.error = WebSocketDisconnect(1006, "Closed before the response")
+                pending.event.set()
@@ -1,8 +1,14 @@
+import array
 import concurrent.futures
+import contextlib
+import dataclasses
+import json
 import queue
+import socket as socket_module
 import threading
 import time
-from unittest.mock import MagicMock, call, patch
+import typing
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 import anyio
 import httpcore
@@ -14,16 +20,28 @@ from starlette.websockets import WebSocket
 from starlette.websockets import WebSocketDisconnect as StarletteWebSocketDisconnect
 
 from httpx_ws import (
+    AsyncRpcChannel,
     AsyncWebSocketClient,
     AsyncWebSocketSession,
+    JSONCodec,
     JSONMode,
+    MessageRouter,
+    PerMessageDeflateOptions,
+    PreparedMessage,
+    RpcChannel,
     WebSocketClient,
     WebSocketDisconnect,
+    WebSocketHandlerError,
+    WebSocketInvalidTextReceived,
     WebSocketInvalidTypeReceived,
     WebSocketNetworkError,
+    WebSocketReactor,
+    WebSocketRpcError,
+    WebSocketSendQueueFull,
     WebSocketSession,
     WebSocketUpgradeError,
     aconnect_ws,
+    broadcast,
     connect_ws,
 )
 from tests.conftest import ServerFactoryFixture
@@ -322,6 +340,115 @@ class TestReceive:
             async with AsyncWebSocketSession(stream) as websocket_session:
                 await websocket_session.receive()
 
+    async def test_async_receive_queue_size(self):
+        class AsyncMockNetworkStream(AsyncNetworkStream):
+            def __init__(self) -> None:
+                self.connection = wsproto.connection.Connection(
+                    wsproto.connection.ConnectionType.SERVER
+                )
+                self.reads = 0
+
+            async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+                self.reads += 1
+                return self.connection.send(
+                    wsproto.events.TextMessage(data="SERVER_MESSAGE")
+                )
+
+            async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                pass
+
+            async def aclose(self) -> None:
+                pass
+
+        stream = AsyncMockNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, queue_size=4, keepalive_ping_interval_seconds=None
+        ) as websocket_session:
+            await anyio.sleep(0.1)
+            assert stream.reads == 4
+
+            # Above the low watermark: reading is still paused
+            await websocket_session.receive_text()
+            await anyio.sleep(0.1)
+            assert stream.reads == 4
+
+            # Low watermark reached: reading resumes until the queue is full again
+            await websocket_session.receive_text()
+            await anyio.sleep(0.1)
+            assert stream.reads == 6
+
+    def test_receive_adaptive_read_size(self):
+        class MockNetworkStream(NetworkStream):
+            def __init__(self) -> None:
+                self.connection = wsproto.connection.Connection(
+                    wsproto.connection.ConnectionType.SERVER
+                )
+                self.buffer = self.connection.send(
+                    wsproto.events.BytesMessage(data=b"A" * 100_000)
+                ) + self.connection.send(wsproto.events.BytesMessage(data=b"B"))
+                self.read_sizes: list[int] = []
+
+            def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+                self.read_sizes.append(max_bytes)
+                if not self.buffer:
+                    self.buffer = self.connection.send(
+                        wsproto.events.BytesMessage(data=b"C")
+                    )
+                    time.sleep(0.01)
+                data, self.buffer = self.buffer[:max_bytes], self.buffer[max_bytes:]
+                return data
+
+            def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                pass
+
+            def close(self) -> None:
+                pass
+
+        stream = MockNetworkStream()
+        with WebSocketSession(
+            stream, read_size="adaptive", keepalive_ping_interval_seconds=None
+        ) as websocket_session:
+            assert websocket_session.receive_bytes() == b"A" * 100_000
+            assert websocket_session.receive_bytes() == b"B"
+            for _ in range(5):
+                assert websocket_session.receive_bytes() == b"C"
+
+        # Grows while reads are full...
+        assert stream.read_sizes[:5] == [4096, 8192, 16384, 32768, 65536]
+        # ...and shrinks back when the connection is idle
+        assert stream.read_sizes[-1] == 4096
+
+    async def test_async_receive_read_size(self):
+        class AsyncMockNetworkStream(AsyncNetworkStream):
+            def __init__(self) -> None:
+                self.connection = wsproto.connection.Connection(
+                    wsproto.connection.ConnectionType.SERVER
+                )
+                self.read_sizes: list[int] = []
+
+            async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+                self.read_sizes.append(max_bytes)
+                return self.connection.send(
+                    wsproto.events.TextMessage(data="SERVER_MESSAGE")
+                )
+
+            async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                pass
+
+            async def aclose(self) -> None:
+                pass
+
+        stream = AsyncMockNetworkStream()
+        async with AsyncWebSocketSession(
+            stream,
+            max_message_size_bytes=1024,
+            read_size=512,
+            keepalive_ping_interval_seconds=None,
+        ) as websocket_session:
+            await websocket_session.receive_text()
+
+        assert set(stream.read_sizes) == {512}
+
     async def test_receive(self, server_factory: ServerFactoryFixture):
         async def websocket_endpoint(websocket: WebSocket):
             await websocket.accept()
@@ -385,6 +512,58 @@ class TestReceive:
                     assert isinstance(event, wsproto.events.Message)
                     assert event.data == full_message
 
+    @pytest.mark.parametrize(
+        "full_message,send_method",
+        [
+            pytest.param(b"A" * 1024 * 4, "send_bytes", id="bytes"),
+            pytest.param("A" * 1024 * 4, "send_text", id="text"),
+        ],
+    )
+    async def test_receive_message_too_big(
+        self,
+        full_message: str | bytes,
+        send_method: str,
+        server_factory: ServerFactoryFixture,
+        on_receive_message: MagicMock,
+    ):
+        async def websocket_endpoint(websocket: WebSocket):
+            await websocket.accept()
+
+            method = getattr(websocket, send_method)
+            await method(full_message)
+
+            try:
+                await websocket.receive_text()
+            except StarletteWebSocketDisconnect as e:
+                on_receive_message(e.code)
+
+        with server_factory(websocket_endpoint) as socket:
+            with httpx.Client(transport=httpx.HTTPTransport(uds=socket)) as client:
+                with connect_ws(
+                    "http://socket/ws",
+                    client,
+                    max_message_size_bytes=1024,
+                    max_message_size=2048,
+                ) as ws:
+                    with pytest.raises(WebSocketDisconnect) as exc_info:
+                        ws.receive()
+                    assert exc_info.value.code == 1009
+
+            async with httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=socket)
+            ) as aclient:
+                async with aconnect_ws(
+                    "http://socket/ws",
+                    aclient,
+                    max_message_size_bytes=1024,
+                    max_message_size=2048,
+                ) as aws:
+                    with pytest.raises(WebSocketDisconnect) as exc_info:
+                        await aws.receive()
+                    assert exc_info.value.code == 1009
+
+        on_receive_message.assert_has_calls([call(1009), call(1009)])
+
     async def test_receive_text(self, server_factory: ServerFactoryFixture):
         async def websocket_endpoint(websocket: WebSocket):
             await websocket.accept()
@@ -858,6 +1037,429 @@ async def test_subprotocol_and_response():
             assert aws.response.headers["sec-websocket-protocol"] == aws.subprotocol
 
 
+@pytest.mark.anyio
+class TestCompression:
+    async def test_compression(self, server_factory: ServerFactoryFixture):
+        message = '{"symbol": "EURUSD", "bid": 1.0842, "ask": 1.0843}' * 100
+
+        async def websocket_endpoint(websocket: WebSocket):
+            await websocket.accept()
+            await websocket.send_text(message)
+            await websocket.send_text(await websocket.receive_text())
+            await websocket.close()
+
+        with server_factory(websocket_endpoint) as socket:
+            with httpx.Client(transport=httpx.HTTPTransport(uds=socket)) as client:
+                with connect_ws(
+                    "http://socket/ws", client, compression="deflate"
+                ) as ws:
+                    assert ws.response is not None
+                    assert ws.response.headers["sec-websocket-extensions"].startswith(
+                        "permessage-deflate"
+                    )
+                    assert ws.receive_text() == message
+                    ws.send_text(message)
+                    assert ws.receive_text() == message
+
+            async with httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=socket)
+            ) as aclient:
+                async with aconnect_ws(
+                    "http://socket/ws", aclient, compression="deflate"
+                ) as aws:
+                    assert aws.response is not None
+                    assert aws.response.headers["sec-websocket-extensions"].startswith(
+                        "permessage-deflate"
+                    )
+                    assert await aws.receive_text() == message
+                    await aws.send_text(message)
+                    assert await aws.receive_text() == message
+
+    async def test_compression_options(self):
+        def handler(request):
+            assert request.headers["sec-websocket-extensions"] == (
+                "permessage-deflate; server_max_window_bits=10; "
+                "client_max_window_bits=12; client_no_context_takeover"
+            )
+            return httpx.Response(
+                101,
+                headers={
+                    "sec-websocket-extensions": (
+                        "permessage-deflate; server_max_window_bits=10; "
+                        "client_max_window_bits=11; client_no_context_takeover"
+                    )
+                },
+                extensions={"network_stream": MagicMock(spec=NetworkStream)},
+            )
+
+        with httpx.Client(
+            base_url="http://localhost:8000", transport=httpx.MockTransport(handler)
+        ) as client:
+            with connect_ws(
+                "http://socket/ws",
+                client,
+                compression=PerMessageDeflateOptions(
+                    server_max_window_bits=10,
+                    client_max_window_bits=12,
+                    client_no_context_takeover=True,
+                    memory_level=4,
+                ),
+                keepalive_ping_interval_seconds=None,
+            ) as ws:
+                (extension,) = ws.connection._proto.extensions
+                assert extension.enabled()
+                assert extension.server_max_window_bits == 10
+                assert extension.client_max_window_bits == 11
+                assert extension.client_no_context_takeover
+                assert not extension.server_no_context_takeover
+
+    async def test_compression_not_accepted(self):
+        def handler(request):
+            assert request.headers["sec-websocket-extensions"] == (
+                "permessage-deflate; client_max_window_bits"
+            )
+            return httpx.Response(
+                101,
+                extensions={"network_stream": MagicMock(spec=NetworkStream)},
+            )
+
+        with httpx.Client(
+            base_url="http://localhost:8000", transport=httpx.MockTransport(handler)
+        ) as client:
+            with connect_ws(
+                "http://socket/ws",
+                client,
+                compression="deflate",
+                keepalive_ping_interval_seconds=None,
+            ) as ws:
+                assert ws.connection._proto.extensions == []
+
+    async def test_compression_unexpected_extension(self):
+        def handler(request):
+            return httpx.Response(
+                101,
+                headers={"sec-websocket-extensions": "x-custom-extension"},
+                extensions={"network_stream": MagicMock(spec=NetworkStream)},
+            )
+
+        with httpx.Client(
+            base_url="http://localhost:8000", transport=httpx.MockTransport(handler)
+        ) as client:
+            with pytest.raises(WebSocketUpgradeError):
+                with connect_ws("http://socket/ws", client, compression="deflate"):
+                    pass
+
+    def test_compression_invalid_options(self):
+        with pytest.raises(ValueError):
+            PerMessageDeflateOptions(server_max_window_bits=8)
+        with pytest.raises(ValueError):
+            PerMessageDeflateOptions(memory_level=10)
+        with pytest.raises(ValueError):
+            PerMessageDeflateOptions(min_size=-1)
+
+    async def test_compression_min_size(self):
+        class MockNetworkStream(NetworkStream):
+            def __init__(self) -> None:
+                self.frames: list[bytes] = []
+                self._should_close = False
+
+            def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+                while not self._should_close:
+                    time.sleep(0.1)
+                raise httpcore.ReadError()
+
+            def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                self.frames.append(buffer)
+
+            def close(self) -> None:
+                self._should_close = True
+
+        stream = MockNetworkStream()
+        with WebSocketSession(
+            stream,
+            compression=PerMessageDeflateOptions(min_size=16),
+            keepalive_ping_interval_seconds=None,
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            ws.send_text("ack")
+            ws.send_text("MESSAGE" * 100)
+            ws.send_text("MESSAGE" * 100, compress=False)
+            ws.send_json({"ack": True}, compress=True)
+            ws.send_bytes(b"MESSAGE" * 100)
+
+        # RSV1 is set on compressed frames
+        assert [frame[0] & 0x40 != 0 for frame in stream.frames[:5]] == [
+            False,
+            True,
+            False,
+            True,
+            True,
+        ]
+
+        extension = wsproto.extensions.PerMessageDeflate()
+        extension.accept("permessage-deflate")
+        server = wsproto.connection.Connection(
+            wsproto.connection.ConnectionType.SERVER, [extension]
+        )
+        server.receive_data(b"".join(stream.frames[:5]))
+        assert [event.data for event in server.events()] == [
+            "ack",
+            "MESSAGE" * 100,
+            "MESSAGE" * 100,
+            '{"ack": true}',
+            b"MESSAGE" * 100,
+        ]
+
+    async def test_async_compression_min_size(self):
+        class AsyncMockNetworkStream(AsyncNetworkStream):
+            def __init__(self) -> None:
+                self.frames: list[bytes] = []
+                self._should_close = False
+
+            async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+                while not self._should_close:
+                    await anyio.sleep(0.1)
+                raise httpcore.ReadError()
+
+            async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                self.frames.append(buffer)
+
+            async def aclose(self) -> None:
+                self._should_close = True
+
+        stream = AsyncMockNetworkStream()
+        async with AsyncWebSocketSession(
+            stream,
+            compression=PerMessageDeflateOptions(min_size=16),
+            keepalive_ping_interval_seconds=None,
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            await ws.send_text("ack")
+            await ws.send_text("MESSAGE" * 100)
+            await ws.send_bytes(b"MESSAGE" * 100, compress=False)
+            await ws.send_json({"ack": True}, compress=True)
+
+        assert [frame[0] & 0x40 != 0 for frame in stream.frames[:4]] == [
+            False,
+            True,
+            False,
+            True,
+        ]
+
+
+class RecordingNetworkStream(NetworkStream):
+    def __init__(self) -> None:
+        self.written = bytearray()
+        self._should_close = False
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        while not self._should_close:
+            time.sleep(0.1)
+        raise httpcore.ReadError()
+
+    def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        self.written += buffer
+
+    def close(self) -> None:
+        self._should_close = True
+
+
+class AsyncRecordingNetworkStream(AsyncNetworkStream):
+    def __init__(self) -> None:
+        self.written = bytearray()
+        self._should_close = False
+
+    async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        while not self._should_close:
+            await anyio.sleep(0.1)
+        raise httpcore.ReadError()
+
+    async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        self.written += buffer
+
+    async def aclose(self) -> None:
+        self._should_close = True
+
+
+def receive_server_events(
+    data: bytes, compression: bool = False
+) -> list[wsproto.events.Event]:
+    extensions: list[wsproto.extensions.Extension] = []
+    if compression:
+        extension = wsproto.extensions.PerMessageDeflate()
+        extension.accept("permessage-deflate")
+        extensions.append(extension)
+    server = wsproto.connection.Connection(
+        wsproto.connection.ConnectionType.SERVER, extensions
+    )
+    server.receive_data(data)
+    return list(server.events())
+
+
+@pytest.mark.anyio
+class TestPreparedMessage:
+    async def test_send_prepared(self):
+        text_message = PreparedMessage("SERVER_MESSAGE")
+        bytes_message = PreparedMessage(b"SERVER_MESSAGE")
+        json_message = PreparedMessage.from_json({"message": "SERVER_MESSAGE"})
+        large_message = PreparedMessage("SERVER_MESSAGE" * 10_000)
+
+        streams = [RecordingNetworkStream() for _ in range(2)]
+        for stream in streams:
+            with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+                ws.send_prepared(text_message)
+                ws.send_prepared(bytes_message)
+                ws.send_prepared(json_message)
+                ws.send_prepared(large_message)
+
+        for stream in streams:
+            events = receive_server_events(bytes(stream.written))
+            assert [event.data for event in events[:4]] == [
+                "SERVER_MESSAGE",
+                b"SERVER_MESSAGE",
+                '{"message": "SERVER_MESSAGE"}',
+                "SERVER_MESSAGE" * 10_000,
+            ]
+        # Each frame has its own mask
+        assert streams[0].written != streams[1].written
+
+    async def test_async_send_prepared(self):
+        message = PreparedMessage.from_json({"message": "SERVER_MESSAGE"}, "binary")
+
+        stream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            await ws.send_prepared(message)
+            await ws.send_prepared(message)
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:2]] == [
+            b'{"message": "SERVER_MESSAGE"}',
+            b'{"message": "SERVER_MESSAGE"}',
+        ]
+
+    async def test_send_prepared_compressed(self):
+        message = PreparedMessage("PREPARED_MESSAGE" * 100)
+        short_message = PreparedMessage("ack")
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(
+            stream,
+            compression=PerMessageDeflateOptions(min_size=16),
+            keepalive_ping_interval_seconds=None,
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            ws.send_text("CLIENT_MESSAGE" * 100)
+            ws.send_prepared(message)
+            # Would refer to the first message in a stale compression context
+            ws.send_text("CLIENT_MESSAGE" * 100)
+            ws.send_prepared(short_message)
+            ws.send_prepared(message, compress=False)
+
+        # Compressed frames are much smaller
+        assert len(stream.written) < 2_000
+
+        events = receive_server_events(bytes(stream.written), compression=True)
+        assert [event.data for event in events[:5]] == [
+            "CLIENT_MESSAGE" * 100,
+            "PREPARED_MESSAGE" * 100,
+            "CLIENT_MESSAGE" * 100,
+            "ack",
+            "PREPARED_MESSAGE" * 100,
+        ]
+
+    async def test_send_prepared_closed(self):
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.close()
+            with pytest.raises(wsproto.utilities.LocalProtocolError):
+                ws.send_prepared(PreparedMessage("SERVER_MESSAGE"))
+
+
+@pytest.mark.anyio
+class TestBroadcast:
+    class SlowNetworkStream(AsyncRecordingNetworkStream):
+        slow = True
+
+        async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+            if self._should_close:
+                raise httpcore.WriteError()
+            while self.slow:
+                await anyio.sleep(0.05)
+
+        async def aclose(self) -> None:
+            self.closed = True
+            await super().aclose()
+
+    async def test_broadcast(self):
+        streams = [AsyncRecordingNetworkStream() for _ in range(3)]
+        async with contextlib.AsyncExitStack() as stack:
+            sessions = [
+                await stack.enter_async_context(
+                    AsyncWebSocketSession(stream, keepalive_ping_interval_seconds=None)
+                )
+                for stream in streams
+            ]
+            results = await broadcast(sessions, "SERVER_MESSAGE")
+            assert results == {session: None for session in sessions}
+
+            # Closed sessions report their error
+            await sessions[0].close()
+            results = await broadcast(sessions, PreparedMessage(b"SERVER_MESSAGE"))
+            assert isinstance(
+                results[sessions[0]], wsproto.utilities.LocalProtocolError
+            )
+            assert results[sessions[1]] is None
+            assert results[sessions[2]] is None
+
+        for stream in streams[1:]:
+            events = receive_server_events(bytes(stream.written))
+            assert [event.data for event in events[:2]] == [
+                "SERVER_MESSAGE",
+                b"SERVER_MESSAGE",
+            ]
+
+    async def test_broadcast_timeout(self):
+        stream = AsyncRecordingNetworkStream()
+        slow_stream = self.SlowNetworkStream()
+        async with (
+            AsyncWebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws,
+            AsyncWebSocketSession(
+                slow_stream, keepalive_ping_interval_seconds=None
+            ) as slow_ws,
+        ):
+            with anyio.fail_after(1.0):
+                results = await broadcast([ws, slow_ws], "SERVER_MESSAGE", timeout=0.1)
+            assert results[ws] is None
+            assert isinstance(results[slow_ws], TimeoutError)
+            # The frame was truncated
+            assert slow_stream.closed
+            with pytest.raises(WebSocketNetworkError):
+                await slow_ws.receive(timeout=1.0)
+
+    @pytest.mark.parametrize("on_timeout,evicted", [("skip", False), ("evict", True)])
+    async def test_broadcast_busy_session(self, on_timeout, evicted: bool):
+        stream = self.SlowNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            stream.closed = False
+            async with ws._write_lock:
+                results = await broadcast(
+                    [ws], "SERVER_MESSAGE", timeout=0.1, on_timeout=on_timeout
+                )
+            assert isinstance(results[ws], TimeoutError)
+            assert stream.closed is evicted
+            stream.slow = False
+
+
 @pytest.mark.anyio
 async def test_threads_wont_hang(server_factory: ServerFactoryFixture) -> None:
     """
@@ -881,15 +1483,39 @@ async def test_threads_wont_hang(server_factory: ServerFactoryFixture) -> None:
             ) as ws:
                 for _ in range(50):
                     ws.receive()
+                    # A single background thread reads from the socket.
+                    assert threading.active_count() == initial_threads_count + 1
                     ws.send_text("CLIENT_MESSAGE")
                 time.sleep(0.1)  # Let the websocket endpoint finish its handling.
-                threads_count = threading.active_count()
-                assert initial_threads_count + 2 == threads_count
             time.sleep(0.1)
             final_threads_count = threading.active_count()
             assert initial_threads_count == final_threads_count
 
 
+@pytest.mark.anyio
+async def test_close_stream_without_socket() -> None:
+    """
+    Check that closing doesn't wait for the server when the stream has no socket
+    to shut down, and its read only returns once data arrives.
+    """
+
+    class SilentNetworkStream(RecordingNetworkStream):
+        def __init__(self) -> None:
+            super().__init__()
+            self.data_received = threading.Event()
+
+        def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+            self.data_received.wait()
+            return b""
+
+    stream = SilentNetworkStream()
+    start = time.monotonic()
+    with WebSocketSession(stream, keepalive_ping_interval_seconds=None):
+        pass
+    assert time.monotonic() - start < 5.0
+    stream.data_received.set()
+
+
 @pytest.mark.anyio
 async def test_concurrency_write(server_factory: ServerFactoryFixture) -> None:
     """
@@ -948,3 +1574,2163 @@ async def test_client() -> None:
         async_ws_client = AsyncWebSocketClient(client)
         async with async_ws_client.connect("http://socket/ws") as aws:
             assert isinstance(aws.response, httpx.Response)
+
+
+class SocketNetworkStream(NetworkStream):
+    def __init__(self, sock: socket_module.socket) -> None:
+        self._sock = sock
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        try:
+            return self._sock.recv(max_bytes)
+        except OSError as e:
+            raise httpcore.ReadError() from e
+
+    def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        try:
+            self._sock.sendall(buffer)
+        except OSError as e:
+            raise httpcore.WriteError() from e
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def get_extra_info(self, info: str):
+        if info == "socket":
+            return self._sock
+        return None
+
+
+@pytest.mark.anyio
+class TestBatch:
+    class CountingNetworkStream(RecordingNetworkStream):
+        writes = 0
+
+        def write(self, buffer: bytes, timeout: float | None = None) -> None:
+            self.writes += 1
+            super().write(buffer, timeout)
+
+    class AsyncCountingNetworkStream(AsyncRecordingNetworkStream):
+        writes = 0
+
+        async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+            self.writes += 1
+            await super().write(buffer, timeout)
+
+    async def test_batch(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            with ws.batch():
+                for i in range(10):
+                    ws.send_text(f"SERVER_MESSAGE_{i}")
+                ws.send_prepared(PreparedMessage(b"SERVER_MESSAGE"))
+                assert stream.writes == 0
+            assert stream.writes == 1
+
+            ws.send_text("SERVER_MESSAGE")
+            assert stream.writes == 2
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:12]] == [
+            *(f"SERVER_MESSAGE_{i}" for i in range(10)),
+            b"SERVER_MESSAGE",
+            "SERVER_MESSAGE",
+        ]
+
+    async def test_batch_nested(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            with ws.batch():
+                ws.send_text("SERVER_MESSAGE")
+                with ws.batch():
+                    ws.send_text("SERVER_MESSAGE")
+                assert stream.writes == 0
+            assert stream.writes == 1
+
+    async def test_batch_max_bytes(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            with ws.batch(max_bytes=100):
+                for _ in range(10):
+                    ws.send_bytes(b"\x00" * 20)
+                # 26 bytes frames: written every 4 frames
+                assert stream.writes == 2
+            assert stream.writes == 3
+
+    async def test_batch_close(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            with ws.batch():
+                ws.send_text("SERVER_MESSAGE")
+                ws.close()
+                assert stream.writes == 1
+
+        events = receive_server_events(bytes(stream.written))
+        assert events[0].data == "SERVER_MESSAGE"
+        assert isinstance(events[1], wsproto.events.CloseConnection)
+
+    async def test_async_batch(self):
+        stream = TestBatch.AsyncCountingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            async with ws.batch():
+                for i in range(10):
+                    await ws.send_text(f"SERVER_MESSAGE_{i}")
+                await ws.send_prepared(PreparedMessage(b"SERVER_MESSAGE"))
+                assert stream.writes == 0
+            assert stream.writes == 1
+
+            async with ws.batch(max_bytes=100):
+                for _ in range(10):
+                    await ws.send_bytes(b"\x00" * 20)
+                assert stream.writes == 3
+            assert stream.writes == 4
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:11]] == [
+            *(f"SERVER_MESSAGE_{i}" for i in range(10)),
+            b"SERVER_MESSAGE",
+        ]
+
+    async def test_batch_write_error(self):
+        class BrokenNetworkStream(RecordingNetworkStream):
+            def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                raise httpcore.WriteError()
+
+        with WebSocketSession(
+            BrokenNetworkStream(), keepalive_ping_interval_seconds=None
+        ) as ws:
+            with pytest.raises(WebSocketNetworkError):
+                with ws.batch():
+                    ws.send_text("SERVER_MESSAGE")
+
+    async def test_send_many(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.send_many(
+                [
+                    "SERVER_MESSAGE",
+                    b"SERVER_MESSAGE",
+                    PreparedMessage.from_json({"message": "SERVER_MESSAGE"}),
+                ]
+            )
+            assert stream.writes == 1
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:3]] == [
+            "SERVER_MESSAGE",
+            b"SERVER_MESSAGE",
+            '{"message": "SERVER_MESSAGE"}',
+        ]
+
+    async def test_send_many_json(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_codec=bytes_json_codec()
+        ) as ws:
+            # Nothing is sent if a message can't be serialized
+            with pytest.raises(TypeError):
+                ws.send_many([{"message": "SERVER_MESSAGE"}, object()])
+            assert stream.writes == 0
+
+            ws.send_many(
+                [
+                    {"message": "SERVER_MESSAGE"},
+                    [1, 2],
+                    array.array("B", b"SERVER_MESSAGE"),
+                    "SERVER_MESSAGE",
+                ]
+            )
+            assert stream.writes == 1
+
+        events = receive_server_events(bytes(stream.written))
+        # Serialized with the codec of the session, as text messages
+        assert isinstance(events[0], wsproto.events.TextMessage)
+        assert [event.data for event in events[:4]] == [
+            '{"message":"SERVER_MESSAGE"}',
+            "[1,2]",
+            b"SERVER_MESSAGE",
+            "SERVER_MESSAGE",
+        ]
+
+    async def test_async_send_many(self):
+        stream = TestBatch.AsyncCountingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            await ws.send_many(f"SERVER_MESSAGE_{i}" for i in range(100))
+            assert stream.writes == 1
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:100]] == [
+            f"SERVER_MESSAGE_{i}" for i in range(100)
+        ]
+
+    async def test_send_many_compression(self):
+        stream = TestBatch.CountingNetworkStream()
+        with WebSocketSession(
+            stream,
+            keepalive_ping_interval_seconds=None,
+            compression=PerMessageDeflateOptions(min_size=100),
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            ws.send_many(
+                [
+                    "SERVER_MESSAGE" * 100,
+                    "SERVER_MESSAGE",
+                    PreparedMessage("SERVER_MESSAGE" * 100),
+                    "SERVER_MESSAGE" * 100,
+                ]
+            )
+
+        # Compressed frames are much smaller
+        assert len(stream.written) < 1_000
+
+        events = receive_server_events(bytes(stream.written), compression=True)
+        assert [event.data for event in events[:4]] == [
+            "SERVER_MESSAGE" * 100,
+            "SERVER_MESSAGE",
+            "SERVER_MESSAGE" * 100,
+            "SERVER_MESSAGE" * 100,
+        ]
+
+
+@pytest.mark.anyio
+class TestSendQueue:
+    class GatedNetworkStream(RecordingNetworkStream):
+        def __init__(self) -> None:
+            super().__init__()
+            self.writing = threading.Event()
+            self.gate = threading.Event()
+
+        def write(self, buffer: bytes, timeout: float | None = None) -> None:
+            self.writing.set()
+            self.gate.wait()
+            super().write(buffer, timeout)
+
+    class AsyncGatedNetworkStream(AsyncRecordingNetworkStream):
+        def __init__(self) -> None:
+            super().__init__()
+            self.writing = anyio.Event()
+            self.gate = anyio.Event()
+
+        async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+            self.writing.set()
+            await self.gate.wait()
+            await super().write(buffer, timeout)
+
+    async def test_send_queue(
+        self,
+        server_factory: ServerFactoryFixture,
+        on_receive_message: MagicMock,
+    ):
+        async def websocket_endpoint(websocket: WebSocket):
+            await websocket.accept()
+
+            for _ in range(10):
+                message = await websocket.receive_text()
+                on_receive_message(message)
+
+            await websocket.close()
+
+        with server_factory(websocket_endpoint) as socket:
+            with httpx.Client(transport=httpx.HTTPTransport(uds=socket)) as client:
+                with connect_ws("http://socket/ws", client, send_queue_size=4) as ws:
+                    for i in range(10):
+                        ws.send_text(f"CLIENT_MESSAGE_{i}")
+
+            async with httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=socket)
+            ) as aclient:
+                async with aconnect_ws(
+                    "http://socket/ws", aclient, send_queue_size=4
+                ) as aws:
+                    for i in range(10):
+                        await aws.send_text(f"CLIENT_MESSAGE_{i}")
+
+        on_receive_message.assert_has_calls(
+            [call(f"CLIENT_MESSAGE_{i}") for i in range(10)] * 2
+        )
+
+    async def test_send_nowait(self):
+        stream = TestSendQueue.GatedNetworkStream()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, send_queue_size=1
+        ) as ws:
+            ws.send_nowait("SERVER_MESSAGE_0")
+            # The writer took the first message, the second one fills the queue
+            assert stream.writing.wait(1.0)
+            ws.send_nowait("SERVER_MESSAGE_1")
+            with pytest.raises(WebSocketSendQueueFull):
+                ws.send_nowait("SERVER_MESSAGE_2")
+
+            stream.gate.set()
+            ws.drain()
+            assert bytes(stream.written) != b""
+            ws.send_nowait(b"SERVER_MESSAGE_3")
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:3]] == [
+            "SERVER_MESSAGE_0",
+            "SERVER_MESSAGE_1",
+            b"SERVER_MESSAGE_3",
+        ]
+        assert isinstance(events[3], wsproto.events.CloseConnection)
+
+    async def test_send_nowait_lock_held(self):
+        stream = TestSendQueue.GatedNetworkStream()
+        with contextlib.ExitStack() as stack:
+            ws = stack.enter_context(
+                WebSocketSession(
+                    stream, keepalive_ping_interval_seconds=None, send_queue_size=1
+                )
+            )
+            # Let the writer finish, even if the test fails
+            stack.callback(stream.gate.set)
+
+            # Another sender framing its message doesn't make the queue full
+            ws._write_lock.acquire()
+            threading.Timer(0.01, ws._write_lock.release).start()
+            ws.send_nowait("SERVER_MESSAGE_0")
+
+            # The writer took the first message, the second one fills the queue
+            assert stream.writing.wait(1.0)
+            ws.send_nowait("SERVER_MESSAGE_1")
+            with ws._write_lock:
+                start = time.monotonic()
+                with pytest.raises(WebSocketSendQueueFull):
+                    ws.send_nowait("SERVER_MESSAGE_2")
+                # Without waiting for the lock
+                assert time.monotonic() - start < 0.04
+
+    async def test_async_send_nowait(self):
+        stream = TestSendQueue.AsyncGatedNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, send_queue_size=1
+        ) as ws:
+            ws.send_nowait("SERVER_MESSAGE_0")
+            # The writer took the first message, the second one fills the queue
+            await stream.writing.wait()
+            ws.send_nowait("SERVER_MESSAGE_1")
+            with pytest.raises(WebSocketSendQueueFull):
+                ws.send_nowait("SERVER_MESSAGE_2")
+
+            stream.gate.set()
+            await ws.drain()
+            assert bytes(stream.written) != b""
+            ws.send_nowait(b"SERVER_MESSAGE_3")
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:3]] == [
+            "SERVER_MESSAGE_0",
+            "SERVER_MESSAGE_1",
+            b"SERVER_MESSAGE_3",
+        ]
+        assert isinstance(events[3], wsproto.events.CloseConnection)
+
+    async def test_send_nowait_without_queue(self):
+        with WebSocketSession(
+            RecordingNetworkStream(), keepalive_ping_interval_seconds=None
+        ) as ws:
+            with pytest.raises(RuntimeError):
+                ws.send_nowait("SERVER_MESSAGE")
+
+        async with AsyncWebSocketSession(
+            AsyncRecordingNetworkStream(), keepalive_ping_interval_seconds=None
+        ) as aws:
+            with pytest.raises(RuntimeError):
+                aws.send_nowait("SERVER_MESSAGE")
+
+    async def test_send_queue_batch(self):
+        stream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, send_queue_size=1
+        ) as ws:
+            async with ws.batch():
+                for i in range(10):
+                    ws.send_nowait(f"SERVER_MESSAGE_{i}")
+            await ws.drain()
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:10]] == [
+            f"SERVER_MESSAGE_{i}" for i in range(10)
+        ]
+
+    async def test_send_queue_error(self):
+        class BrokenNetworkStream(RecordingNetworkStream):
+            def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                raise httpcore.WriteError()
+
+        with WebSocketSession(
+            BrokenNetworkStream(),
+            keepalive_ping_interval_seconds=None,
+            send_queue_size=4,
+        ) as ws:
+            ws.send_text("SERVER_MESSAGE")
+            with pytest.raises(WebSocketNetworkError):
+                ws.drain()
+
+    async def test_async_send_queue_error(self):
+        class AsyncBrokenNetworkStream(AsyncRecordingNetworkStream):
+            async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                raise httpcore.WriteError()
+
+        with pytest.RaisesGroup(WebSocketNetworkError):
+            async with AsyncWebSocketSession(
+                AsyncBrokenNetworkStream(),
+                keepalive_ping_interval_seconds=None,
+                send_queue_size=4,
+            ) as ws:
+                await ws.send_text("SERVER_MESSAGE")
+                await ws.drain()
+
+
+@pytest.mark.anyio
+class TestSendStream:
+    @staticmethod
+    def assemble(events: list[wsproto.events.Event]) -> list[str | bytes]:
+        messages: list[str | bytes] = []
+        buffer: list[str | bytes] = []
+        for event in events:
+            if isinstance(event, wsproto.events.Message):
+                buffer.append(event.data)
+                if event.message_finished:
+                    messages.append(buffer[0][:0].join(buffer))  # type: ignore
+                    buffer = []
+        return messages
+
+    async def test_send_stream(self):
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.send_stream(["SERVER_", "MESSAGE_", "STREAMED"], fragment_size=4)
+            ws.send_stream(iter([b"SERVER_", b"MESSAGE"]))
+            ws.send_text("SERVER_MESSAGE")
+
+        events = receive_server_events(bytes(stream.written))
+        # 6 fragments, plus the empty final frame
+        assert all(not event.message_finished for event in events[:6])
+        assert events[6].data == ""
+        assert events[6].message_finished
+        assert self.assemble(events) == [
+            "SERVER_MESSAGE_STREAMED",
+            b"SERVER_MESSAGE",
+            "SERVER_MESSAGE",
+        ]
+
+    async def test_send_stream_empty(self):
+        async def no_chunks():
+            for chunk in ():
+                yield chunk
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.send_stream([])
+            ws.send_text("SERVER_MESSAGE")
+
+        astream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            astream, keepalive_ping_interval_seconds=None
+        ) as aws:
+            await aws.send_stream(no_chunks())
+            await aws.send_text("SERVER_MESSAGE")
+
+        # The peer still gets a message
+        for written in (stream.written, astream.written):
+            events = receive_server_events(bytes(written))
+            assert events[0].message_finished
+            assert self.assemble(events) == [b"", "SERVER_MESSAGE"]
+
+    async def test_send_stream_compression(self):
+        stream = RecordingNetworkStream()
+        with WebSocketSession(
+            stream,
+            compression="deflate",
+            keepalive_ping_interval_seconds=None,
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            ws.send_stream("SERVER_MESSAGE" * 100 for _ in range(10))
+            ws.send_text("SERVER_MESSAGE" * 100)
+
+        # Compressed frames are much smaller
+        assert len(stream.written) < 1_000
+
+        events = receive_server_events(bytes(stream.written), compression=True)
+        assert self.assemble(events) == [
+            "SERVER_MESSAGE" * 1_000,
+            "SERVER_MESSAGE" * 100,
+        ]
+
+    async def test_send_stream_error(self):
+        def chunks():
+            yield "SERVER_MESSAGE"
+            raise ValueError()
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            with pytest.raises(ValueError):
+                ws.send_stream(chunks())
+
+        events = receive_server_events(bytes(stream.written))
+        assert isinstance(events[1], wsproto.events.CloseConnection)
+        assert events[1].code == 1011
+
+    async def test_send_file(self, tmp_path):
+        path = tmp_path / "file.bin"
+        path.write_bytes(b"SERVER_MESSAGE" * 10)
+        empty_path = tmp_path / "empty.bin"
+        empty_path.write_bytes(b"")
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.send_file(path, fragment_size=64)
+            with open(path, "rb") as file:
+                file.seek(7)
+                ws.send_file(file)
+            ws.send_file(str(empty_path))
+
+        events = receive_server_events(bytes(stream.written))
+        assert [len(event.data) for event in events[:4]] == [64, 64, 12, 0]
+        assert self.assemble(events) == [
+            b"SERVER_MESSAGE" * 10,
+            (b"SERVER_MESSAGE" * 10)[7:],
+            b"",
+        ]
+
+    async def test_async_send_stream(self, tmp_path):
+        path = tmp_path / "file.bin"
+        path.write_bytes(b"SERVER_MESSAGE" * 10)
+
+        async def chunks():
+            yield "SERVER_"
+            yield "MESSAGE"
+
+        stream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            await ws.send_stream(chunks())
+            await ws.send_stream([b"SERVER_", b"MESSAGE"], fragment_size=4)
+            await ws.send_file(path, fragment_size=64)
+            with open(path, "rb") as file:
+                await ws.send_file(file)
+
+        events = receive_server_events(bytes(stream.written))
+        assert self.assemble(events) == [
+            "SERVER_MESSAGE",
+            b"SERVER_MESSAGE",
+            b"SERVER_MESSAGE" * 10,
+            b"SERVER_MESSAGE" * 10,
+        ]
+
+    async def test_async_send_stream_interleaving(self):
+        produce = anyio.Event()
+
+        async def chunks():
+            yield "SERVER_"
+            await produce.wait()
+            yield "MESSAGE"
+
+        stream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(ws.send_stream, chunks())
+                await anyio.wait_all_tasks_blocked()
+                task_group.start_soon(ws.send_text, "OTHER_MESSAGE")
+                await anyio.wait_all_tasks_blocked()
+                # Control frames can be sent in the middle of the message
+                await ws.ping(b"PING")
+                produce.set()
+
+        events = receive_server_events(bytes(stream.written))
+        assert isinstance(events[1], wsproto.events.Ping)
+        assert self.assemble(events) == ["SERVER_MESSAGE", "OTHER_MESSAGE"]
+
+
+class ServerFrames:
+    def __init__(self) -> None:
+        self.connection = wsproto.connection.Connection(
+            wsproto.connection.ConnectionType.SERVER
+        )
+
+    def __call__(self, *events: wsproto.events.Event) -> bytes:
+        return b"".join(self.connection.send(event) for event in events)
+
+
+class ScriptedNetworkStream(RecordingNetworkStream):
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads: queue.Queue[bytes] = queue.Queue()
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        while not self._should_close:
+            try:
+                return self.reads.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise httpcore.ReadError()
+
+
+class AsyncScriptedNetworkStream(AsyncRecordingNetworkStream):
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads: list[bytes] = []
+
+    async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        while not self._should_close:
+            if self.reads:
+                return self.reads.pop(0)
+            await anyio.sleep(0.01)
+        raise httpcore.ReadError()
+
+
+@pytest.mark.anyio
+class TestReceiveStream:
+    async def test_receive_stream(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, stream_messages=True
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False)
+                )
+            )
+            chunks = ws.receive_stream(timeout=1.0)
+            # Handed over before the rest of the message arrived
+            assert next(chunks) == b"AAA"
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.BytesMessage(b"BBB", message_finished=False),
+                    wsproto.events.BytesMessage(b"CCC"),
+                )
+            )
+            assert list(chunks) == [b"BBB", b"CCC"]
+
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_", message_finished=False),
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                )
+            )
+            # Reassembled by the consumer
+            assert ws.receive_text(timeout=1.0) == "SERVER_MESSAGE"
+            assert list(ws.receive_stream(timeout=1.0)) == ["SERVER_MESSAGE"]
+
+    async def test_receive_stream_abandoned(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, stream_messages=True
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False),
+                    wsproto.events.BytesMessage(b"BBB", message_finished=False),
+                    wsproto.events.BytesMessage(b"CCC"),
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                )
+            )
+            for chunk in ws.receive_stream(timeout=1.0):
+                assert chunk == b"AAA"
+                break
+            # The rest of the abandoned message is dropped
+            assert ws.receive_text(timeout=1.0) == "SERVER_MESSAGE"
+
+    async def test_receive_stream_not_streamed(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False),
+                    wsproto.events.BytesMessage(b"BBB"),
+                )
+            )
+            assert list(ws.receive_stream(timeout=1.0)) == [b"AAABBB"]
+
+    async def test_async_receive_stream(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, stream_messages=True
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False)
+                )
+            )
+            chunks = ws.receive_stream(timeout=1.0)
+            # Handed over before the rest of the message arrived
+            assert await anext(chunks) == b"AAA"
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.BytesMessage(b"BBB", message_finished=False),
+                    wsproto.events.BytesMessage(b"CCC"),
+                    wsproto.events.BytesMessage(b"DDD", message_finished=False),
+                    wsproto.events.BytesMessage(b"EEE"),
+                    wsproto.events.TextMessage("SERVER_", message_finished=False),
+                    wsproto.events.TextMessage("MESSAGE"),
+                )
+            )
+            assert [chunk async for chunk in chunks] == [b"BBB", b"CCC"]
+
+            async for chunk in ws.receive_stream(timeout=1.0):
+                assert chunk == b"DDD"
+                break
+            # The rest of the abandoned message is dropped
+            assert await ws.receive_text(timeout=1.0) == "SERVER_MESSAGE"
+
+    async def test_async_receive_stream_message_too_big(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream,
+            keepalive_ping_interval_seconds=None,
+            max_message_size=4,
+            stream_messages=True,
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False),
+                    wsproto.events.BytesMessage(b"BBB"),
+                )
+            )
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                await ws.receive(timeout=1.0)
+            assert exc_info.value.code == 1009
+
+
+@pytest.mark.anyio
+class TestSendBuffer:
+    async def test_send_bytes_buffers(self):
+        numbers = array.array("i", range(100))
+        payload = bytes(range(256)) * 300
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.send_bytes(bytearray(b"SERVER_MESSAGE"))
+            ws.send_bytes(memoryview(b"__SERVER_MESSAGE__")[2:-2])
+            ws.send_bytes(numbers)
+            ws.send_bytes(memoryview(b"SXEXRXVXEXR")[::2])
+            ws.send_bytes(b"")
+            ws.send_bytes(memoryview(payload))
+            ws.send_many([bytearray(b"A"), memoryview(b"B")])
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:8]] == [
+            b"SERVER_MESSAGE",
+            b"SERVER_MESSAGE",
+            numbers.tobytes(),
+            b"SERVER",
+            b"",
+            payload,
+            b"A",
+            b"B",
+        ]
+
+    async def test_async_send_bytes_buffers(self):
+        buffer = bytearray(b"SERVER_MESSAGE" * 10)
+
+        stream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            await ws.send_bytes(memoryview(buffer)[:14])
+            await ws.send_bytes(buffer)
+            await ws.send_many([memoryview(buffer)[14:28]])
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:3]] == [
+            b"SERVER_MESSAGE",
+            b"SERVER_MESSAGE" * 10,
+            b"SERVER_MESSAGE",
+        ]
+
+    async def test_send_bytes_buffers_compressed(self):
+        buffer = bytearray(b"CLIENT_MESSAGE" * 100)
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(
+            stream,
+            compression=PerMessageDeflateOptions(min_size=16),
+            keepalive_ping_interval_seconds=None,
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            ws.send_bytes(memoryview(buffer))
+            ws.send_bytes(memoryview(buffer)[:3])
+            ws.send_bytes(buffer)
+
+        # Compressed frames are much smaller
+        assert len(stream.written) < 500
+
+        events = receive_server_events(bytes(stream.written), compression=True)
+        assert [event.data for event in events[:3]] == [
+            b"CLIENT_MESSAGE" * 100,
+            b"CLI",
+            b"CLIENT_MESSAGE" * 100,
+        ]
+
+    async def test_send_bytes_closed(self):
+        stream = RecordingNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.close()
+            with pytest.raises(wsproto.utilities.LocalProtocolError):
+                ws.send_bytes(memoryview(b"SERVER_MESSAGE"))
+
+
+@dataclasses.dataclass
+class Item:
+    name: str
+    price: float
+
+
+@dataclasses.dataclass
+class Order:
+    id: int
+    items: list[Item]
+    note: str | None = None
+
+
+def bytes_json_codec() -> JSONCodec:
+    return JSONCodec(
+        dumps=lambda data: json.dumps(data, separators=(",", ":")).encode("utf-8"),
+        loads=MagicMock(side_effect=json.loads),
+    )
+
+
+@pytest.mark.anyio
+class TestJSONCodec:
+    async def test_send_json(self):
+        codec = bytes_json_codec()
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_codec=codec
+        ) as ws:
+            ws.send_json({"message": "SERVER_MESSAGE"})
+            ws.send_json({"message": "SERVER_MESSAGE"}, mode="binary")
+            ws.send_prepared(PreparedMessage.from_json([1, 2], json_codec=codec))
+
+        events = receive_server_events(bytes(stream.written))
+        # Bytes from the codec still make a text message
+        assert isinstance(events[0], wsproto.events.TextMessage)
+        assert [event.data for event in events[:3]] == [
+            '{"message":"SERVER_MESSAGE"}',
+            b'{"message":"SERVER_MESSAGE"}',
+            "[1,2]",
+        ]
+
+    async def test_async_send_json(self):
+        codec = JSONCodec(
+            dumps=lambda data: json.dumps(data, separators=(",", ":")),
+            loads=json.loads,
+        )
+
+        stream = AsyncRecordingNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_codec=codec
+        ) as ws:
+            await ws.send_json({"message": "SERVER_MESSAGE"})
+            await ws.send_json({"message": "SERVER_MESSAGE"}, mode="binary")
+
+        events = receive_server_events(bytes(stream.written))
+        assert [event.data for event in events[:2]] == [
+            '{"message":"SERVER_MESSAGE"}',
+            b'{"message":"SERVER_MESSAGE"}',
+        ]
+
+    async def test_send_json_compressed(self):
+        codec = bytes_json_codec()
+
+        stream = RecordingNetworkStream()
+        with WebSocketSession(
+            stream,
+            compression="deflate",
+            keepalive_ping_interval_seconds=None,
+            json_codec=codec,
+            response=httpx.Response(
+                101, headers={"sec-websocket-extensions": "permessage-deflate"}
+            ),
+        ) as ws:
+            ws.send_json(["SERVER_MESSAGE"] * 100)
+
+        assert len(stream.written) < 200
+
+        events = receive_server_events(bytes(stream.written), compression=True)
+        assert events[0].data == json.dumps(
+            ["SERVER_MESSAGE"] * 100, separators=(",", ":")
+        )
+
+    async def test_receive_json(self):
+        codec = bytes_json_codec()
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_codec=codec
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage('{"message": "SERVER_MESSAGE"}'),
+                    wsproto.events.BytesMessage(b'{"message": "SERVER_MESSAGE"}'),
+                )
+            )
+            assert ws.receive_json(timeout=1.0) == {"message": "SERVER_MESSAGE"}
+            assert ws.receive_json(timeout=1.0, mode="binary") == {
+                "message": "SERVER_MESSAGE"
+            }
+
+        assert codec.loads.call_args_list == [
+            call('{"message": "SERVER_MESSAGE"}'),
+            call(b'{"message": "SERVER_MESSAGE"}'),
+        ]
+
+    async def test_async_receive_json(self):
+        codec = bytes_json_codec()
+
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_codec=codec
+        ) as ws:
+            stream.reads.append(
+                server_frames(wsproto.events.TextMessage('{"message": "SERVER"}'))
+            )
+            assert await ws.receive_json(timeout=1.0) == {"message": "SERVER"}
+
+        codec.loads.assert_called_once_with('{"message": "SERVER"}')
+
+    async def test_receive_json_type(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_type=Order
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage(
+                        '{"id": 1, "items": [{"name": "A", "price": 2}],'
+                        ' "note": null, "extra": true}'
+                    ),
+                    wsproto.events.TextMessage('{"id": 2, "items": []}'),
+                    wsproto.events.TextMessage('{"id": 3, "items": []}'),
+                    wsproto.events.TextMessage('{"id": "4", "items": []}'),
+                    wsproto.events.TextMessage('{"items": []}'),
+                    wsproto.events.TextMessage("[1, 2.5]"),
+                    wsproto.events.TextMessage("[true]"),
+                )
+            )
+            assert ws.receive_json(timeout=1.0) == Order(
+                id=1, items=[Item(name="A", price=2)], note=None
+            )
+            assert ws.receive_json(timeout=1.0, type=typing.Any) == {
+                "id": 2,
+                "items": [],
+            }
+            assert ws.receive_json(timeout=1.0, type=Order | None) == Order(
+                id=3, items=[]
+            )
+            with pytest.raises(ValueError, match="Expected int, got str"):
+                ws.receive_json(timeout=1.0)
+            with pytest.raises(ValueError, match="Invalid Order"):
+                ws.receive_json(timeout=1.0)
+            assert ws.receive_json(timeout=1.0, type=list[float]) == [1, 2.5]
+            with pytest.raises(ValueError, match="Expected float, got bool"):
+                ws.receive_json(timeout=1.0, type=list[float])
+
+    async def test_async_receive_json_type(self):
+        compile_decoder = MagicMock(
+            side_effect=lambda type: lambda data: type(**json.loads(data))
+        )
+        codec = JSONCodec(json.dumps, json.loads, decoder=compile_decoder)
+
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, json_codec=codec
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage('{"name": "A", "price": 2}'),
+                    wsproto.events.BytesMessage(b'{"name": "B", "price": 3}'),
+                )
+            )
+            assert await ws.receive_json(timeout=1.0, type=Item) == Item("A", 2)
+            assert await ws.receive_json(timeout=1.0, mode="binary", type=Item) == Item(
+                "B", 3
+            )
+
+        # Compiled once, then reused
+        compile_decoder.assert_called_once_with(Item)
+
+    async def test_connect_json_codec(self, server_factory: ServerFactoryFixture):
+        codec = bytes_json_codec()
+
+        async def websocket_endpoint(websocket: WebSocket):
+            await websocket.accept()
+            await websocket.send_text(await websocket.receive_text())
+            await websocket.close()
+
+        with server_factory(websocket_endpoint) as socket:
+            with httpx.Client(transport=httpx.HTTPTransport(uds=socket)) as client:
+                with connect_ws("http://socket/ws", client, json_codec=codec) as ws:
+                    ws.send_json({"message": "CLIENT_MESSAGE"})
+                    assert ws.receive_json() == {"message": "CLIENT_MESSAGE"}
+
+            async with httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=socket)
+            ) as aclient:
+                async with aconnect_ws(
+                    "http://socket/ws", aclient, json_codec=codec
+                ) as aws:
+                    await aws.send_json({"message": "CLIENT_MESSAGE"})
+                    assert await aws.receive_json() == {"message": "CLIENT_MESSAGE"}
+
+        assert codec.loads.call_args_list == [
+            call('{"message":"CLIENT_MESSAGE"}'),
+            call('{"message":"CLIENT_MESSAGE"}'),
+        ]
+
+
+@pytest.mark.anyio
+class TestRawText:
+    async def test_raw_text(self):
+        codec = JSONCodec(json.dumps, MagicMock(side_effect=json.loads))
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream,
+            keepalive_ping_interval_seconds=None,
+            raw_text=True,
+            json_codec=codec,
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.TextMessage('{"message": "SERVER_MESSAGE"}'),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                )
+            )
+            assert ws.receive_text_bytes(timeout=1.0) == b"SERVER_MESSAGE"
+            assert ws.receive_text(timeout=1.0) == "SERVER_MESSAGE"
+            assert ws.receive_json(timeout=1.0) == {"message": "SERVER_MESSAGE"}
+            assert ws.receive_bytes(timeout=1.0) == b"SERVER_MESSAGE"
+
+        codec.loads.assert_called_once_with(b'{"message": "SERVER_MESSAGE"}')
+
+    async def test_raw_text_fragmented(self):
+        stream = ScriptedNetworkStream()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, raw_text=True
+        ) as ws:
+            # "Café" with its last character split between two frames,
+            # then the same in a single frame
+            stream.reads.put(
+                b"\x01\x04Caf\xc3" + b"\x80\x01\xa9" + b"\x81\x05Caf\xc3\xa9"
+            )
+            assert ws.receive_text_bytes(timeout=1.0) == "Café".encode()
+            event = ws.receive(timeout=1.0)
+            assert isinstance(event, wsproto.events.TextMessage)
+            assert event.data == "Café".encode()
+
+    async def test_raw_text_invalid(self):
+        stream = AsyncScriptedNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, raw_text=True
+        ) as ws:
+            stream.reads.append(b"\x81\x02\xc3\x28")
+            with pytest.raises(WebSocketDisconnect) as excinfo:
+                await ws.receive_text_bytes(timeout=1.0)
+            assert excinfo.value.code == 1007
+
+    async def test_async_raw_text(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, raw_text=True
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_", message_finished=False),
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.TextMessage('{"message": "SERVER_MESSAGE"}'),
+                )
+            )
+            assert await ws.receive_text_bytes(timeout=1.0) == b"SERVER_MESSAGE"
+            assert await ws.receive_text(timeout=1.0) == "SERVER_MESSAGE"
+            assert await ws.receive_json(timeout=1.0) == {"message": "SERVER_MESSAGE"}
+
+    async def test_validate_utf8_disabled(self):
+        stream = ScriptedNetworkStream()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, validate_utf8=False
+        ) as ws:
+            # Invalid UTF-8, then "Café" split in the middle of a character
+            stream.reads.put(b"\x81\x02\xc3\x28" + b"\x01\x04Caf\xc3" + b"\x80\x01\xa9")
+            assert ws.receive_text_bytes(timeout=1.0) == b"\xc3\x28"
+            assert ws.receive_text(timeout=1.0) == "Café"
+
+            # The session stays open after a message that can't be decoded
+            stream.reads.put(b"\x81\x02\xc3\x28" + b"\x81\x02OK")
+            with pytest.raises(WebSocketInvalidTextReceived) as excinfo:
+                ws.receive_text(timeout=1.0)
+            assert excinfo.value.event.data == b"\xc3\x28"
+            assert ws.receive_text(timeout=1.0) == "OK"
+
+    async def test_async_validate_utf8_disabled(self):
+        stream = AsyncScriptedNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, validate_utf8=False
+        ) as ws:
+            stream.reads.append(b"\x81\x02\xc3\x28" * 2)
+            assert await ws.receive_text_bytes(timeout=1.0) == b"\xc3\x28"
+            with pytest.raises(WebSocketInvalidTextReceived):
+                await ws.receive_text(timeout=1.0)
+
+    async def test_raw_text_unsupported_wsproto(self):
+        class RefactoredFrameProtocol(wsproto.frame_protocol.FrameProtocol):
+            def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+                super().__init__(*args, **kwargs)
+                del self._message_decoder
+
+        with patch("wsproto.connection.FrameProtocol", RefactoredFrameProtocol):
+            with pytest.raises(RuntimeError):
+                WebSocketSession(ScriptedNetworkStream(), raw_text=True)
+            with pytest.raises(RuntimeError):
+                AsyncWebSocketSession(AsyncScriptedNetworkStream(), validate_utf8=False)
+            # Sessions without raw text don't depend on it
+            WebSocketSession(ScriptedNetworkStream())
+
+    async def test_receive_text_bytes(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("Café"),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                )
+            )
+            assert ws.receive_text_bytes(timeout=1.0) == "Café".encode()
+            with pytest.raises(WebSocketInvalidTypeReceived):
+                ws.receive_text_bytes(timeout=1.0)
+
+
+@pytest.mark.anyio
+class TestIteration:
+    async def test_iter(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.Ping(b"PING"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            # Ends on close, without raising
+            assert list(ws) == ["SERVER_MESSAGE", b"SERVER_MESSAGE"]
+
+    async def test_iter_typed(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, stream_messages=True
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_", message_finished=False),
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.TextMessage('{"name": "Pen", "price": 2}'),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            texts = ws.iter_text()
+            assert next(texts) == "SERVER_MESSAGE"
+            assert next(ws.iter_json(type=Item)) == Item(name="Pen", price=2)
+            with pytest.raises(WebSocketInvalidTypeReceived):
+                next(texts)
+            assert list(ws.iter_bytes()) == [b"SERVER_MESSAGE"]
+
+    async def test_iter_bytearray(self):
+        with WebSocketSession(
+            ScriptedNetworkStream(), keepalive_ping_interval_seconds=None
+        ) as ws:
+            # Older wsproto releases give binary data as a bytearray
+            for _ in range(3):
+                ws._events.put(wsproto.events.BytesMessage(bytearray(b"SERVER")))
+            assert type(next(iter(ws))) is bytes
+            assert type(next(ws.iter_bytes())) is bytes
+            assert type(ws.receive_bytes(timeout=1.0)) is bytes
+
+    async def test_iter_skips_abandoned_stream(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, stream_messages=True
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False),
+                    wsproto.events.BytesMessage(b"BBB"),
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            for chunk in ws.receive_stream(timeout=1.0):
+                assert chunk == b"AAA"
+                break
+            assert list(ws) == ["SERVER_MESSAGE"]
+
+    async def test_async_iter(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, raw_text=True
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_", message_finished=False),
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            assert [message async for message in ws] == [
+                "SERVER_MESSAGE",
+                b"SERVER_MESSAGE",
+            ]
+
+    async def test_async_iter_typed(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.TextMessage('{"name": "Pen", "price": 2}'),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            assert await anext(ws.iter_text()) == "SERVER_MESSAGE"
+            items = ws.iter_json(type=Item)
+            assert await anext(items) == Item(name="Pen", price=2)
+            with pytest.raises(WebSocketInvalidTypeReceived):
+                await anext(items)
+            assert [data async for data in ws.iter_bytes()] == []
+
+    async def test_async_iter_network_error(self):
+        stream = AsyncScriptedNetworkStream()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            await stream.aclose()
+            with pytest.raises(WebSocketNetworkError):
+                async for _ in ws:
+                    pass
+
+
+@pytest.mark.anyio
+class TestReceiveMany:
+    async def test_receive_many(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            stream.reads.put(
+                server_frames(
+                    *(wsproto.events.TextMessage(f"MESSAGE_{i}") for i in range(5)),
+                    wsproto.events.CloseConnection(1000, "BYE"),
+                )
+            )
+            # Wait for the background thread to queue everything
+            events = [ws.receive(timeout=1.0)]
+            while ws._events.qsize() < 5:
+                time.sleep(0.01)
+
+            events += ws.receive_many(max_messages=3, timeout=1.0)
+            events += ws.receive_many(timeout=1.0)
+            assert [event.data for event in events] == [
+                f"MESSAGE_{i}" for i in range(5)
+            ]
+            # The close is reported after the messages before it
+            with pytest.raises(WebSocketDisconnect) as excinfo:
+                ws.receive_many(timeout=1.0)
+            assert excinfo.value.reason == "BYE"
+
+    async def test_receive_many_timeout(self):
+        stream = ScriptedNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            with pytest.raises(TimeoutError):
+                ws.receive_many(timeout=0.1)
+
+    async def test_receive_many_streamed(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, stream_messages=True
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.BytesMessage(b"AAA", message_finished=False),
+                    wsproto.events.BytesMessage(b"BBB"),
+                    wsproto.events.BytesMessage(b"CCC", message_finished=False),
+                )
+            )
+            while ws._events.qsize() < 3:
+                time.sleep(0.01)
+            events = ws.receive_many(timeout=0.1)
+            assert [event.data for event in events] == [b"AAABBB"]
+
+            stream.reads.put(server_frames(wsproto.events.BytesMessage(b"DDD")))
+            events = ws.receive_many(timeout=1.0)
+            assert [event.data for event in events] == [b"CCCDDD"]
+
+    async def test_async_receive_many(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    *(wsproto.events.BytesMessage(b"MESSAGE") for _ in range(5)),
+                )
+            )
+            while ws._receive_event.statistics().current_buffer_used < 5:
+                await anyio.sleep(0.01)
+            events = await ws.receive_many(max_messages=10, timeout=1.0)
+            assert [event.data for event in events] == [b"MESSAGE"] * 5
+
+            await stream.aclose()
+            with pytest.raises(WebSocketNetworkError):
+                await ws.receive_many(timeout=1.0)
+
+    async def test_async_receive_many_deferred_close(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            while ws._receive_event.statistics().current_buffer_used < 3:
+                await anyio.sleep(0.01)
+            events = await ws.receive_many(timeout=1.0)
+            assert [event.data for event in events] == ["MESSAGE", "MESSAGE"]
+            # Iteration ends on the close kept by receive_many()
+            assert [message async for message in ws] == []
+
+
+@pytest.mark.anyio
+class TestMessageHandler:
+    async def test_on_message(self):
+        received: list[tuple[str | bytes, threading.Thread]] = []
+
+        def on_message(message: str | bytes) -> None:
+            received.append((message, threading.current_thread()))
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, on_message=on_message
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_", message_finished=False),
+                    wsproto.events.TextMessage("MESSAGE"),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            # Only the close goes through the queue
+            with pytest.raises(WebSocketDisconnect):
+                ws.receive(timeout=1.0)
+
+            assert [message for message, _ in received] == [
+                "SERVER_MESSAGE",
+                b"SERVER_MESSAGE",
+            ]
+            # Called from the receive thread
+            assert all(
+                thread is not threading.current_thread() for _, thread in received
+            )
+            assert ws.handler_stats is not None
+            assert ws.handler_stats.calls == 2
+            assert 0 < ws.handler_stats.max_seconds <= ws.handler_stats.total_seconds
+            assert ws.handler_stats.mean_seconds == ws.handler_stats.total_seconds / 2
+
+    async def test_on_message_error(self):
+        def on_message(message: str | bytes) -> None:
+            raise ValueError(message)
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, on_message=on_message
+        ) as ws:
+            stream.reads.put(server_frames(wsproto.events.TextMessage("BAD")))
+            with pytest.raises(WebSocketHandlerError) as excinfo:
+                ws.receive(timeout=1.0)
+            assert isinstance(excinfo.value.__cause__, ValueError)
+
+        events = receive_server_events(bytes(stream.written))
+        assert isinstance(events[0], wsproto.events.CloseConnection)
+        assert events[0].code == 1011
+
+    async def test_on_message_invalid_utf8(self):
+        on_message = MagicMock()
+        stream = ScriptedNetworkStream()
+        with WebSocketSession(
+            stream,
+            keepalive_ping_interval_seconds=None,
+            validate_utf8=False,
+            on_message=on_message,
+        ) as ws:
+            stream.reads.put(b"\x81\x02\xff\xfe")
+            with pytest.raises(WebSocketHandlerError) as excinfo:
+                ws.receive(timeout=1.0)
+            assert isinstance(excinfo.value.__cause__, WebSocketInvalidTextReceived)
+
+        on_message.assert_not_called()
+        events = receive_server_events(bytes(stream.written))
+        assert isinstance(events[0], wsproto.events.CloseConnection)
+        assert events[0].code == 1011
+
+    async def test_on_message_stream_messages(self):
+        with pytest.raises(AssertionError):
+            WebSocketSession(
+                ScriptedNetworkStream(),
+                stream_messages=True,
+                on_message=lambda message: None,
+            )
+
+    async def test_async_on_message(self):
+        received: list[str | bytes] = []
+
+        async def on_message(message: str | bytes) -> None:
+            received.append(message)
+
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, on_message=on_message
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage("SERVER_MESSAGE"),
+                    wsproto.events.BytesMessage(b"SERVER_MESSAGE"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            with pytest.raises(WebSocketDisconnect):
+                await ws.receive(timeout=1.0)
+
+            assert received == ["SERVER_MESSAGE", b"SERVER_MESSAGE"]
+            assert ws.handler_stats is not None
+            assert ws.handler_stats.calls == 2
+
+    async def test_async_on_message_error(self):
+        async def on_message(message: str | bytes) -> None:
+            raise ValueError(message)
+
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, on_message=on_message
+        ) as ws:
+            stream.reads.append(server_frames(wsproto.events.BytesMessage(b"BAD")))
+            with pytest.raises(WebSocketHandlerError) as excinfo:
+                await ws.receive(timeout=1.0)
+            assert isinstance(excinfo.value.__cause__, ValueError)
+
+        events = receive_server_events(bytes(stream.written))
+        assert isinstance(events[0], wsproto.events.CloseConnection)
+        assert events[0].code == 1011
+
+    async def test_async_on_message_invalid_utf8(self):
+        on_message = AsyncMock()
+        stream = AsyncScriptedNetworkStream()
+        async with AsyncWebSocketSession(
+            stream,
+            keepalive_ping_interval_seconds=None,
+            validate_utf8=False,
+            on_message=on_message,
+        ) as ws:
+            stream.reads.append(b"\x81\x02\xff\xfe")
+            with pytest.raises(WebSocketHandlerError) as excinfo:
+                await ws.receive(timeout=1.0)
+            assert isinstance(excinfo.value.__cause__, WebSocketInvalidTextReceived)
+
+        on_message.assert_not_called()
+        events = receive_server_events(bytes(stream.written))
+        assert isinstance(events[0], wsproto.events.CloseConnection)
+        assert events[0].code == 1011
+
+
+@pytest.mark.anyio
+class TestMessageRouter:
+    async def test_router(self):
+        heartbeats: list[str | bytes] = []
+        orders: queue.Queue[str | bytes] = queue.Queue()
+        router = MessageRouter(
+            extract_topic=lambda message: (
+                message.partition(":")[0] if isinstance(message, str) else None
+            )
+        )
+        router.route("trade")
+        router.route("heartbeat", handler=heartbeats.append)
+        router.route(
+            predicate=lambda message: isinstance(message, bytes), handler=orders.put
+        )
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, router=router
+        ) as ws:
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("quote:1"),
+                    wsproto.events.TextMessage("trade:1"),
+                    wsproto.events.TextMessage("heartbeat:1"),
+                    wsproto.events.BytesMessage(b"ORDER"),
+                    wsproto.events.TextMessage("quote:2"),
+                    wsproto.events.TextMessage("trade:2"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            # The unmatched messages are never queued
+            assert list(ws) == ["trade:1", "trade:2"]
+            assert heartbeats == ["heartbeat:1"]
+            assert orders.get_nowait() == b"ORDER"
+            assert router.dropped == 2
+            assert ws.handler_stats is not None
+            assert ws.handler_stats.calls == 2
+
+    async def test_router_error(self):
+        router = MessageRouter(extract_topic=lambda message: message[10])
+        router.route("x")
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, router=router
+        ) as ws:
+            stream.reads.put(server_frames(wsproto.events.TextMessage("SHORT")))
+            with pytest.raises(WebSocketHandlerError) as excinfo:
+                ws.receive(timeout=1.0)
+            assert isinstance(excinfo.value.__cause__, IndexError)
+
+    async def test_router_invalid_routes(self):
+        router = MessageRouter()
+        with pytest.raises(ValueError):
+            router.route()
+        with pytest.raises(ValueError):
+            router.route("topic", predicate=lambda message: True)
+        with pytest.raises(ValueError):
+            router.route("topic")
+
+        router = MessageRouter(extract_topic=lambda message: message)
+        router.route("topic")
+        with pytest.raises(ValueError):
+            router.route("topic")
+
+    async def test_router_setter_and_intercept(self):
+        intercepted: list[str | bytes] = []
+        router = MessageRouter(extract_topic=lambda message: message[:5])
+        router.route("trade")
+
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            assert ws.router is None
+            ws.router = router
+            assert ws.handler_stats is not None
+            with pytest.raises(ValueError):
+                ws.router = MessageRouter()
+            ws.intercept(lambda message: message.endswith("!"), intercepted.append)
+
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage("trade:1!"),
+                    wsproto.events.TextMessage("trade:2"),
+                )
+            )
+            assert ws.receive_text(timeout=1.0) == "trade:2"
+            assert intercepted == ["trade:1!"]
+
+    async def test_async_router(self):
+        received: list[str | bytes] = []
+
+        async def on_heartbeat(message: str | bytes) -> None:
+            received.append(message)
+
+        router = MessageRouter()
+        router.route(predicate=lambda message: message.startswith("trade"))
+        router.route(
+            predicate=lambda message: message.startswith("heartbeat"),
+            handler=on_heartbeat,
+        )
+
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, router=router
+        ) as ws:
+            stream.reads.append(
+                server_frames(
+                    wsproto.events.TextMessage("quote:1"),
+                    wsproto.events.TextMessage("heartbeat:1"),
+                    wsproto.events.TextMessage("trade:1"),
+                    wsproto.events.CloseConnection(1000),
+                )
+            )
+            assert [message async for message in ws] == ["trade:1"]
+            assert received == ["heartbeat:1"]
+            assert router.dropped == 1
+
+
+def rpc_response(call_id: int, **fields: typing.Any) -> wsproto.events.TextMessage:
+    return wsproto.events.TextMessage(
+        json.dumps({"jsonrpc": "2.0", "id": call_id, **fields})
+    )
+
+
+@pytest.mark.anyio
+class TestRpcChannel:
+    async def test_rpc(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            rpc = RpcChannel(ws)
+            first = rpc.submit("add", [1, 2])
+            second = rpc.submit("ping")
+            assert rpc.pending == 2
+
+            stream.reads.put(
+                server_frames(
+                    rpc_response(2, result="pong"),
+                    wsproto.events.TextMessage('{"method": "tick"}'),
+                    # Not a pending call
+                    rpc_response(3, result="unknown"),
+                    rpc_response(1, result=3),
+                )
+            )
+            assert first.result(timeout=1.0) == 3
+            assert second.result(timeout=1.0) == "pong"
+            assert rpc.pending == 0
+            # The other messages are queued as usual
+            assert ws.receive_json(timeout=1.0) == {"method": "tick"}
+            assert ws.receive_json(timeout=1.0)["id"] == 3
+
+            future = rpc.submit("missing", {"key": "value"})
+            stream.reads.put(
+                server_frames(
+                    rpc_response(
+                        3, error={"code": -32601, "message": "Method not found"}
+                    )
+                )
+            )
+            with pytest.raises(WebSocketRpcError) as excinfo:
+                future.result(timeout=1.0)
+            assert excinfo.value.code == -32601
+            assert excinfo.value.message == "Method not found"
+
+        requests = [
+            json.loads(event.data)
+            for event in receive_server_events(bytes(stream.written))
+            if isinstance(event, wsproto.events.TextMessage)
+        ]
+        assert requests == [
+            {"jsonrpc": "2.0", "id": 1, "method": "add", "params": [1, 2]},
+            {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+            {
+                "jsonrpc": "2.0",
+                "id": 3,
+                "method": "missing",
+                "params": {"key": "value"},
+            },
+        ]
+
+    async def test_rpc_timeout(self):
+        stream = ScriptedNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            rpc = RpcChannel(ws)
+            with pytest.raises(TimeoutError):
+                rpc.call("slow", timeout=0.1)
+            assert rpc.pending == 0
+
+    async def test_rpc_closed(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            rpc = RpcChannel(ws)
+            future = rpc.submit("slow")
+            stream.reads.put(server_frames(wsproto.events.CloseConnection(1000)))
+            with pytest.raises(WebSocketDisconnect):
+                future.result(timeout=1.0)
+
+    async def test_rpc_channels(self):
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            first_rpc = RpcChannel(ws)
+            second_rpc = RpcChannel(ws)
+            first = first_rpc.submit("first")
+            second = second_rpc.submit("second")
+
+            requests = [
+                json.loads(event.data)
+                for event in receive_server_events(bytes(stream.written))
+            ]
+            assert [request["id"] for request in requests] == [1, 2]
+            stream.reads.put(
+                server_frames(
+                    *(
+                        rpc_response(request["id"], result=request["method"])
+                        for request in requests
+                    )
+                )
+            )
+            assert first.result(timeout=1.0) == "first"
+            assert second.result(timeout=1.0) == "second"
+
+            # Both channels are notified when the session closes
+            futures = [first_rpc.submit("slow"), second_rpc.submit("slow")]
+            stream.reads.put(server_frames(wsproto.events.CloseConnection(1000)))
+            for future in futures:
+                with pytest.raises(WebSocketDisconnect):
+                    future.result(timeout=1.0)
+
+    async def test_rpc_shared_router(self):
+        router = MessageRouter()
+        router.route(predicate=lambda message: True)
+        streams = [ScriptedNetworkStream(), ScriptedNetworkStream()]
+        server_frames = [ServerFrames(), ServerFrames()]
+        with contextlib.ExitStack() as stack:
+            sessions = [
+                stack.enter_context(
+                    WebSocketSession(
+                        stream, keepalive_ping_interval_seconds=None, router=router
+                    )
+                )
+                for stream in streams
+            ]
+            channels = [RpcChannel(ws) for ws in sessions]
+            futures = [rpc.submit("whoami") for rpc in channels]
+
+            # Both calls have the id 1, each on its own connection
+            streams[1].reads.put(server_frames[1](rpc_response(1, result="second")))
+            assert futures[1].result(timeout=1.0) == "second"
+            assert not futures[0].done()
+            streams[0].reads.put(server_frames[0](rpc_response(1, result="first")))
+            assert futures[0].result(timeout=1.0) == "first"
+
+    async def test_rpc_on_message(self):
+        received: list[str | bytes] = []
+        stream = ScriptedNetworkStream()
+        server_frames = ServerFrames()
+        with WebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, on_message=received.append
+        ) as ws:
+            rpc = RpcChannel(ws)
+            future = rpc.submit("ping")
+            stream.reads.put(
+                server_frames(
+                    wsproto.events.TextMessage('{"method": "tick"}'),
+                    rpc_response(1, result="pong"),
+                )
+            )
+            assert future.result(timeout=1.0) == "pong"
+            assert received == ['{"method": "tick"}']
+
+    async def test_close_callback(self):
+        callback = MagicMock()
+        stream = ScriptedNetworkStream()
+        with WebSocketSession(stream, keepalive_ping_interval_seconds=None) as ws:
+            ws.add_close_callback(callback)
+            callback.assert_not_called()
+        callback.assert_called_once_with()
+
+        # Already closing
+        late_callback = MagicMock()
+        ws.add_close_callback(late_callback)
+        late_callback.assert_called_once_with()
+
+    async def test_async_rpc(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        router = MessageRouter()
+        router.route(predicate=lambda message: "tick" in message)
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None, router=router
+        ) as ws:
+            rpc = AsyncRpcChannel(ws)
+            results: dict[int, typing.Any] = {}
+
+            async def call(value: int) -> None:
+                results[value] = await rpc.call("echo", [value], timeout=1.0)
+
+            async with anyio.create_task_group() as tg:
+                for value in range(1, 4):
+                    tg.start_soon(call, value)
+                while rpc.pending < 3:
+                    await anyio.sleep(0.01)
+                requests = [
+                    json.loads(event.data)
+                    for event in receive_server_events(bytes(stream.written))
+                ]
+                stream.reads.append(
+                    server_frames(
+                        *(
+                            rpc_response(
+                                request["id"], result=request["params"][0] * 10
+                            )
+                            for request in reversed(requests)
+                        ),
+                        wsproto.events.TextMessage('{"method": "tick"}'),
+                        wsproto.events.TextMessage('{"method": "other"}'),
+                    )
+                )
+            assert results == {1: 10, 2: 20, 3: 30}
+            # Uncorrelated messages still go through the router
+            assert await ws.receive_json(timeout=1.0) == {"method": "tick"}
+            assert router.dropped == 1
+
+    async def test_async_rpc_timeout_and_close(self):
+        stream = AsyncScriptedNetworkStream()
+        server_frames = ServerFrames()
+        async with AsyncWebSocketSession(
+            stream, keepalive_ping_interval_seconds=None
+        ) as ws:
+            rpc = AsyncRpcChannel(ws)
+            with pytest.raises(TimeoutError):
+                await rpc.call("slow", timeout=0.1)
+            assert rpc.pending == 0
+
+            async def close() -> None:
+                while not rpc.pending:
+                    await anyio.sleep(0.01)
+                stream.reads.append(server_frames(wsproto.events.CloseConnection(1000)))
+
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(close)
+                with pytest.raises(WebSocketDisconnect):
+                    await rpc.call("slow", timeout=1.0)
+
+
+@pytest.mark.anyio
+class TestReactor:
+    async def test_reactor(self, server_factory: ServerFactoryFixture):
+        async def websocket_endpoint(websocket: WebSocket):
+            await websocket.accept()
+            for i in range(20):
+                await websocket.send_text(f"SERVER_MESSAGE_{i}")
+            message = await websocket.receive_text()
+            await websocket.send_text(message)
+            await websocket.close()
+
+        with server_factory(websocket_endpoint) as socket:
+            with httpx.Client(transport=httpx.HTTPTransport(uds=socket)) as client:
+                with WebSocketReactor() as reactor:
+                    initial_threads_count = threading.active_count()
+                    with contextlib.ExitStack() as stack:
+                        sessions = [
+                            stack.enter_context(
+                                connect_ws(
+                                    "http://socket/ws",
+                                    client,
+                                    queue_size=2,
+                                    reactor=reactor,
+                                )
+                            )
+                            for _ in range(5)
+                        ]
+                        # Sessions don't run threads of their own
+                        assert threading.active_count() == initial_threads_count
+
+                        # Let the reactor fill the queues
+                        time.sleep(0.1)
+                        for ws in sessions:
+                            for i in range(20):
+                                assert ws.receive_text() == f"SERVER_MESSAGE_{i}"
+                            ws.send_text("CLIENT_MESSAGE")
+                            assert ws.receive_text() == "CLIENT_MESSAGE"
+                            with pytest.raises(WebSocketDisconnect):
+                                ws.receive_text()
+
+    async def test_reactor_fallback(self):
+        class MockNetworkStream(NetworkStream):
+            def __init__(self) -> None:
+                self._should_close = False
+
+            def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+                while not self._should_close:
+                    time.sleep(0.1)
+                raise httpcore.ReadError()
+
+            def write(self, buffer: bytes, timeout: float | None = None) -> None:
+                pass
+
+            def close(self) -> None:
+                self._should_close = True
+
+        with WebSocketReactor() as reactor:
+            with WebSocketSession(
+                MockNetworkStream(),
+                keepalive_ping_interval_seconds=None,
+                reactor=reactor,
+            ) as ws:
+                assert ws._reactor is None
+                assert ws._background_receive_task is not None
+                assert ws._background_receive_task.is_alive()
+
+    async def test_reactor_not_running(self):
+        client_sock, server_sock = socket_module.socketpair()
+        with server_sock:
+            reactor = WebSocketReactor()
+            with pytest.raises(RuntimeError):
+                with WebSocketSession(
+                    SocketNetworkStream(client_sock), reactor=reactor
+                ):
+                    pass
+            client_sock.close()
+
+    async def test_reactor_keepalive_ping(self):
+        client_sock, server_sock = socket_module.socketpair()
+        connection = wsproto.connection.Connection(
+            wsproto.connection.ConnectionType.SERVER
+        )
+        pings_received = 0
+
+        def server() -> None:
+            nonlocal pings_received
+            while data := server_sock.recv(4096):
+                connection.receive_data(data)
+                for event in connection.events():
+                    if isinstance(event, wsproto.events.Ping):
+                        pings_received += 1
+                        server_sock.sendall(connection.send(event.response()))
+
+        server_thread = threading.Thread(target=server)
+        server_thread.start()
+        with WebSocketReactor() as reactor:
+            with WebSocketSession(
+                SocketNetworkStream(client_sock),
+                keepalive_ping_interval_seconds=0.05,
+                keepalive_ping_timeout_seconds=0.05,
+                reactor=reactor,
+            ) as ws:
+                with pytest.raises(TimeoutError):
+                    ws.receive(timeout=0.3)
+        server_sock.close()
+        server_thread.join()
+
+        assert pings_received >= 2
+
+    async def test_reactor_keepalive_ping_timeout(self):
+        client_sock, server_sock = socket_module.socketpair()
+        with server_sock:
+            with WebSocketReactor() as reactor:
+                with WebSocketSession(
+                    SocketNetworkStream(client_sock),
+                    keepalive_ping_interval_seconds=0.05,
+                    keepalive_ping_timeout_seconds=0.05,
+                    reactor=reactor,
+                ) as ws:
+                    with pytest.raises(WebSocketNetworkError):
+                        ws.receive(timeout=1.0)
+
+    async def test_reactor_close(self):
+        client_sock, server_sock = socket_module.socketpair()
+        with server_sock:
+            reactor = WebSocketReactor()
+            reactor.start()
+            with WebSocketSession(
+                SocketNetworkStream(client_sock),
+                keepalive_ping_interval_seconds=None,
+                reactor=reactor,
+            ) as ws:
+                reactor.close()
+                with pytest.raises(WebSocketNetworkError):
+                    ws.receive(timeout=1.0)
+
+    @pytest.mark.parametrize("dontwait", [True, False])
+    async def test_reactor_session_waiting_to_write(self, dontwait: bool):
+        client_sock_a, server_sock_a = socket_module.socketpair()
+        client_sock_b, server_sock_b = socket_module.socketpair()
+        frames_a = ServerFrames()
+        frames_b = ServerFrames()
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(server_sock_a)
+            stack.enter_context(server_sock_b)
+            if not dontwait:
+                stack.enter_context(patch("httpx_ws._reactor._MSG_DONTWAIT", None))
+            reactor = stack.enter_context(WebSocketReactor())
+            ws_a, ws_b = (
+                stack.enter_context(
+                    WebSocketSession(
+                        SocketNetworkStream(client_sock),
+                        keepalive_ping_interval_seconds=None,
+                        reactor=reactor,
+                    )
+                )
+                for client_sock in (client_sock_a, client_sock_b)
+            )
+
+            # The Pong answer of the first session waits for the lock,
+            # without holding up the reactor.
+            with ws_a._write_lock:
+                server_sock_a.sendall(
+                    frames_a(
+                        wsproto.events.Ping(b"PING"),
+                        wsproto.events.TextMessage("SERVER_MESSAGE_A"),
+                    )
+                )
+                server_sock_b.sendall(
+                    frames_b(wsproto.events.TextMessage("SERVER_MESSAGE_B"))
+                )
+                assert ws_b.receive_text(timeout=1.0) == "SERVER_MESSAGE_B"
+                assert ws_a.receive_text(timeout=1.0) == "SERVER_MESSAGE_A"
+
+            server_sock_a.settimeout(1.0)
+            frames_a.connection.receive_data(server_sock_a.recv(4096))
+            assert list(frames_a.connection.events()) == [wsproto.events.Pong(b"PING")]
+
+    async def test_reactor_slow_handler(self):
+        client_sock_a, server_sock_a = socket_module.socketpair()
+        client_sock_b, server_sock_b = socket_module.socketpair()
+        frames_a = ServerFrames()
+        frames_b = ServerFrames()
+        handled: queue.Queue[str | bytes] = queue.Queue()
+        release = threading.Event()
+
+        def slow_handler(message: str | bytes) -> None:
+            release.wait(5.0)
+            handled.put(message)
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(server_sock_a)
+            stack.enter_context(server_sock_b)
+            # Stop reading the first session as soon as a message waits
+            stack.enter_context(patch("httpx_ws._reactor.REACTOR_MAX_PENDING_TASKS", 1))
+            reactor = stack.enter_context(WebSocketReactor())
+            stack.enter_context(
+                WebSocketSession(
+                    SocketNetworkStream(client_sock_a),
+                    keepalive_ping_interval_seconds=None,
+                    on_message=slow_handler,
+                    reactor=reactor,
+                )
+            )
+            ws_b = stack.enter_context(
+                WebSocketSession(
+                    SocketNetworkStream(client_sock_b),
+                    keepalive_ping_interval_seconds=None,
+                    reactor=reactor,
+                )
+            )
+
+            # The handler of the first session runs on a writer thread,
+            # without holding up the other sessions of the reactor.
+            server_sock_a.sendall(
+                frames_a(
+                    wsproto.events.TextMessage("FIRST"),
+                    wsproto.events.TextMessage("SECOND"),
+                )
+            )
+            server_sock_b.sendall(
+                frames_b(
+                    wsproto.events.Ping(b"PING"),
+                    wsproto.events.TextMessage("SERVER_MESSAGE_B"),
+                )
+            )
+            assert ws_b.receive_text(timeout=1.0) == "SERVER_MESSAGE_B"
+            server_sock_b.settimeout(1.0)
+            frames_b.connection.receive_data(server_sock_b.recv(4096))
+            assert list(frames_b.connection.events()) == [wsproto.events.Pong(b"PING")]
+            server_sock_a.sendall(frames_a(wsproto.events.TextMessage("THIRD")))
+            assert handled.empty()
+
+            # Reading resumes once the handler catches up
+            release.set()
+            assert handled.get(timeout=1.0) == "FIRST"
+            assert handled.get(timeout=1.0) == "SECOND"
+            assert handled.get(timeout=1.0) == "THIRD"
+
+    async def test_reactor_handler_error(self):
+        client_sock, server_sock = socket_module.socketpair()
+        frames = ServerFrames()
+        on_message = MagicMock(side_effect=ValueError)
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(server_sock)
+            reactor = stack.enter_context(WebSocketReactor())
+            ws = stack.enter_context(
+                WebSocketSession(
+                    SocketNetworkStream(client_sock),
+                    keepalive_ping_interval_seconds=None,
+                    on_message=on_message,
+                    reactor=reactor,
+                )
+            )
+            server_sock.sendall(
+                frames(
+                    wsproto.events.TextMessage("FIRST"),
+                    wsproto.events.TextMessage("SECOND"),
+                )
+            )
+            with pytest.raises(WebSocketHandlerError) as excinfo:
+                ws.receive(timeout=1.0)
+            assert isinstance(excinfo.value.__cause__, ValueError)
+            # The next messages aren't handled
+            on_message.assert_called_once_with("FIRST")
+
+    async def test_reactor_read_during_write(self):
+        client_sock, server_sock = socket_module.socketpair()
+        frames = ServerFrames()
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(server_sock)
+            # Read like a TLS socket, by switching it to non-blocking mode
+            stack.enter_context(patch("httpx_ws._reactor._MSG_DONTWAIT", None))
+            reactor = stack.enter_context(WebSocketReactor())
+            ws = stack.enter_context(
+                WebSocketSession(
+                    SocketNetworkStream(client_sock),
+                    keepalive_ping_interval_seconds=None,
+                    reactor=reactor,
+                )
+            )
+
+            # The socket mode can't change while a write is running
+            with ws._stream_lock:
+                server_sock.sendall(frames(wsproto.events.TextMessage("SERVER")))
+                with pytest.raises(TimeoutError):
+                    ws.receive_text(timeout=0.1)
+                assert client_sock.gettimeout() is None
+            assert ws.receive_text(timeout=1.0) == "SERVER"